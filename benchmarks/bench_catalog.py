@@ -0,0 +1,91 @@
+"""Benchmark queries on the catalog of many experiments
+
+Run with
+
+.. code::
+
+    python benchmarks/bench_catalog.py [-e NUM_EXPERIMENTS] [-n NUM_FILES]
+
+A catalog with synthetic records for a number of experiments is created,
+and the time of a query on several keys is compared with a linear scan
+over all the records in memory.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from mps_data_parser.catalog import Catalog
+from mps_data_parser.mps_data import MPSData
+
+DRUGS = ["Lidocaine", "Verapamil", "Flecainide", "Cisapride", "Nifedipine"]
+QUERY = {
+    "drug": "Verapamil",
+    "pacing_frequency": "1Hz",
+    "media": "MM",
+    "trace_type": "voltage",
+    "dose": "1uM",
+}
+
+
+def example_records(experiment: int, num_files: int):
+    drug = DRUGS[experiment % len(DRUGS)]
+    for i in range(num_files):
+        yield MPSData.from_dict(
+            {
+                "folder": f"exp{experiment}",
+                "path": f"path{i}.nd2",
+                "drug": drug,
+                "dose": ["0uM", "1uM", "10uM", "100uM"][i % 4],
+                "pacing_frequency": ["0Hz", "1Hz"][i % 2],
+                "media": ["MM", "SM"][(i // 2) % 2],
+                "trace_type": ["voltage", "calcium", "brightfield"][i % 3],
+                "chip": f"{i % 8}A",
+            },
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-e", "--num-experiments", type=int, default=200)
+    parser.add_argument("-n", "--num-files", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        with Catalog(Path(folder).joinpath("catalog.sqlite")) as catalog:
+            t0 = time.perf_counter()
+            for experiment in range(args.num_experiments):
+                catalog.add_records(
+                    f"exp{experiment}",
+                    {"folder": f"exp{experiment}"},
+                    example_records(experiment, args.num_files),
+                )
+            catalog._con.execute("ANALYZE")
+            print(
+                f"Created catalog with {len(catalog)} files in "
+                f"{time.perf_counter() - t0:.2f} s"
+            )
+
+            t0 = time.perf_counter()
+            result = catalog.query(**QUERY)
+            query_time = time.perf_counter() - t0
+
+    records = [
+        record.to_dict()
+        for experiment in range(args.num_experiments)
+        for record in example_records(experiment, args.num_files)
+    ]
+    t0 = time.perf_counter()
+    expected = [r for r in records if all(r.get(k) == v for k, v in QUERY.items())]
+    scan_time = time.perf_counter() - t0
+
+    assert len(result) == len(expected)
+    print(
+        f"Query with {len(result)} results: {query_time * 1000:.1f} ms "
+        f"(linear scan in memory: {scan_time * 1000:.1f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
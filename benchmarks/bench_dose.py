@@ -0,0 +1,73 @@
+"""Benchmark sorting of doses
+
+Run with
+
+.. code::
+
+    python benchmarks/bench_dose.py [-n NUM_DOSES]
+
+The doses are drawn from a small set of distinct doses, as in a real
+experiment. The original implementation of ``utils.dose_sorting``
+(creating a pint UnitRegistry and converting the doses one by one)
+is compared with ``dose.sort``. The original implementation is only
+run on the first 10 000 doses since it is slow.
+"""
+
+import argparse
+import time
+from typing import Callable
+from typing import List
+
+import numpy as np
+from mps_data_parser import dose
+
+DOSES = ["0nM", "1nM", "10 nM", "100nM", "1uM", "3 uM", "10uM", "100 uM", "1mM"]
+
+
+def legacy_dose_sorting(lst: List[str]) -> List[str]:
+    """The original implementation of utils.dose_sorting"""
+    import pint
+
+    sorted_units = ["pM", "nM", "uM", "mM", "cM", "dM"]
+    ureg = pint.UnitRegistry()
+    mapping = {
+        "pM": ureg.pm,
+        "nM": ureg.nm,
+        "uM": ureg.um,
+        "mM": ureg.mm,
+        "cM": ureg.cm,
+        "dM": ureg.dm,
+    }
+    new_lst = []
+    for item in lst:
+        idx = next(i for i, t in enumerate([s in item for s in sorted_units]) if t)
+        unit = sorted_units[idx]
+        v = float(item.replace(unit, "")) * mapping[unit]
+        new_lst.append(v)
+    inds = np.array([x for x, y in sorted(enumerate(new_lst), key=lambda x: x[1])])
+    return np.array(lst)[inds].tolist()
+
+
+def doses_per_second(func: Callable[[List[str]], List[str]], doses: List[str]):
+    t0 = time.perf_counter()
+    func(doses)
+    return len(doses) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-n", "--num-doses", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    doses = rng.choice(DOSES, size=args.num_doses).tolist()
+    assert dose.sort(doses[:10_000]) == legacy_dose_sorting(doses[:10_000])
+
+    print(f"{'legacy':>12s} {'dose.sort':>12s}  (doses/s)")
+    legacy = doses_per_second(legacy_dose_sorting, doses[:10_000])
+    new = doses_per_second(dose.sort, doses)
+    print(f"{legacy:12.0f} {new:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
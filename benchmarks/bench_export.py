@@ -0,0 +1,62 @@
+"""Benchmark saving and loading parsed data with the export module
+
+Run with
+
+.. code::
+
+    python benchmarks/bench_export.py [-n NUM_RECORDS]
+
+A batch of synthetic records with a few distinct values per column (as
+in a real experiment) is saved to and loaded from each format, and the
+time for each is reported. Formats that need pyarrow are skipped if it
+is not installed.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from mps_data_parser import export
+from mps_data_parser.batch import Batch
+from mps_data_parser.mps_data import MPSData
+
+FORMATS = [".npz", ".parquet", ".feather"]
+
+
+def example_batch(num_records: int) -> Batch:
+    columns = {
+        key: [f"{key}{i % 11}" for i in range(num_records)]
+        for key in MPSData.arguments()
+    }
+    columns["path"] = [f"folder/file{i}.nd2" for i in range(num_records)]
+    return Batch(columns, [True] * num_records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-n", "--num-records", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    batch = example_batch(args.num_records)
+    print(f"{'format':10s} {'save (s)':>10s} {'load (s)':>10s} {'size (MB)':>10s}")
+    with tempfile.TemporaryDirectory() as folder:
+        for suffix in FORMATS:
+            filename = Path(folder).joinpath("data").with_suffix(suffix)
+            try:
+                t0 = time.perf_counter()
+                export.save(batch, filename)
+            except ImportError as ex:
+                print(f"{suffix:10s} skipped ({ex})")
+                continue
+            save_time = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            export.load(filename)
+            load_time = time.perf_counter() - t0
+            size = filename.stat().st_size / 1024**2
+            print(f"{suffix:10s} {save_time:10.3f} {load_time:10.3f} {size:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
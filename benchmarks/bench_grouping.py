@@ -0,0 +1,85 @@
+"""Benchmark grouping files by the unique columns and pairing the
+trace types
+
+Run with
+
+.. code::
+
+    python benchmarks/bench_grouping.py [-n NUM_FILES]
+
+A batch of synthetic parsed files is grouped with the nested dictionaries
+that ``scripts.check`` used before, and with ``grouping.group_traces``.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from mps_data_parser import grouping
+from mps_data_parser.batch import Batch
+from mps_data_parser.pathmatcher import TRACE_TYPES
+
+KEYS = ["media", "chip", "pacing_frequency", "dose"]
+
+
+def example_batch(num_files: int) -> Batch:
+    index = np.arange(num_files)
+    columns = {
+        "media": np.array(["MM", "SM"], dtype=object)[index % 2],
+        "chip": np.array([f"{i}A" for i in range(50)], dtype=object)[index // 2 % 50],
+        "pacing_frequency": np.array(["0Hz", "1Hz"], dtype=object)[index // 100 % 2],
+        "dose": np.array([f"{i}uM" for i in range(1000)], dtype=object)[
+            index // 200 % 1000
+        ],
+        "trace_type": np.array(TRACE_TYPES, dtype=object)[index // 200000 % 3],
+        "path": np.array([f"file{i}.nd2" for i in range(num_files)], dtype=object),
+    }
+    return Batch(columns, np.ones(num_files, dtype=bool))
+
+
+def legacy_grouping(batch: Batch):
+    datas = {}
+    duplicates = 0
+    for data in batch.records():
+        unique_key = "_".join(data[k] for k in KEYS)
+        if unique_key not in datas:
+            datas[unique_key] = {}
+        if data["trace_type"] in datas[unique_key]:
+            duplicates += 1
+        datas[unique_key][data["trace_type"]] = data["path"]
+    missing = {
+        (trace_type, experiment)
+        for trace_type in TRACE_TYPES
+        for experiment, types in datas.items()
+        if trace_type not in types
+    }
+    return datas, duplicates, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-n", "--num-files", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    batch = example_batch(args.num_files)
+
+    t0 = time.perf_counter()
+    datas, duplicates, missing = legacy_grouping(batch)
+    legacy_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    groups = grouping.group_traces(batch, KEYS)
+    table = groups.table(batch)
+    num_duplicates = int((groups.counts - 1).clip(0).sum())
+    grouping_time = time.perf_counter() - t0
+
+    assert len(table) == len(datas)
+    assert num_duplicates == duplicates
+    assert int(groups.missing.sum()) == len(missing)
+    print(f"{args.num_files} files in {len(groups)} groups")
+    print(f"legacy:   {legacy_time:.3f} s")
+    print(f"grouping: {grouping_time:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark the time it takes to import the package
+
+Run with
+
+.. code::
+
+    python benchmarks/bench_import.py [-n REPEAT] [--budget MS]
+
+The package is imported in a fresh interpreter with
+``python -X importtime`` and the cumulative import time of
+``mps_data_parser`` (and of the statement given with ``--code``) is
+reported. The best of ``REPEAT`` runs is used. If a budget (in
+milliseconds) is given the script exits with an error when the import
+takes longer, so it can be used to guard the cold start time.
+"""
+
+import argparse
+import subprocess
+import sys
+
+
+def import_time(code: str) -> float:
+    """Return the cumulative import time in milliseconds of all the
+    top level imports when running the code
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stderr=subprocess.PIPE,
+        check=True,
+        text=True,
+    ).stderr
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Only count the top level imports, since the cumulative
+        # time includes the nested imports
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            total += int(cumulative)
+    return total / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "--code",
+        default="from mps_data_parser import PathMatcher, scan",
+        help="The statement to time",
+    )
+    parser.add_argument("--budget", type=float, help="Maximum time in ms")
+    args = parser.parse_args()
+
+    baseline = min(import_time("pass") for _ in range(args.repeat))
+    elapsed = min(import_time(args.code) for _ in range(args.repeat)) - baseline
+    print(f"{args.code}: {elapsed:.1f} ms")
+    if args.budget is not None and elapsed > args.budget:
+        print(f"Import time exceeds the budget of {args.budget:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
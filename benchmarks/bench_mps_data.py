@@ -0,0 +1,77 @@
+"""Benchmark the memory footprint of MPSData
+
+Run with
+
+.. code::
+
+    python benchmarks/bench_mps_data.py [-n NUM_RECORDS]
+
+The memory used by ``NUM_RECORDS`` objects (default one million) is
+measured with tracemalloc, for a replica of the original class (storing
+every argument in the instance ``__dict__``) and for the current
+slotted class. The values are shared between the records, so only the
+size of the objects themselves is measured.
+"""
+
+import argparse
+import tracemalloc
+from typing import Any
+from typing import Callable
+from typing import Dict
+
+from mps_data_parser import MPSData
+
+
+class LegacyMPSData:
+    """The attribute storage of MPSData before it used slots"""
+
+    def __init__(self, **kwargs):
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+
+
+def example_record(i: int) -> Dict[str, Any]:
+    record = dict.fromkeys(MPSData.arguments())
+    record.update(
+        folder="root",
+        path=f"181116_Lidocaine/10uM_1Hz/Point1_{i % 100:04d}.nd2",
+        drug="Lidocaine",
+        dose="10uM",
+        pacing_frequency="1Hz",
+        trace_type="voltage",
+        chip="chip1",
+    )
+    return record
+
+
+def measure(
+    create: Callable[[Dict[str, Any]], Any],
+    num_records: int,
+) -> float:
+    """Return the memory (in MB) used by the records"""
+    records = [example_record(i) for i in range(100)]
+    tracemalloc.start()
+    objects = [create(records[i % 100]) for i in range(num_records)]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return memory / 1024**2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-n", "--num-records", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{'class':15s} {'memory (MB)':>12s} {'bytes/record':>13s}")
+    for name, create in [
+        ("legacy", lambda record: LegacyMPSData(**record)),
+        ("slots", MPSData.from_dict),
+    ]:
+        memory = measure(create, args.num_records)
+        per_record = memory * 1024**2 / args.num_records
+        print(f"{name:15s} {memory:12.1f} {per_record:13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark the throughput of the PathMatcher
+
+Run with
+
+.. code::
+
+    python benchmarks/bench_pathmatcher.py [config files] [-n NUM_FILES]
+
+For each config file a set of synthetic paths (cycling through all the
+configured patterns) is generated, and the number of files matched per
+second is reported for the original implementation (calling
+``parse.search`` with the raw pattern strings) and for the PathMatcher,
+both when trying the patterns one by one (match) and when using a single
+combined regular expression (single_pass). The last two columns
+compare creating one MPSData per path (call) with parsing all paths
+at once into columns (match_many), and the last one shows the cost of
+collecting timings with ``PathMatcher.profile`` (profiled).
+The rules in the config are dropped, since they typically expect
+real values (e.g drug abbreviations) rather than the synthetic ones.
+"""
+
+import argparse
+import string
+import time
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+import parse
+from mps_data_parser import PathMatcher
+from mps_data_parser.utils import load_config
+
+HERE = Path(__file__).absolute().parent
+CONFIG_DIR = HERE.parent.joinpath("config_files")
+
+
+def field_names(pattern: str) -> List[str]:
+    return [f for _, f, _, _ in string.Formatter().parse(pattern) if f]
+
+
+def example_paths(config: Dict[str, Any], num_files: int) -> List[Path]:
+    """Generate synthetic paths that are matched by the patterns in the
+    config. The paths are distributed evenly over the patterns.
+    """
+    root = Path(config.get("folder", "root"))
+    patterns = config.get("regexs", config.get("patterns", []))
+    paths = []
+    for i in range(num_files):
+        pattern = patterns[i % len(patterns)]
+        values = {
+            name: f"{name.replace('_', '')[:3]}{i % 7}" for name in field_names(pattern)
+        }
+        values["seq_nr"] = str(i).zfill(4)
+        paths.append(root.joinpath(pattern.format(**values)))
+    return paths
+
+
+def legacy_match(config: Dict[str, Any]) -> Callable[[Path], Any]:
+    """The matching loop as it was before the patterns were compiled"""
+    root = Path(config.get("folder", "root"))
+    regexs = [str(Path(r)) for r in config.get("regexs", config.get("patterns", []))]
+
+    def match(path):
+        relative_path = str(Path(path).relative_to(root))
+        for regex in regexs:
+            res = parse.search(regex, relative_path)
+            if res is not None:
+                return res.named
+        return None
+
+    return match
+
+
+def files_per_second(func: Callable[[Path], Any], paths: List[Path]) -> float:
+    t0 = time.perf_counter()
+    for path in paths:
+        func(path)
+    return len(paths) / (time.perf_counter() - t0)
+
+
+def files_per_second_batch(
+    func: Callable[[List[Path]], Any],
+    paths: List[Path],
+) -> float:
+    t0 = time.perf_counter()
+    func(paths)
+    return len(paths) / (time.perf_counter() - t0)
+
+
+def run(config_file: Path, num_files: int) -> Dict[str, float]:
+    config = load_config(config_file)
+    config["rules"] = []
+    paths = example_paths(config, num_files)
+    root = config.get("folder", "root")
+    pathmatcher = PathMatcher(config, root=root, strict=False)
+    single_pass_pathmatcher = PathMatcher(
+        config,
+        root=root,
+        strict=False,
+        single_pass=True,
+    )
+    profiled_pathmatcher = PathMatcher(config, root=root, strict=False)
+    profiled_pathmatcher.profile()
+
+    def match_only(pathmatcher):
+        def match(path):
+            return pathmatcher._match(str(Path(path).relative_to(pathmatcher.root)))
+
+        return match
+
+    return {
+        "legacy": files_per_second(legacy_match(config), paths),
+        "match": files_per_second(match_only(pathmatcher), paths),
+        "single_pass": files_per_second(match_only(single_pass_pathmatcher), paths),
+        "call": files_per_second(pathmatcher, paths),
+        "match_many": files_per_second_batch(pathmatcher.match_many, paths),
+        "profiled": files_per_second(profiled_pathmatcher, paths),
+    }
+
+
+COLUMNS = ["legacy", "match", "single_pass", "call", "match_many", "profiled"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("configs", nargs="*", type=Path)
+    parser.add_argument("-n", "--num-files", type=int, default=2000)
+    args = parser.parse_args()
+
+    configs = args.configs or sorted(CONFIG_DIR.glob("*.yaml"))
+    print(f"{'config':45s} " + " ".join(f"{k:>11s}" for k in COLUMNS) + "  (files/s)")
+    for config_file in configs:
+        res = run(config_file, args.num_files)
+        print(
+            f"{config_file.stem:45s} " + " ".join(f"{res[k]:11.0f}" for k in COLUMNS),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,11 @@
 import datetime
-import os
 from pathlib import Path
 
 import yaml
-from mps_database import PathMatcher
+from mps_data_parser import database
+from mps_data_parser import scan
 from mps_database import sql
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 # https://www.youtube.com/watch?v=51RpDZKShiw
 # https://www.slideshare.net/jamdatadude/introduction-to-sqlalchemy-orm
@@ -29,25 +28,6 @@ def connect():
     return engine
 
 
-def _get_x_by_name(name, cls, session):
-
-    query = session.query(cls).filter(getattr(cls, "name") == name)
-    if query.count() > 0:
-        return query.one()
-    else:
-        x = cls(name=name)
-        session.add(x)
-        return x
-
-
-def get_cell_line_by_name(cell_line: str, session):
-    return _get_x_by_name(cell_line, sql.CellLine, session)
-
-
-def get_experiment_by_name(experiment: str, session):
-    return _get_x_by_name(experiment, sql.Experiment, session)
-
-
 def folder_to_datetime(folder):
     date = folder.split("_")[0]
 
@@ -76,69 +56,24 @@ def pipeline():
     cell_line_name = config.get("cell_line", "SCVI273")
     experiment_name = config.get("experiemnt", folder)
 
-    pathmatcher = PathMatcher(config, root=folder_path)
-
     print(folder_path)
 
     engine = connect()
     sql.Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    # Session = sessionmaker()
-    # Session.configure(bind=engine)
-    session = Session()
-
-    # Each folder is a separate experiment
-    experiment = get_experiment_by_name(experiment_name, session)
-    experiment.operator = "Berenice"
-    experiment.date = folder_to_datetime(folder)
-    session.add(experiment)
-    # Each experiment is one a separate cell line
-    cell_line = get_cell_line_by_name(cell_line_name, session)
-
-    drugs = dict(session.query(sql.Drug.name, sql.Drug).all())
-    # lst = []
-    for root, dirs, files in os.walk(folder_path):
-        for f in files:
-            path = Path(root).joinpath(f)
-
-            if path.suffix == ".nd2":
-
-                mps_data = pathmatcher(path)
-                data = mps_data.sql_data()
-
-                drug_name = data.pop("drug", None)
-                if drug_name is not None:
-                    if drug_name in drugs:
-                        drug = drugs.get(drug_name)
-
-                    else:
-                        # We need to create a new drug
-                        drug = sql.Drug(name=drug_name)
-                        session.add(drug)
-                        drugs[drug_name] = drug
-
-                db_data = sql.MPSData(**data)
-                if drug_name is not None:
-                    db_data.drug = drug
-                db_data.experiment = experiment
-                db_data.cell_line = cell_line
-
-                # Check if data allready is in the table
-                query = session.query(sql.MPSData).filter(
-                    sql.MPSData.path == path.relative_to(folder_path).as_posix(),
-                )
-                if query.count() > 0:
-                    # We might want to update the record later
-                    # item = query.first()
-                    # item = query.one()  # raise error if more than one
-                    # Update
-                    continue
-
-                # lst.append(db_data)
-                session.add(db_data)
-
-    # session.bulk_save_objects(lst)
-    session.commit()
+    # The loader works directly on the DB-API connection and inserts
+    # the new records in bulk
+    connection = engine.raw_connection()
+    try:
+        database.load(
+            connection,
+            scan(folder_path, config, extensions=[".nd2"]),
+            experiment=experiment_name,
+            cell_line=cell_line_name,
+            operator="Berenice",
+            date=folder_to_datetime(folder),
+        )
+    finally:
+        connection.close()
 
 
 if __name__ == "__main__":
@@ -1,15 +1,56 @@
+"""The submodules, and the classes and functions exported here, are
+imported the first time they are used, so that ``import mps_data_parser``
+stays cheap, e.g in worker processes that only match paths.
+"""
+
+import importlib as _importlib
 import logging as _logging
 
-from . import abreviations
-from . import mps_data
-from . import pathmatcher
-from . import scripts
-from . import utils
-from .mps_data import MPSData
-from .pathmatcher import PathMatcher
+_SUBMODULES = [
+    "abreviations",
+    "batch",
+    "cache",
+    "catalog",
+    "database",
+    "dose",
+    "export",
+    "grouping",
+    "mps_data",
+    "pathmatcher",
+    "profiling",
+    "rules",
+    "scanner",
+    "scripts",
+    "utils",
+    "watch",
+]
+# Name -> the submodule it is imported from
+_ATTRIBUTES = {
+    "Batch": "batch",
+    "MPSData": "mps_data",
+    "MatchError": "pathmatcher",
+    "PathMatcher": "pathmatcher",
+    "scan": "scanner",
+}
 
 _logging.basicConfig(level=_logging.INFO)
-_loggers = [getattr(m, "logger") for m in [pathmatcher, scripts]]
+# The loggers are looked up by name, so that the modules do not need
+# to be imported
+_loggers = [
+    _logging.getLogger(f"{__name__}.{m}")
+    for m in [
+        "cache",
+        "catalog",
+        "database",
+        "export",
+        "grouping",
+        "pathmatcher",
+        "rules",
+        "scanner",
+        "scripts",
+        "watch",
+    ]
+]
 
 
 def set_log_level(level=_logging.INFO):
@@ -20,13 +61,44 @@ def set_log_level(level=_logging.INFO):
 
 set_log_level()
 
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        value = _importlib.import_module(f".{name}", __name__)
+    elif name in _ATTRIBUTES:
+        module = _importlib.import_module(f".{_ATTRIBUTES[name]}", __name__)
+        value = getattr(module, name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
 __all__ = [
     "utils",
     "mps_data",
     "MPSData",
     "pathmatcher",
     "PathMatcher",
+    "profiling",
+    "MatchError",
     "abreviations",
+    "batch",
+    "Batch",
+    "cache",
+    "catalog",
+    "database",
+    "dose",
+    "export",
+    "grouping",
+    "rules",
+    "scanner",
+    "scan",
     "scripts",
+    "watch",
     "set_log_level",
 ]
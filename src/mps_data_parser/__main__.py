@@ -1,4 +1,4 @@
 if __name__ == "__main__":
-    from mps_database_parser.scripts import main
+    from mps_data_parser.scripts import main
 
     main()
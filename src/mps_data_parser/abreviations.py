@@ -1,11 +1,26 @@
+import hashlib
+import json
 import logging
-from collections import Counter
-from copy import deepcopy
+import os
+import re
+import stat
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import IO
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Mapping
 from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
 from typing import Union
 
 import yaml
@@ -13,6 +28,12 @@ import yaml
 logger = logging.getLogger(__name__)
 PathStr = Union[str, Path]
 
+# Use the much faster libyaml bindings if they are available
+_SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+SNAPSHOT_VERSION = 2
+
 GENERAL_ABBREVIATIONS = {
     "media": {"MM": ["MM", "mm"], "SM": ["SM", "sm"]},
     "pacing": {
@@ -22,15 +43,146 @@ GENERAL_ABBREVIATIONS = {
     },
 }
 
+_SEPARATORS = re.compile(r"[\s_]+")
+
+
+def normalize_synonym(synonym: str) -> str:
+    """Return the canonical form of a synonym used for normalized
+    lookups, i.e casefolded and without whitespace and underscores.
+    For example ``"1 Hz"``, ``"1hz"`` and ``"1_HZ"`` all become ``"1hz"``.
+    """
+    return _SEPARATORS.sub("", synonym).casefold()
+
+
+def _atomic_write(filename: PathStr, mode: str, write: Callable[[IO], None]) -> None:
+    """Write to a temporary file and move it in place, so that the
+    file is never left half written. The file keeps its permissions, and
+    a new file gets the default permissions given by the umask.
+    """
+    directory, name = os.path.split(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        # mkstemp creates the file with mode 0600
+        os.chmod(tmp, _permissions(filename))
+        os.replace(tmp, filename)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _permissions(filename: PathStr) -> int:
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        # The umask can only be read by setting it
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def snapshot_filename(filename: PathStr) -> Path:
+    """Return the path to the snapshot of an abbreviation file"""
+    path = Path(filename)
+    return path.with_name(f".{path.name}.snapshot.json")
+
+
+def _file_signature(filename: PathStr, content: bytes) -> Dict[str, Any]:
+    return {
+        "version": SNAPSHOT_VERSION,
+        "mtime_ns": os.stat(filename).st_mtime_ns,
+        "sha256": hashlib.sha256(content).hexdigest(),
+    }
+
+
+def _read_snapshot(
+    filename: PathStr,
+    content: bytes,
+) -> Optional[Tuple[Dict[str, Dict[str, List[str]]], Dict[str, Dict[str, str]]]]:
+    """Return the data and synonyms from the snapshot of the file,
+    or None if there is no snapshot or if it is out of date
+    """
+    try:
+        with open(snapshot_filename(filename), "r") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("signature") != _file_signature(filename, content):
+        logger.debug(f"Snapshot of {filename} is out of date")
+        return None
+    return snapshot["data"], snapshot["synonyms"]
+
+
+def _only_strings(data: Dict[Any, Dict[Any, Any]]) -> bool:
+    return all(
+        isinstance(key, str)
+        and all(
+            isinstance(value, str)
+            and isinstance(synonyms, list)
+            and all(isinstance(synonym, str) for synonym in synonyms)
+            for value, synonyms in values.items()
+        )
+        for key, values in data.items()
+    )
+
+
+def _write_snapshot(
+    filename: PathStr,
+    data: Dict[str, Dict[str, List[str]]],
+    synonyms: Dict[str, Dict[str, str]],
+) -> None:
+    """Save the data and the synonyms in a json file next to the
+    yaml file, which is much faster to load. Since json only has
+    strings as keys, no snapshot is written if any of the keys, values
+    or synonyms is not a string (e.g an integer in the yaml file).
+    """
+    if not _only_strings(data):
+        logger.debug(f"Not writing snapshot of {filename} with non-string data")
+        return
+    try:
+        with open(filename, "rb") as f:
+            content = f.read()
+        snapshot = {
+            "signature": _file_signature(filename, content),
+            "data": data,
+            "synonyms": synonyms,
+        }
+        _atomic_write(
+            snapshot_filename(filename), "w", lambda f: json.dump(snapshot, f)
+        )
+    except OSError as ex:
+        logger.debug(f"Could not write snapshot of {filename}: {ex}")
+
+
+def _load_file(
+    filename: PathStr,
+) -> Tuple[Dict[str, Dict[str, List[str]]], Optional[Dict[str, Dict[str, str]]]]:
+    """Load the data from the file. If the snapshot of the file is up
+    to date, the data and the synonyms are taken from the snapshot,
+    otherwise the synonyms are None.
+    """
+    with open(filename, "rb") as f:
+        content = f.read()
+    snapshot = _read_snapshot(filename, content)
+    if snapshot is not None:
+        return snapshot
+    return yaml.load(content, Loader=_SafeLoader) or {}, None
+
 
 def _load_data(filename: Optional[PathStr] = None) -> Dict[str, Dict[str, List[str]]]:
 
     if filename is None:
         return {}
     else:
-        with open(filename, "r") as f:
-            d = yaml.load(f, Loader=yaml.SafeLoader)
-        return d
+        return _load_file(filename)[0]
+
+
+def unique_synonyms(synonyms: Iterable[Any]) -> List[Any]:
+    """Remove duplicate synonyms and sort them. They are sorted as strings,
+    since a yaml file may mix e.g integers and strings.
+    """
+    return sorted(set(synonyms), key=lambda s: (str(s), type(s).__name__))
 
 
 def clean_data(
@@ -38,7 +190,7 @@ def clean_data(
 ) -> Dict[str, Dict[str, List[str]]]:
     new_data = {}
     for key, value in data.items():
-        new_data[key] = {k: sorted(list(set(v))) for k, v in value.items()}
+        new_data[key] = {k: unique_synonyms(v) for k, v in value.items()}
 
     return new_data
 
@@ -58,8 +210,7 @@ def _dump_data(
         data.update(d)
     # Sort alphabetically and remove duplicates
     data = clean_data(data)
-    with open(filename, "w") as f:
-        yaml.dump(data, f)
+    _atomic_write(filename, "w", lambda f: yaml.dump(data, f, Dumper=_SafeDumper))
     return data
 
 
@@ -68,17 +219,52 @@ class DuplicationError(ValueError):
 
 
 class Abbreviations:
+    """Abbreviations and synonyms of the values of the different keys
+
+    Arguments
+    ---------
+    data : dict
+        The abbreviations on the form {key: {value: [synonyms]}}. If not
+        provided `GENERAL_ABBREVIATIONS` is used.
+    filename : str
+        Path to a yaml file with more abbreviations. Changes are written
+        back to this file.
+    raise_on_failure : bool
+        If True (default), raise an exception when a key or synonym is
+        not found.
+    normalized : bool
+        If True, synonyms that are not found are also looked up in their
+        normalized form (see `normalize_synonym`), so that e.g "1 HZ"
+        matches the synonym "1hz". The values themselves are included
+        in the normalized lookup. Default: False.
+    """
+
     def __init__(
         self,
         data: Optional[Dict[str, Dict[str, List[str]]]] = None,
         filename: Optional[PathStr] = None,
         raise_on_failure: bool = True,
+        normalized: bool = False,
     ):
         self._filename = filename
         self.raise_on_failure = raise_on_failure
-        self._data = data if data is not None else GENERAL_ABBREVIATIONS
+        self.normalized = normalized
+        self._normalized_index: Optional[Dict[str, Dict[str, Optional[str]]]] = None
+        # Number of synonyms of each value with a given normalized form
+        self._normalized_owners: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._ambiguous: Dict[str, Dict[str, Set[str]]] = {}
+        self._data: Dict[str, Dict[str, List[str]]] = {}
+        # Reverse index from key and synonym to value
         self._syn: Dict[str, Dict[str, str]] = {}
-        self.update(_load_data(filename=filename))
+        self._view: Optional[Mapping[str, Mapping[str, Sequence[str]]]] = None
+        # Incremented every time the data changes
+        self._version = 0
+        self._in_batch = False
+        self._dump_pending = False
+        self._dump_overwrite = False
+        self.update(data if data is not None else GENERAL_ABBREVIATIONS)
+        if filename is not None:
+            self._load_file()
 
     def __repr__(self):
         return f"{self.__class__.__name__}({', '.join(self.keys())})"
@@ -86,13 +272,13 @@ class Abbreviations:
     def _check_key(self, key: str) -> None:
         if self.raise_on_failure:
             msg = f"Invald key {key}. Possible keys are {self.keys()}"
-            assert key in self.keys(), msg
+            assert key in self._data, msg
 
     def is_persistent(self):
         return self._filename is not None
 
     def keys(self) -> List[str]:
-        return list(self.data.keys())
+        return list(self._data.keys())
 
     def add_key(self, key: str, data: Optional[Dict[str, List[str]]] = None):
         """Add a new key
@@ -110,12 +296,13 @@ class Abbreviations:
             abrev.add_key("drug")
 
         """
-        if key in self.keys():
+        if key in self._data:
             return
 
         if data is None:
             data = {}
         self._data[key] = {}
+        self._syn[key] = {}
         self._update_data(key, data)
 
     def remove_key(self, key: str):
@@ -139,6 +326,11 @@ class Abbreviations:
         """
         self._check_key(key)
         self._data.pop(key)
+        self._syn.pop(key, None)
+        if self._normalized_index is not None:
+            self._normalized_index.pop(key, None)
+        self._normalized_owners.pop(key, None)
+        self._ambiguous.pop(key, None)
         self._dump_data(overwrite=True)
 
     def update(self, data: Dict[str, Dict[str, List[str]]]) -> None:
@@ -162,35 +354,191 @@ class Abbreviations:
                 }
             })
         """
-        d: Dict[str, Dict[str, List[str]]] = {}
-        syn: Dict[str, Dict[str, str]] = {}
-        for key, vs in data.items():
-            if key not in d:
-                d[key] = {}
-            if key not in syn:
-                syn[key] = {}
-            for k, v in vs.items():
-                for vi in v:
-                    d[key][vi] = v
-                    syn[key][vi] = k
-
-        self._data.update(d)
-        self._syn.update(syn)
+        for key, values in data.items():
+            d: Dict[str, List[str]] = {}
+            syn: Dict[str, str] = {}
+            for value, synonyms in values.items():
+                d[value] = unique_synonyms(synonyms)
+                for synonym in d[value]:
+                    owner = syn.setdefault(synonym, value)
+                    if owner != value:
+                        logger.warning(
+                            f"Duplicate synonym {synonym} for key {key}. "
+                            f"Using {owner} and not {value}",
+                        )
+            self._data[key] = d
+            self._syn[key] = syn
+        self._reset_normalized_index(data)
+        self._changed()
+
+    def _load_file(self) -> None:
+        data, synonyms = _load_file(self._filename)  # type: ignore
+        if synonyms is None:
+            self.update(data)
+            self._write_snapshot(data)
+        else:
+            self._data.update(data)
+            self._syn.update(synonyms)
+            self._reset_normalized_index(data)
+            self._changed()
+
+    def _write_snapshot(self, keys: Iterable[str]) -> None:
+        _write_snapshot(
+            self._filename,  # type: ignore
+            data={key: self._data[key] for key in keys},
+            synonyms={key: self._syn[key] for key in keys},
+        )
+
+    def _changed(self) -> None:
+        """Invalidate everything that is derived from the data"""
+        self._version += 1
+        self._view = None
+
+    def _reset_normalized_index(self, keys: Optional[Iterable[str]] = None) -> None:
+        """Rebuild the normalized index of the given keys (default: all
+        keys) after a bulk change. The index is only built right away if
+        normalized lookups are used, and otherwise on the first lookup.
+        """
+        if self.normalized:
+            self._build_normalized_index(keys)
+        else:
+            self._normalized_index = None
+
+    def _build_normalized_index(
+        self,
+        keys: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Dict[str, Optional[str]]]:
+        """Build the index from normalized synonym to value, for the given
+        keys or for all keys. Normalized synonyms that belong to more than
+        one value are ambiguous, and are mapped to None.
+        """
+        if keys is None or self._normalized_index is None:
+            self._normalized_index = {}
+            self._normalized_owners = {}
+            self._ambiguous = {
+                k: v for k, v in self._ambiguous.items() if k in self._data
+            }
+            keys = self._data.keys()
+        for key in keys:
+            self._normalized_index[key] = {}
+            self._normalized_owners[key] = {}
+            for value, synonyms in self._data[key].items():
+                self._count_normalized(key, value, synonyms, 1)
+            # Also check the ones that were ambiguous before the change
+            self._check_ambiguous(
+                key,
+                [*self._normalized_owners[key], *self._ambiguous.get(key, ())],
+            )
+        return self._normalized_index
+
+    def _count_normalized(
+        self,
+        key: str,
+        value: str,
+        synonyms: Iterable[Any],
+        count: int,
+    ) -> List[str]:
+        """Add (count=1) or remove (count=-1) the value and its synonyms
+        in the normalized index, and return the normalized synonyms
+        """
+        index = self._normalized_index.setdefault(key, {})  # type: ignore
+        owners = self._normalized_owners.setdefault(key, {})
+        normalized_synonyms = []
+        for synonym in [value, *synonyms]:
+            if not isinstance(synonym, str):
+                continue
+            normalized = normalize_synonym(synonym)
+            normalized_synonyms.append(normalized)
+            counts = owners.setdefault(normalized, {})
+            counts[value] = counts.get(value, 0) + count
+            if counts[value] <= 0:
+                del counts[value]
+            if not counts:
+                del owners[normalized]
+                del index[normalized]
+            else:
+                index[normalized] = next(iter(counts)) if len(counts) == 1 else None
+        return normalized_synonyms
+
+    def _check_ambiguous(self, key: str, normalized_synonyms: Iterable[str]) -> None:
+        """Keep track of the normalized synonyms of the key that are
+        ambiguous, and log the ones that were not ambiguous (with the
+        same values) before
+        """
+        owners = self._normalized_owners.get(key, {})
+        ambiguous = self._ambiguous.setdefault(key, {})
+        for normalized in set(normalized_synonyms):
+            values = set(owners.get(normalized, ()))
+            if len(values) < 2:
+                ambiguous.pop(normalized, None)
+            elif ambiguous.get(normalized) != values:
+                ambiguous[normalized] = values
+                logger.warning(
+                    f"Normalized synonym {normalized} for key {key} is ambiguous. "
+                    f"It matches {', '.join(sorted(values))}",
+                )
+        if not ambiguous:
+            del self._ambiguous[key]
+
+    def ambiguous_synonyms(self) -> Dict[str, Dict[str, List[str]]]:
+        """Return the normalized synonyms that match more than one value,
+        on the form {key: {normalized synonym: [values]}}
+        """
+        if self._normalized_index is None:
+            self._build_normalized_index()
+        return {
+            key: {k: sorted(v) for k, v in collisions.items()}
+            for key, collisions in self._ambiguous.items()
+        }
 
     @property
-    def data(self) -> Dict[str, Dict[str, List[str]]]:
-        # Just return a copy so that we do not change
-        # anything. Dictionaries are mutable
-        return deepcopy(self._data)
-
-    def _check_unique_synonyms(self) -> None:
-        """Check that there are no duplicate synonyms"""
-        for key in self.keys():
-            all_synonyms = [v for lst in self._data[key].values() for v in lst]
-            for k, v in Counter(all_synonyms).items():
-                if v > 1:
-                    raise DuplicationError(f"Duplicate synonym {k} for key {key}")
-            logger.debug(f"No duplicates for key {key}")
+    def data(self) -> Mapping[str, Mapping[str, Sequence[str]]]:
+        """A read-only view of the data. The view is only rebuilt
+        when the data changes, so reading it is cheap.
+        """
+        if self._view is None:
+            self._view = MappingProxyType(
+                {
+                    key: MappingProxyType({k: tuple(v) for k, v in values.items()})
+                    for key, values in self._data.items()
+                },
+            )
+        return self._view
+
+    def _check_unique_synonyms(self, key: str, data: Dict[str, List[str]]) -> None:
+        """Check that the synonyms in the data are not already
+        used by other values. Raises a DuplicationError if they are.
+        """
+        syn = self._syn.get(key, {})
+        claimed: Dict[str, str] = {}
+        for value, synonyms in data.items():
+            for synonym in synonyms:
+                owner = claimed.setdefault(synonym, value)
+                if owner == value:
+                    owner = syn.get(synonym, value)
+                    # The synonyms of the values in the data are replaced
+                    if owner in data:
+                        owner = value
+                if owner != value:
+                    raise DuplicationError(
+                        f"Duplicate synonym {synonym} for key {key}. "
+                        f"It is already a synonym of {owner}",
+                    )
+
+    def _remove_from_index(self, key: str, value: str) -> List[str]:
+        """Remove the synonyms of the value from the indexes, and return
+        the normalized synonyms that were removed
+        """
+        syn = self._syn[key]
+        synonyms = self._data[key].get(value)
+        if synonyms is None:
+            return []
+        for synonym in synonyms:
+            if syn.get(synonym) == value:
+                del syn[synonym]
+        if self._normalized_index is None:
+            return []
+        return self._count_normalized(key, value, synonyms, -1)
 
     def _update_data(
         self,
@@ -198,35 +546,117 @@ class Abbreviations:
         data: Dict[str, Any],
         overwrite: bool = False,
     ) -> None:
-        self._data[key].update(data)
-        self._data = clean_data(self._data)
-        self._check_unique_synonyms()
+        data = {value: unique_synonyms(synonyms) for value, synonyms in data.items()}
+        self._check_unique_synonyms(key, data)
+        syn = self._syn.setdefault(key, {})
+        normalized_synonyms = []
+        for value, synonyms in data.items():
+            normalized_synonyms += self._remove_from_index(key, value)
+            self._data[key][value] = synonyms
+            syn.update(dict.fromkeys(synonyms, value))
+            if self._normalized_index is not None:
+                normalized_synonyms += self._count_normalized(key, value, synonyms, 1)
+        if normalized_synonyms:
+            self._check_ambiguous(key, normalized_synonyms)
         self._dump_data(overwrite=overwrite)
 
     def _dump_data(self, overwrite: bool = False):
-        self._data = _dump_data(
-            self._data,
-            filename=self._filename,
-            overwrite=overwrite,
-        )
+        self._changed()
+        if self._in_batch:
+            # Postpone writing until the batch is done
+            self._dump_pending = True
+            self._dump_overwrite |= overwrite
+            return
+        if self._filename is None:
+            return
+        data = _dump_data(self._data, filename=self._filename, overwrite=overwrite)
+        # Pick up keys that were only found in the file
+        self.update({k: v for k, v in data.items() if k not in self._data})
+        self._write_snapshot(data)
+
+    @contextmanager
+    def batch(self) -> Iterator["Abbreviations"]:
+        """Apply many changes at once. Within the block the changes are
+        only done in memory, and when the block exits the file is written
+        once. If an exception is raised inside the block, e.g a
+        DuplicationError, all the changes are rolled back.
+
+        Example
+        -------
+        .. code::
+
+            with abrev.batch():
+                for value, synonyms in spreadsheet.items():
+                    abrev.add_value("drug", value, synonyms=synonyms)
+
+        """
+        if self._in_batch:
+            # Nested batches are part of the outer batch
+            yield self
+            return
+
+        data = {key: dict(values) for key, values in self._data.items()}
+        syn = {key: dict(values) for key, values in self._syn.items()}
+        self._in_batch = True
+        try:
+            yield self
+        except BaseException:
+            self._data = data
+            self._syn = syn
+            self._reset_normalized_index()
+            self._changed()
+            raise
+        finally:
+            self._in_batch = False
+            dump_pending, self._dump_pending = self._dump_pending, False
+            overwrite, self._dump_overwrite = self._dump_overwrite, False
+
+        if dump_pending:
+            self._dump_data(overwrite=overwrite)
+
+    def add_many(self, key: str, values: Dict[str, List[str]]) -> None:
+        """Add many values with synonyms at once, writing
+        the file only once. See `Abbreviations.batch`.
+
+        Arguments
+        ---------
+        key : str
+            The key
+        values : dict
+            A dictionary mapping the values to lists of synonyms
+
+        Example
+        -------
+        .. code::
+
+            abrev.add_many("drug", {
+                "Lidocaine": ["Lid", "lidocaine"],
+                "Isoproterenol": ["Iso", "isoproterenol"],
+            })
+
+        """
+        with self.batch():
+            for value, synonyms in values.items():
+                self.add_value(key, value, synonyms=list(synonyms))
 
     def has_value(self, key: str, value: str) -> bool:
-        return value in self.list_values(key)
+        self._check_key(key)
+        return value in self._data.get(key, {})
 
     def list_values(self, key: str) -> List[str]:
         self._check_key(key)
-        return list(self.data.get(key, {}).keys())
+        return list(self._data.get(key, {}).keys())
 
     def list_synonyms(self, key: str, value: str) -> List[str]:
         self._check_key(key)
-        data = self.data.get(key, {})
+        data = self._data.get(key, {})
         # values = list(data.keys())
         # if value not in values:
         #     msg = f"Could not find value {value}. " f"Possible values are {values}"
         #     logger.warning(msg)
         #     return []
 
-        return data.get(value, [])
+        return list(data.get(value, []))
 
     def add_synonym(self, key: str, value: str, synonym: str) -> None:
         """Add a new synonym
@@ -248,14 +678,13 @@ class Abbreviations:
             abrev.add_synonym("drug", "Lidocaine", new_synonym)
 
         """
-        if key not in self.keys():
+        if key not in self._data:
             self.add_key(key)
         msg = f"Value {value} not found. Please add a new value"
         assert self.has_value(key, value), msg
-        if synonym not in self.list_synonyms(key, value):
-            data = self.data.get(key, {})
-            data[value].append(synonym)
-            self._update_data(key, data)
+        synonyms = self._data[key][value]
+        if synonym not in synonyms:
+            self._update_data(key, {value: synonyms + [synonym]})
 
     def remove_synonym(self, key: str, value: str, synonym: str) -> None:
         """Remove a synonuym"""
@@ -264,11 +693,11 @@ class Abbreviations:
             logger.warning(f"Value {value} not found for key {key}")
             return None
 
-        if synonym in self.list_synonyms(key, value):
+        synonyms = self._data[key][value]
+        if synonym in synonyms:
             logger.info(f"Remove synonym {synonym} from {value}")
-            data = self.data.get(key, {})
-            data[value].remove(synonym)
-            self._update_data(key, data, overwrite=True)
+            synonyms = [s for s in synonyms if s != synonym]
+            self._update_data(key, {value: synonyms}, overwrite=True)
 
     def add_value(self, key: str, value: str, synonyms: Optional[str] = None) -> None:
         """Add a new item new to the
@@ -285,24 +714,24 @@ class Abbreviations:
             abrev.add_value("drug", "Lidocaine", synonyms=synonyms)
 
         """
-        if key not in self.keys():
+        if key not in self._data:
             self.add_key(key)
         if synonyms is None:
-            synonyms = []  # type:ignore
+            synonyms = []  # type: ignore
         assert isinstance(synonyms, list)
         logger.info(f"Add value {value} to {key} with synonyms {synonyms}")
-        data = self.data.get(key, {})
-
-        data[value] = data.get(value, [])
-        data[value] += synonyms
-        self._update_data(key, data)
+        data = self._data.get(key, {})
+        self._update_data(key, {value: data.get(value, []) + synonyms})
 
     def remove_value(self, key: str, value: str) -> None:
         self._check_key(key)
 
         if self.has_value(key, value):
             logger.info(f"Remove value {value} from {key}")
-            self._data.get(key, {}).pop(value)
+            normalized_synonyms = self._remove_from_index(key, value)
+            self._data[key].pop(value)
+            if normalized_synonyms:
+                self._check_ambiguous(key, normalized_synonyms)
             self._dump_data(overwrite=True)
 
     def get_name(self, key: str, synonym: str) -> Optional[str]:
@@ -326,9 +755,68 @@ class Abbreviations:
         except Exception:
             value = None
 
+        if value is None and self.normalized and isinstance(synonym, str):
+            index = self._normalized_index
+            if index is None:
+                index = self._build_normalized_index()
+            value = index.get(key, {}).get(normalize_synonym(synonym))
+
         # for value in self.list_values(key):
         #     if synonym in self.list_synonyms(key, value):
         #         return value
         if value is None and self.raise_on_failure:
             raise ValueError(f"Could not find name for key {key} and synonym {synonym}")
         return value
+
+
+class NameCache:
+    """Memoize `Abbreviations.get_name` for the (key, synonym) pairs that
+    are looked up. The cache is bounded and the least recently used
+    entries are evicted first. Entries from before the abbreviations
+    changed are never used.
+
+    Arguments
+    ---------
+    abrev : Abbreviations
+        The abbreviations
+    maxsize : int
+        The maximum number of entries in the cache. Default: 4096
+
+    Example
+    -------
+    .. code::
+
+        names = NameCache(abrev)
+        names.get_name("pacing", "1 Hz")
+        print(names.cache_info())
+    """
+
+    def __init__(self, abrev: Abbreviations, maxsize: int = 4096):
+        self.abrev = abrev
+        self.maxsize = maxsize
+        self._lookup = lru_cache(maxsize=maxsize)(self._get_name)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.abrev!r})"
+
+    def __reduce__(self):
+        # The cache itself cannot be pickled
+        return (self.__class__, (self.abrev, self.maxsize))
+
+    def _get_name(self, key: str, synonym: Any, version: int) -> Optional[str]:
+        return self.abrev.get_name(key, synonym)
+
+    def clear(self) -> None:
+        self._lookup.cache_clear()
+
+    def cache_info(self) -> Dict[str, int]:
+        """Return the number of hits and misses and the size of the cache"""
+        return self._lookup.cache_info()._asdict()
+
+    def get_name(self, key: str, synonym: Any) -> Optional[str]:
+        """Same as `Abbreviations.get_name`"""
+        try:
+            return self._lookup(key, synonym, self.abrev._version)
+        except TypeError:
+            # Unhashable synonyms cannot be cached
+            return self.abrev.get_name(key, synonym)
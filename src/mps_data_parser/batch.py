@@ -0,0 +1,133 @@
+import logging
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def factorize(column: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Replace the values in a column with integer codes
+
+    Returns
+    -------
+    Tuple[np.ndarray, list]
+        The code for each row, which is -1 for None, and the distinct
+        values in the order they are first seen, i.e ``uniques[code]``
+        is the value of a row.
+    """
+    rows = column.tolist() if isinstance(column, np.ndarray) else list(column)
+    uniques = [v for v in dict.fromkeys(rows) if v is not None]
+    index: Dict[Any, int] = {v: i for i, v in enumerate(uniques)}
+    index[None] = -1
+    codes = np.fromiter(map(index.__getitem__, rows), dtype=np.int64, count=len(rows))
+    return codes, uniques
+
+
+class Batch:
+    """Columnar representation of many parsed paths, as returned
+    by ``PathMatcher.match_many``
+
+    Arguments
+    ---------
+    columns : dict
+        The values for each key. All columns need to have the same length.
+    matched : list
+        For each row, whether the path was matched by one of the patterns
+    """
+
+    def __init__(self, columns: Dict[str, Sequence[Any]], matched: Sequence[bool]):
+        self.matched = np.array(matched, dtype=bool)
+        self.columns: Dict[str, np.ndarray] = {}
+        for key, values in columns.items():
+            if len(values) != len(self.matched):
+                raise ValueError(
+                    f"Column {key} has length {len(values)}, expected {len(self.matched)}",
+                )
+            # Create an empty array first so that numpy does
+            # not try to interpret sequences as extra dimensions
+            column = np.empty(len(values), dtype=object)
+            column[:] = values
+            self.columns[key] = column
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Dict[str, Any]],
+        keys: Sequence[str] = (),
+        matched: Optional[Sequence[bool]] = None,
+    ) -> "Batch":
+        """Create a batch from rows on the same form as ``MPSData.to_dict``
+
+        Arguments
+        ---------
+        records : iterable
+            The rows
+        keys : list
+            Keys that are put first, and are included even if they
+            are not found in any of the rows
+        matched : list
+            For each row, whether the path was matched. Default: all rows
+        """
+        columns: Dict[str, List[Any]] = {key: [] for key in keys}
+        num = 0
+        for num, record in enumerate(records, start=1):
+            for key, value in record.items():
+                if key not in columns:
+                    # New key, fill in the previous rows
+                    columns[key] = [None] * (num - 1)
+                columns[key].append(value)
+            for column in columns.values():
+                if len(column) < num:
+                    column.append(None)
+        if matched is None:
+            matched = [True] * num
+        return cls(columns, matched)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(rows={len(self)}, "
+            f"unmatched={int(self.unmatched.sum())}, keys={self.keys()})"
+        )
+
+    def __len__(self) -> int:
+        return len(self.matched)
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.columns[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.columns
+
+    def keys(self) -> List[str]:
+        return list(self.columns.keys())
+
+    @property
+    def unmatched(self) -> np.ndarray:
+        """Mask of the paths that was not matched by any pattern"""
+        return ~self.matched
+
+    def get(self, key: str) -> np.ndarray:
+        """Return the column for the given key, or a column
+        of None if the key is not present
+        """
+        if key in self.columns:
+            return self.columns[key]
+        return np.full(len(self), None, dtype=object)
+
+    def to_dict(self, index: int) -> Dict[str, Any]:
+        """Return the row with the given index on the same
+        form as ``MPSData.to_dict``
+        """
+        return {k: v[index] for k, v in self.columns.items() if v[index] is not None}
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self)):
+            yield self.to_dict(index)
@@ -0,0 +1,496 @@
+"""Persistent cache of parsed files, so that repeated scans of
+an experiment folder only need to parse new or changed files.
+
+The cache is a SQLite database (by default a hidden file in the root of
+the experiment) which stores the listing of every directory together
+with its modification time, and the parsed data for every file together
+with its size and modification time. On a repeated scan a directory
+that has not been modified since the last scan is not listed again,
+so that only the directories need to be stat'ed.
+
+The cache is keyed by a fingerprint of the config, the abbreviations,
+the settings of the PathMatcher and the file filters, and is cleared if
+any of these change.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from collections import deque
+from itertools import chain
+from itertools import groupby
+from itertools import islice
+from operator import attrgetter
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from .mps_data import MPSData
+from .pathmatcher import MatchError
+from .pathmatcher import PathMatcher
+from .scanner import keep_directory
+from .scanner import match_files
+
+logger = logging.getLogger(__name__)
+
+PathStr = Union[str, Path]
+MatchResult = Union[MPSData, MatchError]
+
+CACHE_FILENAME = ".mps_data_parser_cache.sqlite"
+# Increase this when the layout of the cache changes
+SCHEMA_VERSION = 1
+# Runs of fewer new files than this are parsed in this process, even if
+# more jobs are requested
+MIN_PARALLEL_FILES = 256
+
+
+def fingerprint(
+    pathmatcher: PathMatcher,
+    extensions: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    prune: bool = False,
+) -> str:
+    """Return a hash of everything that affects the parsed data, i.e the
+    config, the abbreviations (from file and from the additional
+    abbreviations), the root and strictness of the PathMatcher and the
+    file and directory filters.
+    """
+    content = {
+        "schema_version": SCHEMA_VERSION,
+        "config": pathmatcher._config,
+        "abbreviations": pathmatcher.abrev._data,
+        "synonyms": pathmatcher.abrev._syn,
+        "normalized_abbreviations": pathmatcher.abrev.normalized,
+        "root": os.path.abspath(pathmatcher.root),
+        "strict": pathmatcher._strict,
+        "extensions": list(extensions),
+        "exclude": list(exclude),
+        "prune": prune,
+    }
+    dump = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(dump.encode()).hexdigest()
+
+
+class CachedFile(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    data: Optional[str]
+    error: Optional[str]
+
+    @property
+    def parsed(self) -> bool:
+        return self.data is not None or self.error is not None
+
+
+class ScanCache:
+    """SQLite database with the directory listings and parsed files
+
+    Arguments
+    ---------
+    filename : str
+        Path to the database
+    fingerprint : str
+        The fingerprint of the PathMatcher. If it differs from the
+        one stored in the database, the cache is cleared.
+    """
+
+    def __init__(self, filename: PathStr, fingerprint: str):
+        self.filename = Path(filename)
+        self._con = sqlite3.connect(str(filename))
+        self._create_tables()
+        row = self._con.execute(
+            "SELECT value FROM meta WHERE key = 'fingerprint'",
+        ).fetchone()
+        if row is None or row[0] != fingerprint:
+            if row is not None:
+                logger.info("Config or abbreviations changed. Clearing cache")
+            self.clear()
+            self._con.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)",
+                (fingerprint,),
+            )
+            self.commit()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.filename})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _create_tables(self) -> None:
+        self._con.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                position INTEGER,
+                mtime_ns INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                directory TEXT,
+                position INTEGER,
+                size INTEGER,
+                mtime_ns INTEGER,
+                data TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+            CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+            """,
+        )
+
+    def commit(self) -> None:
+        self._con.commit()
+
+    def close(self) -> None:
+        self._con.commit()
+        self._con.close()
+
+    def clear(self) -> None:
+        self._con.execute("DELETE FROM directories")
+        self._con.execute("DELETE FROM files")
+
+    def directory_mtime(self, directory: str) -> Optional[int]:
+        """Modification time of the directory when it was last listed"""
+        row = self._con.execute(
+            "SELECT mtime_ns FROM directories WHERE path = ?",
+            (directory,),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def subdirectories(self, directory: str) -> List[str]:
+        return [
+            row[0]
+            for row in self._con.execute(
+                "SELECT path FROM directories WHERE parent = ? ORDER BY position",
+                (directory,),
+            )
+        ]
+
+    def files(self, directory: str) -> List[CachedFile]:
+        return [
+            CachedFile(*row)
+            for row in self._con.execute(
+                "SELECT path, size, mtime_ns, data, error FROM files "
+                "WHERE directory = ? ORDER BY position",
+                (directory,),
+            )
+        ]
+
+    def set_directory(
+        self,
+        directory: str,
+        mtime_ns: int,
+        subdirectories: List[str],
+        files: List[Tuple[str, int, int]],
+    ) -> List[CachedFile]:
+        """Store a new listing of a directory
+
+        Previously parsed files that have the same size and modification
+        time are kept, and the subdirectories and files that are no longer
+        present are removed.
+
+        Arguments
+        ---------
+        directory : str
+            The directory relative to the root
+        mtime_ns : int
+            The modification time of the directory
+        subdirectories : list
+            The subdirectories relative to the root
+        files : list
+            (path, size, mtime_ns) for each file, with paths relative to the root
+
+        Returns
+        -------
+        list
+            The cached files in the directory
+        """
+        con = self._con
+        con.execute(
+            "INSERT INTO directories (path, mtime_ns) VALUES (?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET mtime_ns = excluded.mtime_ns",
+            (directory, mtime_ns),
+        )
+
+        for removed in set(self.subdirectories(directory)) - set(subdirectories):
+            self.remove_tree(removed)
+        con.executemany(
+            "INSERT INTO directories (path, parent, position) VALUES (?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET "
+            "parent = excluded.parent, position = excluded.position",
+            [(path, directory, i) for i, path in enumerate(subdirectories)],
+        )
+
+        old_files = {f.path: f for f in self.files(directory)}
+        new_files = []
+        for path, size, mtime_ns in files:
+            old = old_files.pop(path, None)
+            if old is not None and old.size == size and old.mtime_ns == mtime_ns:
+                new_files.append(old)
+            else:
+                new_files.append(CachedFile(path, size, mtime_ns, None, None))
+        con.executemany(
+            "DELETE FROM files WHERE path = ?",
+            [(path,) for path in old_files],
+        )
+        con.executemany(
+            "INSERT OR REPLACE INTO files "
+            "(path, directory, position, size, mtime_ns, data, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f.path, directory, i) + f[1:] for i, f in enumerate(new_files)],
+        )
+        return new_files
+
+    def set_result(
+        self,
+        path: str,
+        data: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """Store the parsed data (or the error message) for a file"""
+        self._con.execute(
+            "UPDATE files SET data = ?, error = ? WHERE path = ?",
+            (
+                None if data is None else json.dumps(data, default=str),
+                error,
+                path,
+            ),
+        )
+
+    def set_file(
+        self,
+        path: str,
+        size: int,
+        mtime_ns: int,
+        data: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """Store the parsed data for a single file (relative to the root),
+        e.g a new file found by ``watch``. The file is kept the next time
+        its directory is listed, as long as the size and modification
+        time are the same.
+        """
+        self._con.execute(
+            "INSERT OR REPLACE INTO files "
+            "(path, directory, position, size, mtime_ns, data, error) "
+            "VALUES (?, ?, (SELECT COUNT(*) FROM files WHERE directory = ?), "
+            "?, ?, ?, ?)",
+            (
+                path,
+                os.path.dirname(path),
+                os.path.dirname(path),
+                size,
+                mtime_ns,
+                None if data is None else json.dumps(data, default=str),
+                error,
+            ),
+        )
+
+    def remove_tree(self, directory: str) -> None:
+        """Remove a directory and everything below it"""
+        if directory == "":
+            self.clear()
+            return
+        lower = directory + os.sep
+        upper = directory + chr(ord(os.sep) + 1)
+        for table in ["directories", "files"]:
+            self._con.execute(
+                f"DELETE FROM {table} WHERE path = ? OR (path >= ? AND path < ?)",
+                (directory, lower, upper),
+            )
+
+
+def list_directory(
+    root: str,
+    directory: str,
+    extensions: Tuple[str, ...],
+    exclude: Sequence[str],
+    directory_filter: Optional[Callable[[str], bool]],
+) -> Tuple[List[str], List[Tuple[str, int, int]]]:
+    """List a directory (relative to the root) and return the paths of the
+    subdirectories to walk, and (path, size, mtime_ns) for the files with
+    one of the extensions, with paths relative to the root
+    """
+    subdirectories = []
+    files = []
+    with os.scandir(os.path.join(root, directory)) as it:
+        for entry in it:
+            path = os.path.join(directory, entry.name) if directory else entry.name
+            if entry.is_dir():
+                # Like os.walk, do not follow symbolic links
+                if not entry.is_symlink() and keep_directory(
+                    entry.path,
+                    path,
+                    exclude,
+                    directory_filter,
+                ):
+                    subdirectories.append(path)
+            elif entry.name.endswith(extensions):
+                posix_path = os.path.join(root, path).replace(os.sep, "/")
+                if any(ex in posix_path for ex in exclude):
+                    continue
+                stat = entry.stat()
+                files.append((path, stat.st_size, stat.st_mtime_ns))
+    return subdirectories, files
+
+
+def _walk(
+    root: str,
+    cache: ScanCache,
+    extensions: Tuple[str, ...],
+    exclude: Sequence[str],
+    directory_filter: Optional[Callable[[str], bool]],
+) -> Iterator[CachedFile]:
+    """Walk the directory tree in the same order as ``scanner.iter_files``
+    and yield the cached files. Directories that have not changed since
+    the last scan are not listed again.
+    """
+    directories = [""]
+    while directories:
+        directory = directories.pop()
+        try:
+            mtime_ns = os.stat(os.path.join(root, directory)).st_mtime_ns
+            if cache.directory_mtime(directory) == mtime_ns:
+                subdirectories = cache.subdirectories(directory)
+                files = cache.files(directory)
+            else:
+                subdirectories, listing = list_directory(
+                    root,
+                    directory,
+                    extensions,
+                    exclude,
+                    directory_filter,
+                )
+                files = cache.set_directory(
+                    directory,
+                    mtime_ns,
+                    subdirectories,
+                    listing,
+                )
+                cache.commit()
+        except OSError as ex:
+            logger.warning(f"Could not list directory {directory}: {ex}")
+            cache.remove_tree(directory)
+            continue
+
+        yield from files
+        # Reverse since we pop from the end
+        directories.extend(reversed(subdirectories))
+
+
+def _cached_result(root: str, cached: CachedFile) -> MatchResult:
+    if cached.error is not None:
+        return MatchError(cached.error, path=os.path.join(root, cached.path))
+    return MPSData.from_dict(json.loads(cached.data))  # type: ignore
+
+
+def cached_scan(
+    root: PathStr,
+    pathmatcher: PathMatcher,
+    cache_file: Optional[PathStr] = None,
+    extensions: Sequence[str] = (".nd2", ".czi"),
+    exclude: Sequence[str] = (),
+    prune: bool = False,
+    jobs: int = 1,
+    commit_every: int = 1000,
+) -> Iterator[MatchResult]:
+    """Same as ``scanner.scan``, but only new or changed files are
+    parsed, and the rest is read from the cache.
+
+    Arguments
+    ---------
+    root : str
+        The root folder of the experiment
+    pathmatcher : PathMatcher
+        The pathmatcher used to parse the new files
+    cache_file : str
+        Path to the cache. Default: a file named
+        ``.mps_data_parser_cache.sqlite`` in the root folder.
+    extensions : list
+        Only files with these extensions are parsed
+    exclude : list
+        Skip files where the path contains any of these strings
+    prune : bool
+        Only walk the directories where ``PathMatcher.may_match_directory``
+        is True
+    jobs : int
+        Number of processes used to match the new files. Runs of fewer
+        than `MIN_PARALLEL_FILES` new files are matched in this process.
+    commit_every : int
+        Number of parsed files between each write to the cache
+    """
+    root = os.fspath(root)
+    if cache_file is None:
+        cache_file = os.path.join(root, CACHE_FILENAME)
+    key = fingerprint(pathmatcher, extensions, exclude, prune)
+    suffixes = tuple(extensions)
+    exclude = [ex.replace(os.sep, "/") for ex in exclude]
+    directory_filter = pathmatcher.may_match_directory if prune else None
+
+    stats = pathmatcher.stats
+    with ScanCache(cache_file, key) as cache:
+        num_parsed = 0
+        walk = _walk(root, cache, suffixes, exclude, directory_filter)
+        # Split the walk into runs of parsed and new files, so that the
+        # parsed files are yielded as they are walked, and only the runs
+        # of new files go through match_files
+        runs: Iterator[Tuple[bool, Iterator[CachedFile]]] = groupby(
+            walk,
+            key=attrgetter("parsed"),
+        )
+        if stats is not None:
+            runs = stats.timed(runs, "walk")
+        for parsed, run in runs:
+            if parsed:
+                if stats is not None:
+                    run = stats.timed(run, "walk")
+                for cached in run:
+                    yield _cached_result(root, cached)
+                continue
+
+            # Starting the worker processes is not worth it for a few files
+            head = list(islice(run, MIN_PARALLEL_FILES))
+            run_jobs = jobs if len(head) == MIN_PARALLEL_FILES else 1
+            # Files that are waiting to be matched
+            queue: Deque[CachedFile] = deque()
+
+            def new_paths(files: Iterable[CachedFile]) -> Iterator[str]:
+                for cached in files:
+                    queue.append(cached)
+                    yield os.path.join(root, cached.path)
+
+            for _, result in match_files(
+                pathmatcher,
+                new_paths(chain(head, run)),
+                jobs=run_jobs,
+            ):
+                cached = queue.popleft()
+                if isinstance(result, MatchError):
+                    cache.set_result(cached.path, error=str(result))
+                else:
+                    cache.set_result(cached.path, data=result.to_dict())
+                num_parsed += 1
+                if num_parsed % commit_every == 0:
+                    cache.commit()
+                yield result
+
+        logger.debug(f"Parsed {num_parsed} new or changed files")
@@ -0,0 +1,360 @@
+"""Catalog of the parsed files of many experiments in one indexed
+SQLite database, so that questions across experiments can be answered
+without walking the folders again.
+
+.. code::
+
+    with Catalog("catalog.sqlite") as catalog:
+        catalog.update(experiments("/data/mps", "config_files"))
+        traces = catalog.query(
+            drug="Verapamil",
+            pacing_frequency="1Hz",
+            media="MM",
+            trace_type="voltage",
+        )
+
+Each experiment is a (folder, config) pair. The parsed data for all the
+experiments is stored in one table with a column for each key in
+`MPSData.arguments` (any other keys are stored as JSON), with an index on
+each of the keys in `QUERY_KEYS`, so that a query only reads the
+matching rows. Adding an experiment again replaces its rows.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from operator import attrgetter
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from .mps_data import MPSData
+from .mps_data import SQL_KEYS
+from .pathmatcher import MatchError
+from .utils import load_config
+
+logger = logging.getLogger(__name__)
+
+PathStr = Union[str, Path]
+MatchResult = Union[MPSData, MatchError]
+Value = Union[str, Sequence[str], None]
+
+COLUMNS = MPSData.arguments()
+# The keys that have an index and can be used in queries
+QUERY_KEYS = tuple(k for k in SQL_KEYS if k != "path") + ("drug", "cell_line", "date")
+# Increase this when the layout of the catalog changes
+SCHEMA_VERSION = 1
+
+_optional_values = attrgetter(*COLUMNS[2:])
+
+
+class Experiment(NamedTuple):
+    id: int
+    folder: str
+    config: str
+    num_files: int
+    num_unmatched: int
+
+
+def experiments(
+    data_root: PathStr,
+    config_dir: PathStr,
+) -> Iterator[Tuple[Path, Path]]:
+    """Find the (folder, config) pairs for all the config files in a
+    directory, where the folder of each experiment is given by the
+    ``folder`` key in the config, relative to `data_root`. Configs
+    whose folder does not exist are skipped.
+    """
+    for config_file in sorted(Path(config_dir).glob("*.yaml")):
+        config = load_config(config_file)
+        if "folder" not in config:
+            logger.warning(f"No folder in config {config_file}")
+            continue
+        folder = Path(data_root).joinpath(config["folder"])
+        if not folder.is_dir():
+            logger.info(f"Folder {folder} in config {config_file} does not exist")
+            continue
+        yield folder, config_file
+
+
+class Catalog:
+    """SQLite database with the parsed data of many experiments
+
+    Arguments
+    ---------
+    filename : str
+        Path to the database. Use ":memory:" for a catalog that is
+        not saved.
+    """
+
+    def __init__(self, filename: PathStr):
+        self.filename = filename
+        self._con = sqlite3.connect(os.fspath(filename))
+        self._create_tables()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.filename})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._con.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def _create_tables(self) -> None:
+        version = self._con.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise RuntimeError(
+                f"Catalog {self.filename} has version {version}, "
+                f"expected {SCHEMA_VERSION}",
+            )
+        columns = "".join(f", {key} TEXT" for key in COLUMNS)
+        indexes = "".join(
+            f"CREATE INDEX IF NOT EXISTS records_{key} ON records ({key});\n"
+            for key in QUERY_KEYS
+        )
+        self._con.executescript(
+            f"""
+            PRAGMA user_version = {SCHEMA_VERSION};
+            CREATE TABLE IF NOT EXISTS experiments (
+                id INTEGER PRIMARY KEY,
+                folder TEXT UNIQUE,
+                config TEXT
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY,
+                experiment_id INTEGER REFERENCES experiments (id),
+                matched INTEGER{columns},
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS records_experiment ON records (experiment_id);
+            {indexes}
+            """,
+        )
+
+    def commit(self) -> None:
+        self._con.commit()
+
+    def close(self) -> None:
+        self._con.commit()
+        self._con.close()
+
+    def add(
+        self,
+        folder: PathStr,
+        config: Union[PathStr, Dict[str, Any]],
+        **kwargs,
+    ) -> int:
+        """Scan an experiment and store the result in the catalog. If
+        the experiment is already in the catalog, its rows are replaced.
+
+        Arguments
+        ---------
+        folder : str
+            The root folder of the experiment
+        config : str or dict
+            The config file, or the config
+        kwargs :
+            Additional keyword arguments passed to ``scanner.scan``,
+            e.g ``jobs`` or ``cache``
+
+        Returns
+        -------
+        int
+            The number of files in the experiment
+        """
+        # Import here, since scanning is not needed for queries
+        from .scanner import scan
+
+        return self.add_records(
+            folder,
+            config if isinstance(config, dict) else str(config),
+            scan(folder, config, **kwargs),
+        )
+
+    def add_records(
+        self,
+        folder: PathStr,
+        config: Union[str, Dict[str, Any]],
+        records: Iterable[MatchResult],
+    ) -> int:
+        """Store the result of a scan of the given folder, see `add`"""
+        folder = os.path.abspath(folder)
+        config_name = config if isinstance(config, str) else config.get("folder")
+        con = self._con
+        with con:
+            con.execute(
+                "INSERT INTO experiments (folder, config) VALUES (?, ?) "
+                "ON CONFLICT (folder) DO UPDATE SET config = excluded.config",
+                (folder, config_name),
+            )
+            (experiment_id,) = con.execute(
+                "SELECT id FROM experiments WHERE folder = ?",
+                (folder,),
+            ).fetchone()
+            con.execute("DELETE FROM records WHERE experiment_id = ?", (experiment_id,))
+
+            placeholders = ", ".join("?" * (len(COLUMNS) + 3))
+            cursor = con.executemany(
+                f"INSERT INTO records (experiment_id, matched, {', '.join(COLUMNS)}, "
+                f"extra) VALUES ({placeholders})",
+                ((experiment_id,) + _row(folder, record) for record in records),
+            )
+        num_files = cursor.rowcount
+        logger.info(f"Added {num_files} files from {folder} to the catalog")
+        return num_files
+
+    def update(
+        self,
+        pairs: Iterable[Tuple[PathStr, Union[PathStr, Dict[str, Any]]]],
+        **kwargs,
+    ) -> int:
+        """Add all the (folder, config) pairs, e.g from `experiments`.
+        Returns the total number of files. The indexes statistics are
+        updated at the end so that SQLite picks the most selective index
+        for queries on several keys.
+        """
+        num_files = 0
+        for folder, config in pairs:
+            num_files += self.add(folder, config, **kwargs)
+        self._con.execute("ANALYZE")
+        self.commit()
+        return num_files
+
+    def remove(self, folder: PathStr) -> None:
+        """Remove an experiment from the catalog"""
+        folder = os.path.abspath(folder)
+        with self._con as con:
+            con.execute(
+                "DELETE FROM records WHERE experiment_id IN "
+                "(SELECT id FROM experiments WHERE folder = ?)",
+                (folder,),
+            )
+            con.execute("DELETE FROM experiments WHERE folder = ?", (folder,))
+
+    def experiments(self) -> List[Experiment]:
+        """The experiments in the catalog, with the number of files"""
+        return [
+            Experiment(*row)
+            for row in self._con.execute(
+                "SELECT experiments.id, experiments.folder, config, COUNT(records.id), "
+                "COUNT(records.id) - COALESCE(SUM(matched), 0) "
+                "FROM experiments LEFT JOIN records "
+                "ON records.experiment_id = experiments.id "
+                "GROUP BY experiments.id ORDER BY experiments.folder",
+            )
+        ]
+
+    def _where(self, filters: Dict[str, Value]) -> Tuple[str, List[Any]]:
+        clauses = ["matched = 1"]
+        params: List[Any] = []
+        for key, value in filters.items():
+            if key not in QUERY_KEYS:
+                raise ValueError(
+                    f"Cannot query on {key!r}. Possible keys are {QUERY_KEYS}",
+                )
+            if value is None:
+                clauses.append(f"{key} IS NULL")
+            elif isinstance(value, str):
+                clauses.append(f"{key} = ?")
+                params.append(value)
+            else:
+                values = list(value)
+                clauses.append(f"{key} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        return " AND ".join(clauses), params
+
+    def query(self, **filters: Value) -> List[MPSData]:
+        """Find the parsed files where each of the keys has the given
+        value. The value can also be a list of values, where any of
+        them is accepted, or None for files where the key is not set.
+
+        Example
+        -------
+        .. code::
+
+            catalog.query(drug="Verapamil", dose=["1uM", "10uM"], media="MM")
+
+        Raises
+        ------
+        ValueError
+            If one of the keys is not in `QUERY_KEYS`
+        """
+        where, params = self._where(filters)
+        return [
+            _from_row(row)
+            for row in self._con.execute(
+                f"SELECT {', '.join(COLUMNS)}, extra FROM records "
+                f"WHERE {where} ORDER BY id",
+                params,
+            )
+        ]
+
+    def count(self, **filters: Value) -> int:
+        """The number of files matching the filters, see `query`"""
+        where, params = self._where(filters)
+        return self._con.execute(
+            f"SELECT COUNT(*) FROM records WHERE {where}",
+            params,
+        ).fetchone()[0]
+
+    def values(self, key: str, **filters: Value) -> Dict[Optional[str], int]:
+        """The distinct values of a key, and the number of files with each
+        value, for the files matching the filters
+
+        Example
+        -------
+        .. code::
+
+            catalog.values("drug", trace_type="voltage")
+            # {'Lidocaine': 96, 'Verapamil': 128, ...}
+        """
+        if key not in COLUMNS:
+            raise ValueError(f"Unknown key {key!r}")
+        where, params = self._where(filters)
+        return dict(
+            self._con.execute(
+                f"SELECT {key}, COUNT(*) FROM records WHERE {where} "
+                f"GROUP BY {key} ORDER BY {key}",
+                params,
+            ),
+        )
+
+
+def _row(folder: str, record: MatchResult) -> Tuple[Any, ...]:
+    if isinstance(record, MatchError):
+        path = record.path
+        if path is not None:
+            path = Path(os.path.relpath(path, folder)).as_posix()
+        return (0, os.path.basename(folder), path) + (None,) * (len(COLUMNS) - 1)
+
+    path = record.path
+    path = path.replace(os.sep, "/") if isinstance(path, str) else Path(path).as_posix()
+    # The keys in COLUMNS are slots, and any other keys are in _extra
+    extra = record._extra
+    if extra:
+        extra = {k: v for k, v in extra.items() if v is not None}
+    return (
+        (1, record.folder, path)
+        + _optional_values(record)
+        + (json.dumps(extra, default=str) if extra else None,)
+    )
+
+
+def _from_row(row: Tuple[Any, ...]) -> MPSData:
+    data = {k: v for k, v in zip(COLUMNS, row) if v is not None}
+    if row[-1] is not None:
+        data.update(json.loads(row[-1]))
+    return MPSData.from_dict(data)
@@ -0,0 +1,555 @@
+"""Load the result of a scan into a SQL database in bulk
+
+The tables have the same layout as the ones in ``mps_database.sql``,
+i.e one table with the parsed data (``mps_data``) with foreign keys to
+the tables ``drug``, ``cell_line`` and ``experiment``. The functions
+here only need a DB-API connection, e.g from ``sqlite3.connect`` or
+``engine.raw_connection()`` in SQLAlchemy.
+
+.. code::
+
+    connection = sqlite3.connect("mps.db")
+    database.create_tables(connection)
+    database.load(
+        connection,
+        scan(folder, config),
+        experiment="181116_Lidocaine",
+        cell_line="SCVI273",
+    )
+
+Instead of checking if each path is already in the database, all the
+existing paths of the experiment are fetched with one query and the new
+rows are inserted with ``executemany`` in chunks. The ids of the drugs,
+cell lines and experiments are fetched once and kept in memory.
+
+`load` only inserts new paths, while `sync` also updates the rows whose
+parsed data changed (e.g after fixing a synonym or a rule) and deletes
+the rows of files that are gone. Only the ``content_hash`` column, which
+is not in ``mps_database.sql``, is added to the mps_data table.
+
+The rows are unique on the experiment and the path, so that experiments
+may have the same relative paths. In tables created by ``mps_database``
+the path is unique in the whole table, and the paths of the other
+experiments are then skipped instead.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from .mps_data import MPSData
+from .pathmatcher import MatchError
+
+logger = logging.getLogger(__name__)
+
+MatchResult = Union[MPSData, MatchError]
+
+# The columns in the mps_data table that are taken from MPSData
+COLUMNS = (
+    "path",
+    "media",
+    "dose",
+    "pacing_frequency",
+    "trace_type",
+    "chip",
+    "channel",
+    "seq_nr",
+    "extension",
+)
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS cell_line (
+        id INTEGER NOT NULL,
+        name VARCHAR,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS experiment (
+        id INTEGER NOT NULL,
+        date TEXT,
+        operator VARCHAR,
+        name VARCHAR,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS drug (
+        id INTEGER NOT NULL,
+        name VARCHAR,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS mps_data (
+        id INTEGER NOT NULL,
+        drug_id INTEGER,
+        experiment_id INTEGER,
+        cell_line_id INTEGER,
+        path VARCHAR,
+        media VARCHAR,
+        dose VARCHAR,
+        pacing_frequency VARCHAR,
+        trace_type VARCHAR,
+        chip VARCHAR,
+        channel VARCHAR,
+        seq_nr VARCHAR,
+        extension VARCHAR,
+        last_updated TEXT,
+        content_hash VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(drug_id) REFERENCES drug (id),
+        FOREIGN KEY(experiment_id) REFERENCES experiment (id),
+        FOREIGN KEY(cell_line_id) REFERENCES cell_line (id),
+        UNIQUE (experiment_id, path)
+    )""",
+]
+# The target of the upsert in `sync`. Also created as an index since
+# tables created by ``mps_database`` only have a unique path.
+EXPERIMENT_PATH_INDEX = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS mps_data_experiment_path "
+    "ON mps_data (experiment_id, path)"
+)
+
+
+def create_tables(connection) -> None:
+    """Create the tables if they do not exist"""
+    cursor = connection.cursor()
+    for statement in SCHEMA + [EXPERIMENT_PATH_INDEX]:
+        cursor.execute(statement)
+    connection.commit()
+
+
+class NameTable:
+    """In-memory map from name to id for one of the tables with
+    a unique name (drug, cell_line and experiment). All the rows are
+    fetched once, and names that are not found are inserted.
+
+    Arguments
+    ---------
+    connection
+        A DB-API connection
+    table : str
+        The name of the table
+    placeholder : str
+        The parameter placeholder of the database driver. Default: "?"
+    """
+
+    def __init__(self, connection, table: str, placeholder: str = "?"):
+        self._connection = connection
+        self.table = table
+        self._placeholder = placeholder
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT name, id FROM {table}")
+        self._ids: Dict[str, int] = dict(cursor.fetchall())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def get_id(self, name: Optional[str], **columns: Any) -> Optional[int]:
+        """Return the id of the row with the given name, and insert
+        a new row, with the additional columns, if it does not exist
+        """
+        if name is None:
+            return None
+        try:
+            return self._ids[name]
+        except KeyError:
+            pass
+
+        names = ["name"] + list(columns)
+        placeholders = ", ".join([self._placeholder] * len(names))
+        cursor = self._connection.cursor()
+        cursor.execute(
+            f"INSERT INTO {self.table} ({', '.join(names)}) VALUES ({placeholders})",
+            [name] + list(columns.values()),
+        )
+        # Select the id instead of using cursor.lastrowid, which is not
+        # the id of the row with all drivers (e.g psycopg2)
+        cursor.execute(
+            f"SELECT id FROM {self.table} WHERE name = {self._placeholder}",
+            [name],
+        )
+        (self._ids[name],) = cursor.fetchone()
+        logger.debug(f"Added {name} to {self.table}")
+        return self._ids[name]
+
+
+class LoadResult(NamedTuple):
+    inserted: int
+    skipped: int
+
+
+def _chunks(it: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(it)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def add_content_hash_column(connection) -> None:
+    """Add the column with the content hash, and the unique index on the
+    experiment and the path, to the mps_data table if they are not there
+    already, e.g if the table was created by ``mps_database``.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT * FROM mps_data WHERE 1 = 0")
+    if "content_hash" not in [column[0] for column in cursor.description]:
+        cursor.execute("ALTER TABLE mps_data ADD COLUMN content_hash VARCHAR")
+        cursor.execute(EXPERIMENT_PATH_INDEX)
+        connection.commit()
+
+
+def _is_sqlite(connection) -> bool:
+    # Unwrap e.g ``engine.raw_connection()`` in SQLAlchemy
+    for attr in ("dbapi_connection", "connection"):
+        connection = getattr(connection, attr, connection)
+    return isinstance(connection, sqlite3.Connection)
+
+
+def _unique_columns(connection) -> List[Set[str]]:
+    """Return the columns of each unique constraint on the mps_data table"""
+    cursor = connection.cursor()
+    if _is_sqlite(connection):
+        cursor.execute("PRAGMA index_list(mps_data)")
+        indexes = [row[1] for row in cursor.fetchall() if row[2]]
+        columns = []
+        for index in indexes:
+            cursor.execute(f'PRAGMA index_info("{index}")')
+            columns.append({row[2] for row in cursor.fetchall()})
+        return columns
+
+    cursor.execute(
+        "SELECT tc.constraint_name, kcu.column_name "
+        "FROM information_schema.table_constraints AS tc "
+        "JOIN information_schema.key_column_usage AS kcu "
+        "ON kcu.constraint_name = tc.constraint_name "
+        "AND kcu.table_name = tc.table_name "
+        "WHERE tc.table_name = 'mps_data' AND tc.constraint_type = 'UNIQUE'",
+    )
+    constraints: Dict[str, Set[str]] = {}
+    for name, column in cursor.fetchall():
+        constraints.setdefault(name, set()).add(column)
+    return list(constraints.values())
+
+
+def has_unique_path(connection) -> bool:
+    """Return True if the path is unique in the whole mps_data table, and
+    not only within each experiment, as in the tables created by
+    ``mps_database``
+    """
+    return {"path"} in _unique_columns(connection)
+
+
+def content_hash(record: MPSData, **names: Optional[str]) -> str:
+    """Return a hash of the parsed data of the record, i.e
+    `MPSData.sql_data` and `MPSData.json_keys`, and of the
+    additional names (e.g the experiment and the cell line).
+    """
+    content = {"sql": record.sql_data(), "json": record.json_keys(), **names}
+    dump = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(dump.encode()).hexdigest()
+
+
+def existing_paths(
+    connection,
+    experiment_id: Optional[int] = None,
+    placeholder: str = "?",
+) -> Set[str]:
+    """Return the paths that are already in the database, either for
+    all experiments or for the experiment with the given id
+    """
+    cursor = connection.cursor()
+    if experiment_id is None:
+        cursor.execute("SELECT path FROM mps_data")
+    else:
+        cursor.execute(
+            f"SELECT path FROM mps_data WHERE experiment_id = {placeholder}",
+            (experiment_id,),
+        )
+    return {path for (path,) in cursor.fetchall()}
+
+
+class _Rows:
+    """Create the rows of the mps_data table from the records"""
+
+    columns = ("drug_id", "experiment_id", "cell_line_id") + COLUMNS
+    columns += ("last_updated", "content_hash")
+
+    def __init__(
+        self,
+        connection,
+        experiment: str,
+        cell_line: Optional[str],
+        operator: Optional[str],
+        date: Optional[datetime.date],
+        placeholder: str,
+    ):
+        add_content_hash_column(connection)
+        self.drugs = NameTable(connection, "drug", placeholder=placeholder)
+        self.cell_lines = NameTable(connection, "cell_line", placeholder=placeholder)
+        self.experiments = NameTable(connection, "experiment", placeholder=placeholder)
+        self.experiment = experiment
+        self.experiment_id = self.experiments.get_id(
+            experiment,
+            operator=operator,
+            date=None if date is None else date.isoformat(),
+        )
+        self.cell_line = cell_line
+        self.last_updated = datetime.datetime.now().isoformat(" ")
+
+    def hash(self, record: MPSData) -> str:
+        return content_hash(
+            record,
+            experiment=self.experiment,
+            cell_line=record.cell_line or self.cell_line,
+        )
+
+    def row(self, record: MPSData, path: str, hash: str) -> Tuple[Any, ...]:
+        return (
+            self.drugs.get_id(record.drug),
+            self.experiment_id,
+            self.cell_lines.get_id(record.cell_line or self.cell_line),
+            path,
+            *(record.get(column) for column in COLUMNS[1:]),
+            self.last_updated,
+            hash,
+        )
+
+
+def _execute_chunks(
+    connection,
+    statement: str,
+    rows: Iterable[Tuple[Any, ...]],
+    chunksize: int,
+) -> int:
+    """Execute the statement for the rows in chunks, and
+    return the number of rows
+    """
+    num_rows = 0
+    cursor = connection.cursor()
+    for chunk in _chunks(rows, chunksize):
+        cursor.executemany(statement, chunk)
+        num_rows += len(chunk)
+    return num_rows
+
+
+def _posix_path(record: MatchResult) -> str:
+    if isinstance(record, MatchError):
+        raise record
+    return Path(record.path).as_posix()
+
+
+def load(
+    connection,
+    records: Iterable[MatchResult],
+    experiment: str,
+    cell_line: Optional[str] = None,
+    operator: Optional[str] = None,
+    date: Optional[datetime.date] = None,
+    chunksize: int = 1000,
+    placeholder: str = "?",
+) -> LoadResult:
+    """Insert the records that are not already in the database
+
+    Arguments
+    ---------
+    connection
+        A DB-API connection. The tables need to exist, see `create_tables`.
+    records : iterable
+        The parsed data, e.g the output of `mps_data_parser.scan`
+    experiment : str
+        Name of the experiment
+    cell_line : str
+        Name of the cell line used for the records that do not
+        have a cell line
+    operator : str
+        The operator of the experiment, used if the experiment is new
+    date : datetime.date
+        The date of the experiment, used if the experiment is new
+    chunksize : int
+        Number of rows inserted with each ``executemany``. Default: 1000
+    placeholder : str
+        The parameter placeholder of the database driver, e.g "%s" for
+        psycopg2. Default: "?"
+
+    Returns
+    -------
+    LoadResult
+        The number of inserted records and the number of records that
+        were skipped since their path was already in the experiment (or
+        in any experiment, if the path is unique in the whole table, see
+        `has_unique_path`)
+
+    Raises
+    ------
+    MatchError
+        If one of the records is a MatchError
+    """
+    paths: Set[str] = set()
+    skipped = 0
+
+    def rows(table: _Rows) -> Iterator[Tuple[Any, ...]]:
+        nonlocal skipped
+        for record in records:
+            path = _posix_path(record)
+            if path in paths:
+                skipped += 1
+                continue
+            paths.add(path)
+            yield table.row(record, path, table.hash(record))  # type: ignore
+
+    columns = _Rows.columns
+    statement = (
+        f"INSERT INTO mps_data ({', '.join(columns)}) "
+        f"VALUES ({', '.join([placeholder] * len(columns))})"
+    )
+    try:
+        table = _Rows(connection, experiment, cell_line, operator, date, placeholder)
+        experiment_id = None if has_unique_path(connection) else table.experiment_id
+        paths.update(existing_paths(connection, experiment_id, placeholder))
+        inserted = _execute_chunks(connection, statement, rows(table), chunksize)
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+    logger.info(f"Inserted {inserted} records, skipped {skipped} existing records")
+    return LoadResult(inserted=inserted, skipped=skipped)
+
+
+class SyncResult(NamedTuple):
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+    skipped: int = 0
+
+
+def sync(
+    connection,
+    records: Iterable[MatchResult],
+    experiment: str,
+    cell_line: Optional[str] = None,
+    operator: Optional[str] = None,
+    date: Optional[datetime.date] = None,
+    chunksize: int = 1000,
+    placeholder: str = "?",
+) -> SyncResult:
+    """Make the rows of the experiment in the database match the records
+
+    A hash of the content of each record (see `content_hash`) is stored
+    with the row, and only records with a new hash are written, using
+    ``INSERT ... ON CONFLICT (experiment_id, path) DO UPDATE``, so
+    experiments with the same relative paths do not touch each other's
+    rows. Rows of the experiment whose path is not among the records,
+    e.g since the file was deleted, are deleted. Syncing the same
+    records again does not write anything to the database.
+
+    If the path is unique in the whole table (see `has_unique_path`),
+    ``ON CONFLICT (path)`` is used instead, and records whose path
+    belongs to another experiment are skipped.
+
+    The arguments are the same as for `load`.
+
+    Returns
+    -------
+    SyncResult
+        The number of inserted, updated, deleted, unchanged and skipped
+        rows
+
+    Raises
+    ------
+    MatchError
+        If one of the records is a MatchError
+    """
+    experiments = NameTable(connection, "experiment", placeholder=placeholder)
+    hashes: Dict[str, Optional[str]] = {}
+    if experiment in experiments:
+        add_content_hash_column(connection)
+        cursor = connection.cursor()
+        cursor.execute(
+            f"SELECT path, content_hash FROM mps_data WHERE experiment_id = {placeholder}",
+            (experiments.get_id(experiment),),
+        )
+        hashes = dict(cursor.fetchall())
+
+    seen: Set[str] = set()
+    # Paths of other experiments, if the path is unique in the whole table
+    taken: Set[str] = set()
+    inserted = unchanged = skipped = 0
+
+    def rows(table: _Rows) -> Iterator[Tuple[Any, ...]]:
+        nonlocal inserted, unchanged, skipped
+        for record in records:
+            path = _posix_path(record)
+            if path in taken:
+                skipped += 1
+                continue
+            seen.add(path)
+            hash = table.hash(record)  # type: ignore
+            if path not in hashes:
+                inserted += 1
+            elif hashes[path] == hash:
+                unchanged += 1
+                continue
+            yield table.row(record, path, hash)  # type: ignore
+
+    columns = _Rows.columns
+    try:
+        table = _Rows(connection, experiment, cell_line, operator, date, placeholder)
+        target = "experiment_id, path"
+        if has_unique_path(connection):
+            target = "path"
+            taken.update(existing_paths(connection).difference(hashes))
+        statement = (
+            f"INSERT INTO mps_data ({', '.join(columns)}) "
+            f"VALUES ({', '.join([placeholder] * len(columns))}) "
+            f"ON CONFLICT ({target}) DO UPDATE SET "
+            + ", ".join(
+                f"{c} = excluded.{c}"
+                for c in columns
+                if c not in ("experiment_id", "path")
+            )
+        )
+        written = _execute_chunks(connection, statement, rows(table), chunksize)
+        deleted = _execute_chunks(
+            connection,
+            f"DELETE FROM mps_data WHERE experiment_id = {placeholder} "
+            f"AND path = {placeholder}",
+            ((table.experiment_id, path) for path in hashes if path not in seen),
+            chunksize,
+        )
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+
+    if skipped:
+        logger.warning(
+            f"Skipped {skipped} records whose path belongs to another experiment",
+        )
+    result = SyncResult(
+        inserted=inserted,
+        updated=written - inserted,
+        deleted=deleted,
+        unchanged=unchanged,
+        skipped=skipped,
+    )
+    logger.info(
+        f"Inserted {result.inserted}, updated {result.updated}, "
+        f"deleted {result.deleted} and kept {result.unchanged} records",
+    )
+    return result
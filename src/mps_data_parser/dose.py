@@ -0,0 +1,281 @@
+"""Parse, sort and group doses, e.g ``"10uM"``, ``"100 nM"`` or
+``"no dose"``.
+
+The doses are parsed in bulk into an array with the concentration in
+molar (mol/L) and an array with a code for the unit that was used. Each
+distinct string is only parsed once, so large arrays with a few distinct
+doses are cheap to handle.
+
+.. code::
+
+    doses = dose.parse_doses(["100uM", "10 uM", "no dose", "100 nM"])
+    doses.values
+    # array([1.e-04, 1.e-05, 0.e+00, 1.e-07])
+    dose.sort(doses)
+    # ['no dose', '100 nM', '10 uM', '100uM']
+"""
+
+import re
+from functools import lru_cache
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+
+# The codes of the units are the indices in this tuple
+UNITS = ("pM", "nM", "uM", "mM", "cM", "dM", "M")
+UNIT_FACTORS = {
+    "pM": 1e-12,
+    "nM": 1e-9,
+    "uM": 1e-6,
+    "mM": 1e-3,
+    "cM": 1e-2,
+    "dM": 1e-1,
+    "M": 1.0,
+}
+_UNIT_CODES = {unit: code for code, unit in enumerate(UNITS)}
+# Other ways of writing micro
+_UNIT_CODES.update({"µM": _UNIT_CODES["uM"], "μM": _UNIT_CODES["uM"]})
+# Divide by the number of units per molar instead of multiplying with
+# the factor, so that e.g "1000nM" and "1uM" give exactly the same value
+_PER_MOLAR = {
+    "pM": 1e12,
+    "nM": 1e9,
+    "uM": 1e6,
+    "mM": 1e3,
+    "cM": 1e2,
+    "dM": 1e1,
+    "M": 1.0,
+}
+
+# Codes that are not units
+NO_DOSE = len(UNITS)
+NOT_A_DOSE = -1
+
+# The molar suffix may be written in lower case when there is a prefix,
+# e.g "0nm", but the prefix is case sensitive so that "mM" and "MM" differ
+_DOSE_PATTERN = re.compile(
+    r"^\s*(?P<value>\d+(?:\.\d*)?|\.\d+)(?:[eE](?P<exponent>[+-]?\d+))?"
+    r"\s*(?P<unit>[pnuµμmcd][mM]|M)\s*$",
+)
+_NO_DOSE_PATTERN = re.compile(r"^\s*no[\s_]*dose\s*$", re.IGNORECASE)
+
+DoseLike = Union["Doses", Iterable[str]]
+
+
+class Doses(NamedTuple):
+    """Parsed doses
+
+    Arguments
+    ---------
+    doses : np.ndarray
+        The original strings
+    values : np.ndarray
+        The concentration in molar. No dose is 0 and strings that
+        could not be parsed are NaN.
+    units : np.ndarray
+        The code of the unit, i.e the index in `UNITS`, `NO_DOSE` for
+        no dose and `NOT_A_DOSE` for strings that could not be parsed.
+    """
+
+    doses: np.ndarray
+    values: np.ndarray
+    units: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.doses)
+
+    @property
+    def parsed(self) -> np.ndarray:
+        """Boolean array which is True for the doses that were parsed"""
+        return self.units != NOT_A_DOSE
+
+
+def parse_dose(dose: Any) -> Tuple[float, int]:
+    """Parse a single dose
+
+    Arguments
+    ---------
+    dose : str
+        The dose, e.g "10uM", "100 nM" or "no dose"
+
+    Returns
+    -------
+    Tuple[float, int]
+        The concentration in molar and the code of the unit. If the
+        dose could not be parsed this is (nan, NOT_A_DOSE).
+    """
+    if not isinstance(dose, str):
+        return np.nan, NOT_A_DOSE
+    match = _DOSE_PATTERN.match(dose)
+    if match is None:
+        if _NO_DOSE_PATTERN.match(dose):
+            return 0.0, NO_DOSE
+        return np.nan, NOT_A_DOSE
+
+    value, exponent, unit = match.group("value", "exponent", "unit")
+    if exponent is not None:
+        value += "e" + exponent
+    code = _UNIT_CODES[unit[:-1] + "M"]
+    return float(value) / _PER_MOLAR[UNITS[code]], code
+
+
+def parse_doses(doses: DoseLike) -> Doses:
+    """Parse many doses at once. Each distinct dose is parsed once.
+
+    Arguments
+    ---------
+    doses : iterable
+        The doses, e.g ["10uM", "100 nM", "no dose"]
+
+    Returns
+    -------
+    Doses
+        The parsed doses
+    """
+    if isinstance(doses, Doses):
+        return doses
+
+    index: Dict[Any, int] = {}
+    strings = list(doses)
+    inverse = np.fromiter(
+        (index.setdefault(dose, len(index)) for dose in strings),
+        dtype=np.intp,
+        count=len(strings),
+    )
+    values = np.empty(len(index), dtype=float)
+    units = np.empty(len(index), dtype=np.int8)
+    for i, dose in enumerate(index):
+        values[i], units[i] = parse_dose(dose)
+
+    array = np.empty(len(strings), dtype=object)
+    array[:] = strings
+    return Doses(doses=array, values=values[inverse], units=units[inverse])
+
+
+def argsort(doses: DoseLike) -> np.ndarray:
+    """Return the indices that sort the doses by increasing concentration.
+    Doses with the same concentration are sorted by the strings, and the
+    strings that are not doses come last, sorted alphabetically.
+
+    Arguments
+    ---------
+    doses : iterable
+        The doses, or the result of `parse_doses`
+
+    Returns
+    -------
+    np.ndarray
+        The indices
+    """
+    doses = parse_doses(doses)
+    # Rank the strings so that they can be used as a sort key
+    strings = doses.doses.astype(str)
+    _, ranks = np.unique(strings, return_inverse=True)
+    not_parsed = ~doses.parsed
+    values = np.where(not_parsed, 0.0, doses.values)
+    return np.lexsort((ranks.ravel(), values, not_parsed))
+
+
+def sort(doses: DoseLike) -> List[str]:
+    """Sort the doses by increasing concentration, see `argsort`
+
+    Example
+    -------
+    .. code::
+
+        sort(['100uM', '10 uM', '100 nM', '1uM'])
+        # ['100 nM', '1uM', '10 uM', '100uM']
+    """
+    doses = parse_doses(doses)
+    return doses.doses[argsort(doses)].tolist()
+
+
+def to_unit(doses: DoseLike, unit: str = "uM") -> np.ndarray:
+    """Return the concentrations in the given unit. No dose is 0 and
+    strings that are not doses are NaN.
+    """
+    doses = parse_doses(doses)
+    return doses.values * _PER_MOLAR[unit]
+
+
+def normalize(doses: DoseLike, unit: str = "uM") -> List[str]:
+    """Write all doses in the same unit, so that e.g "1000nM" and
+    "1 uM" become the same string. No dose and strings that are not
+    doses are kept as they are.
+
+    Example
+    -------
+    .. code::
+
+        normalize(["1000nM", "1 uM", "no dose"])
+        # ['1 uM', '1 uM', 'no dose']
+    """
+    doses = parse_doses(doses)
+    values = to_unit(doses, unit)
+    keep = (doses.units == NO_DOSE) | ~doses.parsed
+    formatted: Dict[float, str] = {}
+    result = []
+    for dose, value, is_kept in zip(doses.doses, values.tolist(), keep.tolist()):
+        if is_kept:
+            result.append(dose)
+            continue
+        if value not in formatted:
+            formatted[value] = f"{value:g} {unit}"
+        result.append(formatted[value])
+    return result
+
+
+def bucket(doses: DoseLike, edges: Sequence[float], unit: str = "uM") -> np.ndarray:
+    """Put the doses into buckets based on their concentration
+
+    Arguments
+    ---------
+    doses : iterable
+        The doses, or the result of `parse_doses`
+    edges : list
+        Increasing edges of the buckets, in the given unit
+    unit : str
+        The unit of the edges. Default: "uM"
+
+    Returns
+    -------
+    np.ndarray
+        The index of the bucket for each dose, i.e ``i`` such that
+        ``edges[i - 1] <= dose < edges[i]``. Strings that are not
+        doses are put in bucket -1.
+
+    Example
+    -------
+    .. code::
+
+        bucket(["no dose", "100 nM", "10 uM"], edges=[0.01, 1])
+        # array([0, 1, 2])
+    """
+    doses = parse_doses(doses)
+    buckets = np.digitize(to_unit(doses, unit), edges)
+    buckets[~doses.parsed] = -1
+    return buckets
+
+
+@lru_cache(maxsize=None)
+def _unit_registry():
+    import pint
+
+    return pint.UnitRegistry()
+
+
+def to_quantity(doses: DoseLike):
+    """Return the concentrations as a pint Quantity in molar. Strings
+    that are not doses are NaN. Note that pint is only imported when
+    this function is called.
+    """
+    doses = parse_doses(doses)
+    ureg = _unit_registry()
+    return ureg.Quantity(doses.values, "mol/L")
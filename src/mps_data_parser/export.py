@@ -0,0 +1,208 @@
+"""Save the parsed data of a whole experiment to a columnar file, and
+load it back as a `Batch`
+
+.. code::
+
+    export.save(scan(folder, config), "181116_Lidocaine.npz")
+    batch = export.load("181116_Lidocaine.npz")
+    batch["dose"][batch["trace_type"] == "voltage"]
+
+The columns are the keys in `MPSData.arguments` followed by any other
+keys found in the data. The format is chosen from the file extension:
+
+- ``.npz``: compressed numpy file where each column is dictionary
+  encoded, i.e stored as the distinct values and an integer code
+  for each row. Only numpy is needed.
+- ``.parquet``: Parquet file with dictionary encoded columns. Needs
+  ``pyarrow``.
+- ``.arrow`` or ``.feather``: Arrow IPC file. Needs ``pyarrow``.
+
+All values are stored as strings, and missing values as None.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+
+from .batch import Batch
+from .batch import factorize
+from .mps_data import MPSData
+from .pathmatcher import MatchError
+
+logger = logging.getLogger(__name__)
+
+PathStr = Union[str, Path]
+MatchResult = Union[MPSData, MatchError]
+
+# Name of the column (or array) with the matched flags
+MATCHED = "_matched"
+_NPZ_KEYS = "_keys"
+_NPZ_CODES = ".codes"
+_NPZ_VALUES = ".values"
+
+
+def to_batch(records: Iterable[MatchResult]) -> Batch:
+    """Collect the output of a scan into a `Batch`. A MatchError
+    becomes a row that is not matched, with only the path set.
+    """
+    matched: List[bool] = []
+
+    def rows() -> Iterator[Dict[str, Any]]:
+        for record in records:
+            if isinstance(record, MatchError):
+                matched.append(False)
+                path = record.path
+                yield {} if path is None else {"path": str(path)}
+            else:
+                matched.append(True)
+                yield record.to_dict()
+
+    batch = Batch.from_records(rows(), keys=MPSData.arguments())
+    batch.matched[:] = matched
+    return batch
+
+
+def _as_batch(data: Union[Batch, Iterable[MatchResult]]) -> Batch:
+    if isinstance(data, Batch):
+        return data
+    return to_batch(data)
+
+
+def encode(column: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Dictionary encode a column
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The distinct values (as strings) and the index of the value for
+        each row, which is -1 for None.
+    """
+    # Convert the values to strings first, so that values that are not
+    # hashable (e.g the dictionary left by a lookup rule) can be encoded
+    # and values with the same string get the same code
+    rows = column.tolist() if isinstance(column, np.ndarray) else list(column)
+    codes, values = factorize(
+        [v if v is None or type(v) is str else str(v) for v in rows],
+    )
+    # Use the smallest integer type that can hold the codes
+    for dtype in (np.int8, np.int16, np.int32):
+        if len(values) <= np.iinfo(dtype).max:
+            codes = codes.astype(dtype)
+            break
+    return np.array(values, dtype=str), codes
+
+
+def decode(values: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Inverse of `encode`, returning an object array"""
+    # The last element is None, and is picked by code -1
+    lookup = np.empty(len(values) + 1, dtype=object)
+    lookup[:-1] = values.tolist()
+    return lookup[codes]
+
+
+def save_npz(data: Union[Batch, Iterable[MatchResult]], filename: PathStr) -> None:
+    """Save the data to a compressed npz file, see `save`"""
+    batch = _as_batch(data)
+    arrays = {_NPZ_KEYS: np.array(batch.keys(), dtype=str), MATCHED: batch.matched}
+    for key in batch.keys():
+        values, codes = encode(batch[key])
+        arrays[key + _NPZ_VALUES] = values
+        arrays[key + _NPZ_CODES] = codes
+    with open(filename, "wb") as f:
+        np.savez_compressed(f, **arrays)
+
+
+def load_npz(filename: PathStr) -> Batch:
+    """Load data saved with `save_npz`"""
+    with np.load(filename, allow_pickle=False) as arrays:
+        columns = {
+            key: decode(arrays[key + _NPZ_VALUES], arrays[key + _NPZ_CODES])
+            for key in arrays[_NPZ_KEYS].tolist()
+        }
+        return Batch(columns, arrays[MATCHED])
+
+
+def to_arrow(data: Union[Batch, Iterable[MatchResult]]):
+    """Return the data as a ``pyarrow.Table`` with dictionary
+    encoded string columns
+    """
+    import pyarrow as pa
+
+    batch = _as_batch(data)
+    columns = {}
+    for key in batch.keys():
+        values, codes = encode(batch[key])
+        columns[key] = pa.DictionaryArray.from_arrays(
+            pa.array(codes, mask=codes < 0),
+            pa.array(values.tolist(), type=pa.string()),
+        )
+    columns[MATCHED] = pa.array(batch.matched)
+    return pa.table(columns)
+
+
+def from_arrow(table) -> Batch:
+    """Create a `Batch` from a ``pyarrow.Table`` created with `to_arrow`"""
+    columns = {}
+    for key in table.column_names:
+        if key == MATCHED:
+            continue
+        column = table.column(key).combine_chunks()
+        if hasattr(column, "dictionary"):
+            values = np.array(column.dictionary.to_pylist(), dtype=str)
+            codes = column.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+            columns[key] = decode(values, codes)
+        else:
+            columns[key] = column.to_pylist()
+    matched = table.column(MATCHED).to_numpy(zero_copy_only=False)
+    return Batch(columns, matched)
+
+
+def save(data: Union[Batch, Iterable[MatchResult]], filename: PathStr) -> None:
+    """Save the data to a columnar file. The format is chosen from
+    the extension of the file (.npz, .parquet, .arrow or .feather).
+
+    Arguments
+    ---------
+    data : Batch or iterable
+        The output of ``PathMatcher.match_many`` or of a scan
+    filename : str
+        The file
+    """
+    suffix = Path(filename).suffix
+    if suffix == ".npz":
+        save_npz(data, filename)
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(to_arrow(data), str(filename))
+    elif suffix in (".arrow", ".feather"):
+        import pyarrow.feather as feather
+
+        feather.write_feather(to_arrow(data), str(filename))
+    else:
+        raise ValueError(f"Unknown file format {suffix!r} of file {filename}")
+    logger.info(f"Saved parsed data to {filename}")
+
+
+def load(filename: PathStr) -> Batch:
+    """Load data saved with `save`"""
+    suffix = Path(filename).suffix
+    if suffix == ".npz":
+        return load_npz(filename)
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        return from_arrow(pq.read_table(str(filename)))
+    if suffix in (".arrow", ".feather"):
+        import pyarrow.feather as feather
+
+        return from_arrow(feather.read_table(str(filename)))
+    raise ValueError(f"Unknown file format {suffix!r} of file {filename}")
@@ -0,0 +1,230 @@
+"""Group the parsed files of an experiment by a set of keys (e.g the
+``unique_columns`` in the config) and pair the traces of each type
+within each group
+
+.. code::
+
+    batch = pathmatcher.match_many(paths)
+    groups = grouping.group_traces(batch, ["media", "chip", "dose"])
+    groups.table(batch)  # One row per group, with a path per trace type
+    groups.missing  # Groups x trace types, True if there is no trace
+    for group, trace_type, rows in groups.duplicates():
+        print(groups.group_key(group), trace_type, batch["path"][rows])
+
+The values of each key are replaced with integer codes, which are
+combined into one code per file, so that the grouping and counting is
+done with numpy on integer arrays and no Python code runs per file.
+"""
+
+import logging
+from typing import Iterator
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+from .batch import Batch
+from .batch import factorize
+from .pathmatcher import TRACE_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Largest combined code before the codes are compressed
+_MAX_CODE = 2**62
+
+
+def _first_seen_order(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Number the distinct codes in the order they are first seen
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The new code of each element, and the index of the first
+        element with each new code
+    """
+    _, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank[inverse.ravel()], first[order]
+
+
+def group_rows(batch: Batch, keys: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Assign a group to each row, such that rows with the same value
+    for all the keys are in the same group. Rows that are not matched,
+    or where one of the keys is missing, are not in any group.
+
+    Arguments
+    ---------
+    batch : Batch
+        The parsed files
+    keys : list
+        The keys to group by
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The group of each row (-1 if the row is not in a group), and the
+        first row in each group. The groups are numbered in the order
+        they are first seen.
+    """
+    valid = batch.matched.copy()
+    combined = np.zeros(len(batch), dtype=np.int64)
+    size = 1
+    for key in keys:
+        codes, uniques = factorize(batch.get(key))
+        valid &= codes >= 0
+        radix = max(len(uniques), 1)
+        if size * radix >= _MAX_CODE:
+            # Renumber the combinations seen so far so that it fits
+            _, combined = np.unique(combined, return_inverse=True)
+            combined = combined.ravel().astype(np.int64)
+            size = int(combined.max()) + 1
+        combined = combined * radix + np.maximum(codes, 0)
+        size *= radix
+
+    (rows,) = np.nonzero(valid)
+    group = np.full(len(batch), -1, dtype=np.int64)
+    if len(rows) == 0:
+        return group, rows
+    group[rows], first = _first_seen_order(combined[rows])
+    return group, rows[first]
+
+
+class TraceGroups:
+    """The traces of each type in each group, see `group_traces`
+
+    Arguments
+    ---------
+    keys : list
+        The keys that the rows are grouped by
+    values : Batch
+        One row per group, with the values of the keys
+    trace_types : list
+        The trace types, i.e the columns of `counts` and `rows`
+    group : np.ndarray
+        The group of each file, or -1 if the file is not in a group
+    trace : np.ndarray
+        The index of the trace type of each file, or -1 if the trace
+        type is not one of `trace_types`
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        values: Batch,
+        trace_types: Sequence[str],
+        group: np.ndarray,
+        trace: np.ndarray,
+    ):
+        self.keys = tuple(keys)
+        self.values = values
+        self.trace_types = tuple(trace_types)
+        self.group = group
+        self.trace = trace
+
+        num_types = len(self.trace_types)
+        (self._files,) = np.nonzero((group >= 0) & (trace >= 0))
+        cells = group[self._files] * num_types + trace[self._files]
+        # Sort the files by cell, keeping the order of the files in each cell
+        self._order = np.argsort(cells, kind="stable")
+        self._cells = cells[self._order]
+
+        self.counts = np.bincount(cells, minlength=len(self) * num_types).reshape(
+            len(self),
+            num_types,
+        )
+        # The last file in each cell
+        last = np.ones(len(self._cells), dtype=bool)
+        last[:-1] = self._cells[1:] != self._cells[:-1]
+        self.rows = np.full(len(self) * num_types, -1, dtype=np.int64)
+        self.rows[self._cells[last]] = self._files[self._order[last]]
+        self.rows = self.rows.reshape(len(self), num_types)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(groups={len(self)}, keys={self.keys}, "
+            f"trace_types={self.trace_types})"
+        )
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def missing(self) -> np.ndarray:
+        """Groups x trace types, True where there is no file"""
+        return self.counts == 0
+
+    @property
+    def duplicated(self) -> np.ndarray:
+        """Groups x trace types, True where there is more than one file"""
+        return self.counts > 1
+
+    def group_key(self, group: int) -> str:
+        """The values of the keys for a group joined with underscores"""
+        return "_".join(str(self.values[key][group]) for key in self.keys)
+
+    def duplicates(self) -> Iterator[Tuple[int, str, np.ndarray]]:
+        """Yield the group, the trace type and the rows of the files
+        for each group that has more than one file of a trace type
+        """
+        num_types = len(self.trace_types)
+        (cells,) = np.nonzero(self.duplicated.ravel())
+        starts = np.searchsorted(self._cells, cells, side="left")
+        ends = np.searchsorted(self._cells, cells, side="right")
+        for cell, start, end in zip(cells.tolist(), starts, ends):
+            group, trace = divmod(cell, num_types)
+            rows = self._files[self._order[start:end]]
+            yield group, self.trace_types[trace], rows
+
+    def table(self, batch: Batch, column: str = "path") -> Batch:
+        """The paired traces, with one row per group with the values of
+        the keys, and one column per trace type with the value of
+        `column` for the (last) file of that type, or None if missing.
+        """
+        source = batch.get(column)
+        columns = {key: self.values[key] for key in self.keys}
+        for i, trace_type in enumerate(self.trace_types):
+            rows = self.rows[:, i]
+            values = np.full(len(self), None, dtype=object)
+            values[rows >= 0] = source[rows[rows >= 0]]
+            columns[trace_type] = values
+        return Batch(columns, np.ones(len(self), dtype=bool))
+
+
+def group_traces(
+    batch: Batch,
+    keys: Sequence[str],
+    trace_types: Sequence[str] = TRACE_TYPES,
+) -> TraceGroups:
+    """Group the files by the keys and count the files of each trace
+    type in each group
+
+    Arguments
+    ---------
+    batch : Batch
+        The parsed files, e.g from ``PathMatcher.match_many`` or
+        ``export.to_batch``
+    keys : list
+        The keys that identify an experiment, e.g the ``unique_columns``
+        in the config
+    trace_types : list
+        The trace types to pair. Default: ``TRACE_TYPES``
+
+    Returns
+    -------
+    TraceGroups
+        The groups
+    """
+    group, first = group_rows(batch, keys)
+    values = Batch({key: batch.get(key)[first] for key in keys}, batch.matched[first])
+
+    codes, uniques = factorize(batch.get("trace_type"))
+    position = {trace_type: i for i, trace_type in enumerate(trace_types)}
+    # The last element is used for the code -1, i.e None
+    lookup = np.array([position.get(u, -1) for u in uniques] + [-1], dtype=np.int64)
+    trace = lookup[codes]
+
+    groups = TraceGroups(keys, values, trace_types, group, trace)
+    logger.debug(f"Grouped {len(batch)} files into {len(groups)} groups")
+    return groups
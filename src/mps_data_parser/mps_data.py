@@ -1,7 +1,12 @@
 import logging
+from functools import lru_cache
+from typing import Any
+from typing import Dict
 from typing import Optional
+from typing import Union
 
 from .abreviations import Abbreviations
+from .abreviations import NameCache
 
 logger = logging.getLogger(__name__)
 
@@ -14,44 +19,128 @@ SQL_KEYS = [
     "chip",
 ]
 
+REQUIRED_ARGUMENTS = ("folder", "path")
+OPTIONAL_ARGUMENTS = (
+    "media",
+    "dose",
+    "pacing_frequency",
+    "trace_type",
+    "drug",
+    "cell_line",
+    "chip",
+    "date",
+    "operator",
+    "channel",
+    "seq_nr",
+    "extension",
+    "roi",
+    "framerate",
+    "binsize",
+    "secondary_drug",
+)
+_ARGUMENTS = frozenset(REQUIRED_ARGUMENTS + OPTIONAL_ARGUMENTS)
+_SLOTS = REQUIRED_ARGUMENTS + OPTIONAL_ARGUMENTS
+_DEFAULT_OPTIONAL_ARGUMENTS = dict.fromkeys(OPTIONAL_ARGUMENTS)
+_setattr = object.__setattr__
+
+
+@lru_cache(maxsize=None)
+def _default_names() -> NameCache:
+    """The abbreviations used when no abbreviations are given"""
+    return NameCache(Abbreviations(raise_on_failure=False))
+
 
 class MPSData:
+    """The data parsed from a path
+
+    The arguments in `MPSData.arguments` are stored in slots to keep the
+    memory footprint of each object small. Any other keyword arguments
+    are stored in a separate dictionary, which is only created if needed,
+    and are available as attributes in the same way.
+    """
+
+    __slots__ = _SLOTS + ("_extra",)
+
     def __init__(
-        self, folder: str, path: str, abrev: Optional[Abbreviations], **kwargs
+        self,
+        folder: str,
+        path: str,
+        abrev: Optional[Union[Abbreviations, NameCache]],
+        **kwargs,
     ):
-        self.folder = folder
-        self.path = path
+        _setattr(self, "folder", folder)
+        _setattr(self, "path", path)
+        _setattr(self, "_extra", None)
+        for key in OPTIONAL_ARGUMENTS:
+            _setattr(self, key, None)
         if abrev is None:
-            abrev = Abbreviations(raise_on_failure=False)
+            abrev = _default_names()
 
-        optional_arguments = MPSData.default_optional_arguments()
-        # Check if we have a new argument
-        for key in kwargs:
-            if key not in optional_arguments:
+        for k, v in kwargs.items():
+            # Check if we have a new argument
+            if k not in _ARGUMENTS:
                 msg = (
-                    f"Key {key} is not a valid argument. "
+                    f"Key {k} is not a valid argument. "
                     "Please add this argument to the list of arguments to "
                     "MPSData class if you want it to be searchable. "
                 )
                 logger.debug(msg)
-
-        optional_arguments.update(kwargs)
-        # breakpoint()
-        for k, v in optional_arguments.items():
-            # Try to see if name is an abrevation, and if not use
-            # the orignal value
-
-            name = abrev.get_name(k, v) or v
-            setattr(self, k, name)
+                setattr(self, k, v if v is None else abrev.get_name(k, v) or v)
+            elif v is not None:
+                # Try to see if name is an abrevation, and if not use
+                # the orignal value
+                _setattr(self, k, abrev.get_name(k, v) or v)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        if key in _ARGUMENTS or key == "_extra":
+            _setattr(self, key, value)
+        else:
+            if self._extra is None:
+                _setattr(self, "_extra", {})
+            self._extra[key] = value
+
+    def __getattr__(self, key: str) -> Any:
+        # Only called if the attribute is not found in the slots
+        extra = object.__getattribute__(self, "_extra")
+        if extra is not None and key in extra:
+            return extra[key]
+        raise AttributeError(
+            f"{self.__class__.__name__!r} object has no attribute {key!r}",
+        )
 
     def __repr__(self):
         return f"{self.__class__.__name__}(folder={self.folder}, path={self.path})"
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MPSData":
+        """Create an object from the output of `to_dict`. Note
+        that the values are used as they are, i.e they are not
+        normalized with the abbreviations.
+        """
+        obj = cls.__new__(cls)
+        get = data.get
+        for key in _SLOTS:
+            _setattr(obj, key, get(key))
+        extra = {k: v for k, v in data.items() if k not in _ARGUMENTS}
+        _setattr(obj, "_extra", extra or None)
+        return obj
+
     def get(self, key: str) -> str:
-        return self.to_dict().get(key)
+        if key in _ARGUMENTS:
+            return getattr(self, key)
+        if self._extra is None:
+            return None
+        return self._extra.get(key)
 
     def to_dict(self):
-        return {k: v for k, v in self.__dict__.items() if v is not None}
+        d = {}
+        for key in _SLOTS:
+            value = getattr(self, key)
+            if value is not None:
+                d[key] = value
+        if self._extra is not None:
+            d.update((k, v) for k, v in self._extra.items() if v is not None)
+        return d
 
     def sql_data(self):
         return {k: v for k, v in self.to_dict().items() if k in SQL_KEYS}
@@ -64,28 +153,11 @@ class MPSData:
         """Default optional arguments are set
         to None, but takes string type if set.
         """
-        return dict(
-            media=None,
-            dose=None,
-            pacing_frequency=None,
-            trace_type=None,
-            drug=None,
-            cell_line=None,
-            chip=None,
-            date=None,
-            operator=None,
-            channel=None,
-            seq_nr=None,
-            extension=None,
-            roi=None,
-            framerate=None,
-            binsize=None,
-            secondary_drug=None,
-        )
+        return _DEFAULT_OPTIONAL_ARGUMENTS.copy()
 
     @staticmethod
     def required_arguments():
-        return ("folder", "path")
+        return REQUIRED_ARGUMENTS
 
     @staticmethod
     def arguments():
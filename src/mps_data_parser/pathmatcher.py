@@ -1,15 +1,29 @@
 import logging
+import os
 import re
+import string
+import time
 from pathlib import Path
 from typing import Any
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
 from typing import Optional
+from typing import TYPE_CHECKING
+from typing import Tuple
 from typing import Union
 
 import parse
 
 from .abreviations import Abbreviations
+from .abreviations import NameCache
 from .mps_data import MPSData
+from .rules import compile_rules
+
+if TYPE_CHECKING:
+    from .batch import Batch
+    from .profiling import ScanStats
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +48,138 @@ def channel_to_trace_type(channel: Optional[str]) -> Optional[str]:
         return None
 
 
+class MatchError(RuntimeError):
+    """Raised when a path is not matched by any of the patterns"""
+
+    def __init__(self, message: str, path: Optional[PathStr] = None):
+        super().__init__(message)
+        self.path = path
+
+
+def _is_plain_pattern(pattern: str) -> bool:
+    """Return True if all fields in the pattern are plain names without
+    any format specification or conversion, i.e parse returns the
+    captured strings as they are.
+    """
+    for _, field, spec, conversion in string.Formatter().parse(pattern):
+        if field is None:
+            continue
+        if spec or conversion or not field.isidentifier():
+            return False
+    return True
+
+
+def _literal_fragments(pattern: str) -> List[str]:
+    """Return the literal text between the fields of a pattern"""
+    fragments = []
+    current = ""
+    for literal, field, _, _ in string.Formatter().parse(pattern):
+        current += literal
+        if field is not None:
+            if current:
+                fragments.append(current)
+            current = ""
+    if current:
+        fragments.append(current)
+    return fragments
+
+
+def _contains_in_order(fragments: List[str], path: str) -> bool:
+    start = 0
+    for fragment in fragments:
+        start = path.find(fragment, start)
+        if start < 0:
+            return False
+        start += len(fragment)
+    return True
+
+
+class _LiteralIndex:
+    """Index of the literal fragments (directory names, filename anchors
+    such as ``_Channel`` and the extension) of each pattern.
+
+    A pattern can only match a path if all of its literal fragments are
+    present in the path in the same order. The fragments of all patterns
+    are tested once per path and the resulting bitmask is used to look up
+    the patterns that are worth trying. Since parse is case insensitive
+    the comparison is done on lower case strings, and only ascii
+    fragments are used.
+    """
+
+    max_cache_size = 4096
+
+    def __init__(self, patterns: List[str]):
+        self._fragments = [
+            [f.lower() for f in _literal_fragments(p) if f.isascii()] for p in patterns
+        ]
+        all_fragments = sorted(set(f for lst in self._fragments for f in lst))
+        self._bits = {f: 1 << i for i, f in enumerate(all_fragments)}
+        self._required = [
+            sum(self._bits[f] for f in set(lst)) for lst in self._fragments
+        ]
+        self._cache: Dict[int, Tuple[int, ...]] = {}
+
+    def candidates(self, path: str) -> List[int]:
+        """Return the indices of the patterns that could match the path"""
+        lowered = path.lower()
+        present = 0
+        for fragment, bit in self._bits.items():
+            if fragment in lowered:
+                present |= bit
+
+        candidates = self._cache.get(present)
+        if candidates is None:
+            candidates = tuple(
+                i
+                for i, required in enumerate(self._required)
+                if required & present == required
+            )
+            if len(self._cache) >= self.max_cache_size:
+                self._cache.clear()
+            self._cache[present] = candidates
+
+        return [
+            i for i in candidates if _contains_in_order(self._fragments[i], lowered)
+        ]
+
+
+def _branch_expression(
+    parser: parse.Parser,
+    pattern: str,
+    index: int,
+) -> Tuple[str, Optional[List[Tuple[str, str]]]]:
+    """Turn the regular expression of a parser into a branch that can
+    be merged with other branches into one alternation.
+
+    The branch is preceded by a lazy wildcard, so that when the alternation
+    is anchored at the start of the string the regex engine tries every
+    start position for the first branch before moving on to the next. This
+    gives the same first-match-wins semantics as calling ``search`` on each
+    parser in turn. All groups are renamed with a branch specific prefix,
+    including the backreferences used for repeated fields, and the branch
+    itself is a group named ``_b<index>`` which will be the ``lastgroup``
+    of the match.
+
+    Returns
+    -------
+    expression : str
+        The regular expression for the branch
+    groups : list
+        A list of (group name, field name) pairs, or None if the branch
+        needs to be evaluated by the original parser (e.g. if the pattern
+        contains typed fields).
+    """
+    prefix = f"_b{index}_"
+    expression = re.sub(r"\(\?P<(\w+)>", rf"(?P<{prefix}\1>", parser._expression)
+    expression = re.sub(r"\(\?P=(\w+)\)", rf"(?P={prefix}\1)", expression)
+    groups: Optional[List[Tuple[str, str]]] = None
+    if _is_plain_pattern(pattern):
+        groups = [
+            (prefix + group, name) for group, name in parser._group_to_name_map.items()
+        ]
+    return f".*?(?P<_b{index}>{expression})", groups
+
+
 class PathMatcher:
     """Base class for retrieving information about an experiment from the path
 
@@ -55,6 +201,15 @@ class PathMatcher:
         A dictionary on the same for as the abbreviation file. If both the
         `abrev_file` and this dictionary is provided and they have conflicting
         keys, then this dictionary will win.
+    single_pass : bool
+        If set to True, all candidate patterns for a path are merged into
+        a single regular expression so that each path is scanned only once,
+        regardless of the number of patterns. The result is the same as
+        when the patterns are tried one by one. Default: False.
+    normalized_abbreviations : bool
+        If set to True, values that are not found among the synonyms are
+        also looked up ignoring case, whitespace and underscores, so that
+        e.g "1 HZ" is resolved to "1Hz". Default: False.
     """
 
     def __init__(
@@ -64,6 +219,8 @@ class PathMatcher:
         strict: bool = True,
         abrev_file: Optional[PathStr] = None,
         additional_abbreviations: Optional[Dict[str, Any]] = None,
+        single_pass: bool = False,
+        normalized_abbreviations: bool = False,
     ):
 
         self.root = Path(root)
@@ -76,23 +233,54 @@ class PathMatcher:
         if regexs is None:
             regexs = config.get("patterns", [])
         self._regexs = list(map(lambda x: str(Path(x)), regexs))
-        self._rules = config.get("rules", [])
-        self.excludes = list(map(lambda x: str(Path(x)), config.get("excludes", [])))
+        # Rules are validated and compiled once, and unsafe rules are skipped
+        self._rules = compile_rules(config.get("rules", []))
+        # Older configs use the key "exclude". The excludes are substrings
+        # of the posix path, so only the separators are normalized, keeping
+        # e.g the trailing slash in "raw/"
+        excludes = config.get("excludes", []) + config.get("exclude", [])
+        self.excludes = [ex.replace("\\", "/") for ex in excludes]
         self._config = config.copy()
         self.abrev = Abbreviations(
             data=additional_abbreviations,
             filename=abrev_file,
             raise_on_failure=False,
+            normalized=normalized_abbreviations,
         )
 
         if additional_abbreviations is not None:
             self.abrev.update(additional_abbreviations)
+        # Most paths share the same few values, so the normalized names
+        # are memoized. See `NameCache.cache_info` for the hit rate.
+        self.name_cache = NameCache(self.abrev)
 
         try:
             self._extension = Path(self._regexs[0]).suffix
         except Exception:
             self._extension = ""
 
+        # Compile the patterns once so that each call only needs to run
+        # the underlying regular expressions
+        self._parsers: List[parse.Parser] = [parse.compile(r) for r in self._regexs]
+        self._index = _LiteralIndex(self._regexs)
+        # Matchers for the directory part of each pattern, one for each level
+        self._directory_parsers = [
+            [parse.compile(c) for c in Path(r).parts[:-1]] for r in self._regexs
+        ]
+        self._single_pass = single_pass
+        self._branches = (
+            [
+                _branch_expression(parser, regex, index)
+                for index, (parser, regex) in enumerate(
+                    zip(self._parsers, self._regexs)
+                )
+            ]
+            if single_pass
+            else []
+        )
+        # Combined regular expressions for each set of candidate patterns
+        self._combined: Dict[Tuple[int, ...], "re.Pattern[str]"] = {}
+
         # All keys for all regexes
         self._keys = [
             tuple(
@@ -107,64 +295,143 @@ class PathMatcher:
         self._unique_keys = set([item for sublist in self._keys for item in sublist])
         # Keys that are not in all regexes
         self._diffs = [set(self._unique_keys).difference(set(k)) for k in self._keys]
+        # Timings and counters, only collected after calling `profile`
+        self.stats: Optional["ScanStats"] = None
 
-    @staticmethod
-    def _check_rule(rule: str, result: Dict[str, Any]) -> bool:
-        """
-        Since we allow the user to provide code that is executed, we
-        need to be careful with what is provided.
+    def profile(self, stats: Optional["ScanStats"] = None) -> "ScanStats":
+        """Start collecting timings and counters for each stage of the
+        parsing, see :mod:`mps_data_parser.profiling`
+
+        Arguments
+        ---------
+        stats : ScanStats
+            Add to these stats. Default: create new stats
+
+        Returns
+        -------
+        ScanStats
+            The stats, which are also available as ``self.stats``
         """
-        # We cannot allow imports
-        if "import" in rule:
-            return False
-        for k, v in result.items():
-            if "import" in str(k):
-                return False
-            if "import" in str(v):
-                return False
+        from .profiling import ScanStats
 
-        return True
+        if stats is None:
+            stats = ScanStats()
+        stats.set_labels(self._regexs, [rule.source for rule in self._rules])
+        self.stats = stats
+        return stats
 
-    def __call__(self, path: PathStr) -> MPSData:
+    def may_match_directory(self, relative_directory: str) -> bool:
+        """Return False if no file below the given directory can be
+        matched, assuming that the fields in the patterns do not span
+        several directories. Each level of the directory needs to be
+        matched by the corresponding level of one of the patterns.
 
-        relative_path = Path(path).relative_to(self.root)
-        result: Dict[str, Optional[str]] = {
-            "path": str(relative_path),
-            "folder": self.folder,
-            "operator": self._operator,
-            "extension": relative_path.suffix,
-        }
+        Note that this is stricter than the matching of the full path,
+        where a field may contain a path separator and the pattern may
+        match only the end of the path.
+        """
+        parts = Path(relative_directory).parts
+        for directory_parsers in self._directory_parsers:
+            if len(parts) > len(directory_parsers):
+                continue
+            if all(
+                p.parse(part) is not None for p, part in zip(directory_parsers, parts)
+            ):
+                return True
+        return False
 
-        for regex, diff in zip(self._regexs, self._diffs):
-            res = parse.search(regex, str(relative_path))
+    def _match(
+        self,
+        relative_path: str,
+        attempts: Optional[List[int]] = None,
+    ) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Return the index of the first pattern matching the relative
+        path together with the named fields, or None if no pattern matches.
+        If `attempts` is given, the counter of each pattern that is tried
+        is incremented.
+        """
+        # Only try the patterns whose literal fragments are in the path
+        candidates = self._index.candidates(relative_path)
+        if not candidates:
+            return None
+        if self._single_pass:
+            if attempts is not None:
+                # All candidates are tried in one go
+                for index in candidates:
+                    attempts[index] += 1
+            return self._match_combined(relative_path, tuple(candidates))
+        for index in candidates:
+            if attempts is not None:
+                attempts[index] += 1
+            res = self._parsers[index].search(relative_path)
             if res is not None:
-                result.update(res.named)
-                for d in diff:
-                    # Set this to the string none to indicate
-                    # that this key is missing
-                    result[d] = "none"
+                return index, res.named
+        return None
 
-                if self._rules != []:
+    def _match_combined(
+        self,
+        relative_path: str,
+        candidates: Tuple[int, ...],
+    ) -> Optional[Tuple[int, Dict[str, Any]]]:
+        regex = self._combined.get(candidates)
+        if regex is None:
+            regex = re.compile(
+                "^(?:" + "|".join(self._branches[i][0] for i in candidates) + ")",
+                self._parsers[0]._re_flags,
+            )
+            if len(self._combined) >= _LiteralIndex.max_cache_size:
+                self._combined.clear()
+            self._combined[candidates] = regex
 
-                    for r in self._rules:
+        m = regex.match(relative_path)
+        if m is None:
+            return None
+        index = int(m.lastgroup[2:])  # type: ignore
+        groups = self._branches[index][1]
+        if groups is None:
+            return index, self._parsers[index].search(relative_path).named
+        return index, {name: m.group(group) for group, name in groups}
 
-                        if PathMatcher._check_rule(r, result):
-                            exec(r, result)
-                            result.pop("__builtins__")
-                        else:
-                            logger.warning(f"Rule {r} is not safe")
-                break
+    def _parse(self, relative_path: str, extension: str) -> Tuple[Dict[str, Any], bool]:
+        """Parse the fields from a relative path
 
-        else:
-            # We could not find a match for the given path
-            if self._strict:
-                msg = (
-                    f"No match where found for path {path}, with relative path "
-                    f"{relative_path}, and the following regexes: \n"
-                )
-                msg += "\n".join(self._regexs)
-                raise RuntimeError(msg)
+        Returns
+        -------
+        result : dict
+            The raw (not normalized) fields
+        matched : bool
+            True if the path was matched by one of the patterns
+        """
+        result = self._initial_result(relative_path, extension)
+        match = self._match(relative_path)
+        if match is not None:
+            self._set_missing_keys(result, *match)
+            for rule in self._rules:
+                rule(result)
+        self._fill(result)
+        return result, match is not None
 
+    def _initial_result(self, relative_path: str, extension: str) -> Dict[str, Any]:
+        return {
+            "path": relative_path,
+            "folder": self.folder,
+            "operator": self._operator,
+            "extension": extension,
+        }
+
+    def _set_missing_keys(
+        self,
+        result: Dict[str, Any],
+        index: int,
+        named: Dict[str, Any],
+    ) -> None:
+        result.update(named)
+        for d in self._diffs[index]:
+            # Set this to the string none to indicate
+            # that this key is missing
+            result[d] = "none"
+
+    def _fill(self, result: Dict[str, Any]) -> None:
         result["trace_type"] = channel_to_trace_type(result.get("channel"))
 
         for key in MPSData.arguments():
@@ -173,10 +440,189 @@ class PathMatcher:
                 # to None otherwise
                 result[key] = self._config.get(key, None)
 
+    def _profiled_parse(
+        self,
+        relative_path: str,
+        extension: str,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Same as `_parse`, but adds the time of each stage, the
+        attempts and hits of the patterns and the rule executions to
+        ``self.stats``
+        """
+        stats = self.stats
+        assert stats is not None
+        times = stats.times
+        t0 = time.perf_counter()
+        result = self._initial_result(relative_path, extension)
+        match = self._match(relative_path, stats.attempts)
+        t1 = time.perf_counter()
+        times["match"] += t1 - t0
+
+        stats.files += 1
+        if match is None:
+            stats.unmatched += 1
+        else:
+            stats.hits[match[0]] += 1
+            self._set_missing_keys(result, *match)
+            for i, rule in enumerate(self._rules):
+                t = time.perf_counter()
+                rule(result)
+                stats.rule_calls[i] += 1
+                stats.rule_times[i] += time.perf_counter() - t
+        t2 = time.perf_counter()
+        times["rules"] += t2 - t1
+
+        self._fill(result)
+        times["fill"] += time.perf_counter() - t2
+        return result, match is not None
+
+    def _match_error(self, path: PathStr, relative_path: PathStr) -> MatchError:
+        msg = (
+            f"No match where found for path {path}, with relative path "
+            f"{relative_path}, and the following regexes: \n"
+        )
+        msg += "\n".join(self._regexs)
+        return MatchError(msg, path=path)
+
+    def __call__(self, path: PathStr) -> MPSData:
+        if self.stats is not None:
+            return self._profiled_call(path)
+
+        relative_path = Path(path).relative_to(self.root)
+        result, matched = self._parse(str(relative_path), relative_path.suffix)
+
+        if not matched and self._strict:
+            # We could not find a match for the given path
+            raise self._match_error(path, relative_path)
+
         # Pack  this into the MPSData object
-        logger.debug(f"Raw data: \n {result}")
-        cleaned_data = MPSData(**result, abrev=self.abrev)  # type: ignore
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug(f"Raw data: \n {result}")
+        cleaned_data = MPSData(**result, abrev=self.name_cache)  # type: ignore
 
-        logger.debug(f"Clean data: \n{cleaned_data.to_dict()}")
+        if debug:
+            logger.debug(f"Clean data: \n{cleaned_data.to_dict()}")
 
         return cleaned_data
+
+    def _profiled_call(self, path: PathStr) -> MPSData:
+        """Same as `__call__`, but with timings, see `profile`"""
+        from .profiling import TimedNames
+
+        stats = self.stats
+        assert stats is not None
+        times = stats.times
+        t0 = time.perf_counter()
+        relative_path = Path(path).relative_to(self.root)
+        relative_path_str, extension = str(relative_path), relative_path.suffix
+        times["relative_to"] += time.perf_counter() - t0
+
+        result, matched = self._profiled_parse(relative_path_str, extension)
+        if not matched and self._strict:
+            raise self._match_error(path, relative_path)
+
+        abbreviations = times["abbreviations"]
+        t0 = time.perf_counter()
+        names = TimedNames(self.name_cache, stats)
+        cleaned_data = MPSData(**result, abrev=names)  # type: ignore
+        # The time of the abbreviations is counted separately
+        times["mps_data"] += (
+            time.perf_counter() - t0 - (times["abbreviations"] - abbreviations)
+        )
+        return cleaned_data
+
+    def _relative_paths(self, paths: Iterable[PathStr]) -> Iterator[str]:
+        """Yield the paths relative to the root. Paths given as strings
+        below the root are only sliced, and all other paths go through
+        ``Path.relative_to``.
+        """
+        root = str(self.root)
+        if root == ".":
+            prefix = ""
+        elif root.endswith(os.sep):
+            prefix = root
+        else:
+            prefix = root + os.sep
+
+        for path in paths:
+            path_str = str(Path(path))
+            if path_str.startswith(prefix) and path_str != prefix:
+                yield path_str[len(prefix) :]
+            else:
+                yield str(Path(path_str).relative_to(self.root))
+
+    def match_many(self, paths: Iterable[PathStr]) -> "Batch":
+        """Parse many paths at once and return the result as columns
+
+        The paths that are not matched by any of the patterns are marked
+        in ``Batch.unmatched`` instead of raising an error, regardless of
+        the value of `strict`. The values are normalized with the
+        abbreviations in the same way as when calling the PathMatcher
+        on each path.
+
+        Arguments
+        ---------
+        paths : iterable
+            The paths to parse. They need to be located below the root.
+
+        Returns
+        -------
+        Batch
+            The parsed fields with one column for each key
+
+        Example
+        -------
+        .. code::
+
+            batch = pathmatcher.match_many(paths)
+            batch["drug"][batch.matched]
+        """
+        columns: Dict[str, List[Any]] = {}
+        matched: List[bool] = []
+        names: Dict[Tuple[str, Any], Any] = {}
+        required = MPSData.required_arguments()
+        parse = self._parse
+        name_cache: Any = self.name_cache
+        relative_paths = self._relative_paths(paths)
+        if self.stats is not None:
+            from .profiling import TimedNames
+
+            parse = self._profiled_parse
+            name_cache = TimedNames(self.name_cache, self.stats)
+            relative_paths = self.stats.timed(relative_paths, "relative_to")
+
+        for num, relative_path in enumerate(relative_paths):
+            # Same as Path.suffix
+            filename = relative_path.rpartition(os.sep)[2]
+            i = filename.rfind(".")
+            extension = filename[i:] if 0 < i < len(filename) - 1 else ""
+            result, is_matched = parse(relative_path, extension)
+            matched.append(is_matched)
+
+            for key, value in result.items():
+                if key not in required:
+                    # Try to see if name is an abrevation, and if not use
+                    # the orignal value
+                    try:
+                        value = names[(key, value)]
+                    except KeyError:
+                        name = name_cache.get_name(key, value) or value
+                        names[(key, value)] = name
+                        value = name
+                    except TypeError:
+                        # Unhashable values are not abbreviations
+                        pass
+                if key not in columns:
+                    # New key, fill in the previous rows
+                    columns[key] = [None] * num
+                columns[key].append(value)
+
+            for column in columns.values():
+                if len(column) == num:
+                    column.append(None)
+
+        # Imported here since it depends on numpy
+        from .batch import Batch
+
+        return Batch(columns, matched)
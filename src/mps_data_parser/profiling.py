@@ -0,0 +1,193 @@
+"""Timings and counters for finding out where the time goes in a scan
+
+.. code::
+
+    stats = ScanStats()
+    for mps_data in scan(folder, config, stats=stats):
+        ...
+    print(stats.report())
+
+or, for a single PathMatcher, ``stats = pathmatcher.profile()``. The
+time is split into stages:
+
+- ``walk``: listing the directories (or reading the cache)
+- ``relative_to``: making the path relative to the root
+- ``match``: trying the patterns
+- ``rules``: executing the rules
+- ``fill``: the trace type and the values from the config
+- ``abbreviations``: looking up the names of the abbreviations
+- ``mps_data``: creating the MPSData, excluding the abbreviations
+
+In addition the number of times each pattern is tried and matched, and
+the number of times and the time each rule is executed, are counted.
+When profiling is not enabled the only overhead is checking whether the
+PathMatcher has any stats.
+"""
+
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Sequence
+from typing import TypeVar
+
+T = TypeVar("T")
+
+STAGES = (
+    "walk",
+    "relative_to",
+    "match",
+    "rules",
+    "fill",
+    "abbreviations",
+    "mps_data",
+)
+
+
+class ScanStats:
+    """Cumulative timings and counters of a scan
+
+    Arguments
+    ---------
+    patterns : list
+        The patterns of the PathMatcher
+    rules : list
+        The source of the rules of the PathMatcher
+    """
+
+    def __init__(self, patterns: Sequence[str] = (), rules: Sequence[str] = ()):
+        self.times: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.files = 0
+        self.unmatched = 0
+        self.patterns: List[str] = []
+        self.rules: List[str] = []
+        self.attempts: List[int] = []
+        self.hits: List[int] = []
+        self.rule_calls: List[int] = []
+        self.rule_times: List[float] = []
+        self.set_labels(patterns, rules)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(files={self.files}, "
+            f"unmatched={self.unmatched}, total={self.total:.3f}s)"
+        )
+
+    def set_labels(self, patterns: Sequence[str], rules: Sequence[str]) -> None:
+        """Set the patterns and rules, and reset their counters if
+        they changed
+        """
+        if list(patterns) != self.patterns:
+            self.patterns = list(patterns)
+            self.attempts = [0] * len(self.patterns)
+            self.hits = [0] * len(self.patterns)
+        if list(rules) != self.rules:
+            self.rules = list(rules)
+            self.rule_calls = [0] * len(self.rules)
+            self.rule_times = [0.0] * len(self.rules)
+
+    @property
+    def total(self) -> float:
+        """The total time of all the stages"""
+        return sum(self.times.values())
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.times[stage] = self.times.get(stage, 0.0) + seconds
+
+    def timed(self, iterable: Iterable[T], stage: str) -> Iterator[T]:
+        """Yield from the iterable, adding the time spent waiting for
+        each item to the stage
+        """
+        it = iter(iterable)
+        times = self.times
+        times.setdefault(stage, 0.0)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                times[stage] += time.perf_counter() - t0
+                return
+            times[stage] += time.perf_counter() - t0
+            yield item
+
+    def merge(self, other: "ScanStats") -> None:
+        """Add the timings and counters of another ScanStats, e.g from
+        a worker process
+        """
+        for stage, seconds in other.times.items():
+            self.add(stage, seconds)
+        self.files += other.files
+        self.unmatched += other.unmatched
+        self.set_labels(other.patterns, other.rules)
+        for counters, others in [
+            (self.attempts, other.attempts),
+            (self.hits, other.hits),
+            (self.rule_calls, other.rule_calls),
+            (self.rule_times, other.rule_times),
+        ]:
+            for i, value in enumerate(others):
+                counters[i] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "times": dict(self.times),
+            "files": self.files,
+            "unmatched": self.unmatched,
+            "patterns": [
+                {"pattern": p, "attempts": a, "hits": h}
+                for p, a, h in zip(self.patterns, self.attempts, self.hits)
+            ],
+            "rules": [
+                {"rule": r, "calls": c, "time": t}
+                for r, c, t in zip(self.rules, self.rule_calls, self.rule_times)
+            ],
+        }
+
+    def report(self) -> str:
+        """Return the timings and counters as a table"""
+        total = self.total
+        files = max(self.files, 1)
+        lines = [
+            f"Parsed {self.files} files ({self.unmatched} unmatched) "
+            f"in {total:.3f} s",
+            f"{'stage':15s} {'time (s)':>10s} {'per file (us)':>14s} {'share':>6s}",
+        ]
+        for stage, seconds in self.times.items():
+            share = seconds / total if total > 0 else 0.0
+            lines.append(
+                f"{stage:15s} {seconds:10.3f} {seconds / files * 1e6:14.1f} "
+                f"{share:6.1%}",
+            )
+
+        lines.append(f"\n{'#':>3s} {'attempts':>10s} {'hits':>10s}  pattern")
+        for i, (pattern, attempts, hits) in enumerate(
+            zip(self.patterns, self.attempts, self.hits),
+        ):
+            lines.append(f"{i:3d} {attempts:10d} {hits:10d}  {pattern}")
+
+        if self.rules:
+            lines.append(f"\n{'#':>3s} {'calls':>10s} {'time (s)':>10s}  rule")
+            for i, (rule, calls, seconds) in enumerate(
+                zip(self.rules, self.rule_calls, self.rule_times),
+            ):
+                lines.append(f"{i:3d} {calls:10d} {seconds:10.3f}  {rule}")
+        return "\n".join(lines)
+
+
+class TimedNames:
+    """Wrapper around a ``NameCache`` (or ``Abbreviations``) that adds
+    the time of each lookup to the ``abbreviations`` stage
+    """
+
+    def __init__(self, names, stats: ScanStats):
+        self._names = names
+        self._stats = stats
+
+    def get_name(self, key: str, synonym: Any) -> Any:
+        t0 = time.perf_counter()
+        name = self._names.get_name(key, synonym)
+        self._stats.times["abbreviations"] += time.perf_counter() - t0
+        return name
@@ -0,0 +1,229 @@
+"""Rules are small python snippets given in the config file that are
+executed on the fields parsed from a path, e.g
+
+.. code::
+
+    rules:
+      - 'drug_dict = {"V": "Verapamil", "F": "Flecainide"}; drug = drug_dict[drug_]'
+
+The rules are validated and compiled once, and then executed for every
+matched path.
+"""
+
+import ast
+import builtins
+import logging
+import sys
+from types import MappingProxyType
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Builtins that could be used to escape from the namespace of the rule
+FORBIDDEN_NAMES = {
+    "__import__",
+    "breakpoint",
+    "compile",
+    "delattr",
+    "eval",
+    "exec",
+    "getattr",
+    "input",
+    "open",
+    "setattr",
+    "vars",
+}
+# The only builtins that are available when a rule is executed
+SAFE_BUILTINS = MappingProxyType(
+    {
+        name: getattr(builtins, name)
+        for name in [
+            "abs",
+            "all",
+            "any",
+            "bool",
+            "dict",
+            "enumerate",
+            "Exception",
+            "float",
+            "globals",
+            "IndexError",
+            "int",
+            "isinstance",
+            "KeyError",
+            "len",
+            "list",
+            "locals",
+            "max",
+            "min",
+            "range",
+            "reversed",
+            "round",
+            "set",
+            "sorted",
+            "str",
+            "sum",
+            "tuple",
+            "TypeError",
+            "ValueError",
+            "zip",
+        ]
+    },
+)
+# Python < 3.8 parses strings as ast.Str
+_STRING_NODES = (ast.Constant,) if sys.version_info >= (3, 8) else (ast.Str,)
+
+
+def is_safe(tree: ast.AST) -> bool:
+    """Since we allow the user to provide code that is executed, we
+    need to be careful with what is provided. We do not allow imports,
+    calls to builtins that can evaluate code or touch the file system,
+    or access to any dunder attribute, neither as an attribute nor as a
+    string, e.g ``globals()["__builtins__"]``.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            return False
+        if isinstance(node, ast.Name) and (
+            node.id in FORBIDDEN_NAMES or node.id.startswith("__")
+        ):
+            return False
+        if isinstance(node, ast.Attribute) and node.attr.startswith("__"):
+            return False
+        if isinstance(node, _STRING_NODES):
+            value = getattr(node, "value", getattr(node, "s", None))
+            if isinstance(value, str) and value.startswith("__"):
+                return False
+    return True
+
+
+class Rule:
+    """A rule compiled to a code object
+
+    Arguments
+    ---------
+    source : str
+        The source code of the rule
+    tree : ast.Module
+        The parsed source code
+    """
+
+    def __init__(self, source: str, tree: ast.Module):
+        self.source = source
+        self._code = compile(tree, "<rule>", "exec")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.source!r})"
+
+    def __reduce__(self):
+        # Code objects cannot be pickled, so we compile the rule again
+        return (compile_rule, (self.source,))
+
+    def __call__(self, namespace: Dict[str, Any]) -> None:
+        """Execute the rule, updating the namespace in place. Only the
+        builtins in `SAFE_BUILTINS` are available.
+        """
+        namespace["__builtins__"] = SAFE_BUILTINS
+        try:
+            exec(self._code, namespace)
+        finally:
+            namespace.pop("__builtins__", None)
+
+
+class LookupRule(Rule):
+    """A rule on the form ``table = {...}; target = table[key]`` which is
+    evaluated as a plain dictionary lookup instead of executing code.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        tree: ast.Module,
+        table_name: str,
+        target: str,
+        key: str,
+    ):
+        super().__init__(source, tree)
+        self.table_name = table_name
+        self.table = ast.literal_eval(tree.body[0].value)  # type: ignore
+        self.target = target
+        self.key = key
+
+    def __call__(self, namespace: Dict[str, Any]) -> None:
+        # Also set the table so that the result is the same as when
+        # the rule is executed
+        namespace[self.table_name] = self.table
+        namespace[self.target] = self.table[namespace[self.key]]
+
+
+def _single_name_target(node: ast.stmt) -> Optional[str]:
+    if (
+        isinstance(node, ast.Assign)
+        and len(node.targets) == 1
+        and isinstance(node.targets[0], ast.Name)
+    ):
+        return node.targets[0].id
+    return None
+
+
+def _lookup_rule(source: str, tree: ast.Module) -> Optional[LookupRule]:
+    """Return a LookupRule if the rule is a lookup in a literal dictionary"""
+    if len(tree.body) != 2:
+        return None
+    assign_table, assign_target = tree.body
+    table_name = _single_name_target(assign_table)
+    target = _single_name_target(assign_target)
+    if table_name is None or target is None:
+        return None
+
+    table = assign_table.value  # type: ignore
+    if not isinstance(table, ast.Dict):
+        return None
+    try:
+        ast.literal_eval(table)
+    except ValueError:
+        return None
+
+    lookup = assign_target.value  # type: ignore
+    if not (
+        isinstance(lookup, ast.Subscript)
+        and isinstance(lookup.value, ast.Name)
+        and lookup.value.id == table_name
+    ):
+        return None
+    # Python < 3.9 wraps the subscript in an ast.Index
+    key = getattr(lookup.slice, "value", lookup.slice)
+    if not isinstance(key, ast.Name) or key.id == table_name:
+        return None
+
+    return LookupRule(source, tree, table_name, target, key.id)
+
+
+def compile_rule(source: str) -> Optional[Rule]:
+    """Compile a rule. Returns None if the rule is not valid python
+    or if it is not safe to execute.
+    """
+    try:
+        tree = ast.parse(source, mode="exec")
+    except SyntaxError as ex:
+        logger.warning(f"Rule {source} is not valid: {ex}")
+        return None
+
+    if not is_safe(tree):
+        logger.warning(f"Rule {source} is not safe")
+        return None
+
+    return _lookup_rule(source, tree) or Rule(source, tree)
+
+
+def compile_rules(rules: List[str]) -> List[Rule]:
+    """Compile a list of rules, skipping the ones that are not valid"""
+    compiled = []
+    for source in rules:
+        rule = compile_rule(source)
+        if rule is not None:
+            compiled.append(rule)
+    return compiled
@@ -0,0 +1,326 @@
+import logging
+import os
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import TYPE_CHECKING
+from typing import Tuple
+from typing import Union
+
+from .mps_data import MPSData
+from .pathmatcher import MatchError
+from .pathmatcher import PathMatcher
+from .utils import load_config
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from .profiling import ScanStats
+
+logger = logging.getLogger(__name__)
+
+PathStr = Union[str, Path]
+MatchResult = Union[MPSData, MatchError]
+
+EXTENSIONS = (".nd2", ".czi")
+
+
+def keep_directory(
+    path: str,
+    relative_path: str,
+    exclude: Sequence[str] = (),
+    directory_filter: Optional[Callable[[str], bool]] = None,
+) -> bool:
+    """Return True if the directory should be walked
+
+    Arguments
+    ---------
+    path : str
+        The path to the directory
+    relative_path : str
+        The path to the directory relative to the root
+    exclude : list
+        If the path of the directory (with forward slashes and a trailing
+        slash) contains any of these strings, then all files below it
+        would be excluded, so there is no need to walk it.
+    directory_filter : callable
+        Called with the relative path, and should return False if
+        no file below the directory can be matched, e.g
+        ``PathMatcher.may_match_directory``.
+    """
+    posix_path = path.replace(os.sep, "/") + "/"
+    if any(ex in posix_path for ex in exclude):
+        return False
+    if directory_filter is not None and not directory_filter(relative_path):
+        return False
+    return True
+
+
+def iter_files(
+    root: PathStr,
+    extensions: Sequence[str] = EXTENSIONS,
+    exclude: Sequence[str] = (),
+    directory_filter: Optional[Callable[[str], bool]] = None,
+) -> Iterator[str]:
+    """Walk the directory tree using ``os.scandir`` and yield the files
+    with one of the given extensions. The files are yielded in the same
+    order as with ``os.walk``, i.e the files in a directory are yielded
+    before descending into its subdirectories.
+
+    Arguments
+    ---------
+    root : str
+        The directory to walk
+    extensions : list
+        Only yield files with these extensions
+    exclude : list
+        Skip files where the path (with forward slashes) contains
+        any of these strings. Directories where all files would be
+        skipped are not walked.
+    directory_filter : callable
+        If provided, only walk the directories (given relative to
+        the root) for which this returns True. See `keep_directory`.
+    """
+    suffixes = tuple(extensions)
+    exclude = [ex.replace(os.sep, "/") for ex in exclude]
+    directories = [(os.fspath(root), "")]
+    while directories:
+        directory, relative_directory = directories.pop()
+        subdirectories = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        # Like os.walk, do not follow symbolic links
+                        if entry.is_symlink():
+                            continue
+                        relative_path = os.path.join(relative_directory, entry.name)
+                        if keep_directory(
+                            entry.path,
+                            relative_path,
+                            exclude,
+                            directory_filter,
+                        ):
+                            subdirectories.append((entry.path, relative_path))
+                    elif entry.name.endswith(suffixes):
+                        path = entry.path
+                        posix_path = path.replace(os.sep, "/")
+                        if any(ex in posix_path for ex in exclude):
+                            continue
+                        yield path
+        except OSError as ex:
+            logger.warning(f"Could not list directory {directory}: {ex}")
+            continue
+        # Reverse since we pop from the end
+        directories.extend(reversed(subdirectories))
+
+
+_worker_pathmatcher: Optional[PathMatcher] = None
+
+
+def _init_worker(pathmatcher: PathMatcher) -> None:
+    global _worker_pathmatcher
+    _worker_pathmatcher = pathmatcher
+
+
+def _match_chunk(
+    paths: List[str],
+    pathmatcher: Optional[PathMatcher] = None,
+) -> List[Tuple[str, MatchResult]]:
+    if pathmatcher is None:
+        pathmatcher = _worker_pathmatcher
+    assert pathmatcher is not None, "Worker is not initialized"
+
+    results: List[Tuple[str, MatchResult]] = []
+    for path in paths:
+        try:
+            results.append((path, pathmatcher(path)))
+        except MatchError as ex:
+            results.append((path, ex))
+    return results
+
+
+def _profiled_match_chunk(
+    paths: List[str],
+) -> Tuple[List[Tuple[str, MatchResult]], "ScanStats"]:
+    """Same as `_match_chunk` in a worker, but also returns the stats
+    for the chunk so that they can be added to the stats of the scan
+    """
+    assert _worker_pathmatcher is not None, "Worker is not initialized"
+    stats = _worker_pathmatcher.profile(None)
+    return _match_chunk(paths), stats
+
+
+def _chunks(iterable: Iterable[str], size: int) -> Iterator[List[str]]:
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def match_files(
+    pathmatcher: PathMatcher,
+    paths: Iterable[str],
+    jobs: int = 1,
+    chunksize: int = 256,
+) -> Iterator[Tuple[str, MatchResult]]:
+    """Match the paths with the pathmatcher, possibly in parallel
+
+    The results are yielded in the same order as the paths, no matter
+    how the work is scheduled. If a path could not be matched (and the
+    pathmatcher is strict) the MatchError is yielded instead of
+    the MPSData.
+
+    Arguments
+    ---------
+    pathmatcher : PathMatcher
+        The pathmatcher. With more than one job, it is pickled and sent
+        once to each worker process.
+    paths : iterable
+        The paths to match
+    jobs : int
+        Number of worker processes. If 1 (default) the paths are
+        matched in this process.
+    chunksize : int
+        Number of paths sent to a worker at the time
+    """
+    stats = pathmatcher.stats
+    if stats is not None:
+        paths = stats.timed(paths, "walk")
+
+    if jobs <= 1:
+        for path in paths:
+            yield from _match_chunk([path], pathmatcher)
+        return
+
+    # Imported here since it is only needed with more than one job
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(pathmatcher,),
+    ) as executor:
+        # Keep a bounded number of chunks in flight, and collect them
+        # in the order they were submitted
+        pending: Deque["Future"] = deque()
+        chunks = _chunks(paths, chunksize)
+        match_chunk = _match_chunk if stats is None else _profiled_match_chunk
+
+        def results(future: "Future") -> List[Tuple[str, MatchResult]]:
+            if stats is None:
+                return future.result()
+            chunk_results, chunk_stats = future.result()
+            stats.merge(chunk_stats)
+            return chunk_results
+
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(match_chunk, chunk))
+                if len(pending) >= 4 * jobs:
+                    yield from results(pending.popleft())
+            while pending:
+                yield from results(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def scan(
+    root: PathStr,
+    config: Union[PathStr, Dict[str, Any]],
+    extensions: Sequence[str] = EXTENSIONS,
+    jobs: int = 1,
+    cache: Union[bool, PathStr, None] = None,
+    prune: bool = False,
+    stats: Optional["ScanStats"] = None,
+    **kwargs,
+) -> Iterator[MatchResult]:
+    """Scan an experiment folder and lazily yield the parsed data
+    for each file while walking the tree.
+
+    Arguments
+    ---------
+    root : str
+        The root folder of the experiment
+    config : dict or str
+        The config, or the path to the config file
+    extensions : list
+        Only files with these extensions are parsed
+    jobs : int
+        Number of processes used to match the files
+    cache : bool or str
+        If True, or a path to a file, the parsed data is cached so that
+        the next scan only needs to parse new or changed files. If True,
+        the cache is stored in a hidden file in the root folder. See
+        :mod:`mps_data_parser.cache`.
+    prune : bool
+        If True, do not walk directories that do not match the directory
+        levels of any of the patterns, see ``PathMatcher.may_match_directory``.
+        Directories that are excluded in the config are never walked.
+    stats : ScanStats
+        If provided, the time of each stage of the scan, and counters
+        for the patterns and rules, are added to these stats. See
+        :mod:`mps_data_parser.profiling`.
+    kwargs :
+        Additional keyword arguments passed to the PathMatcher
+
+    Yields
+    ------
+    MPSData or MatchError
+        The data for each file, or a MatchError (which has the path as
+        an attribute) if the file is not matched by any of the patterns
+        and the PathMatcher is strict.
+
+    Example
+    -------
+    .. code::
+
+        for mps_data in scan("181116_Lidocaine", "181116_Lidocaine.yaml"):
+            if isinstance(mps_data, MatchError):
+                print(f"Could not parse {mps_data.path}")
+                continue
+            print(mps_data.drug)
+    """
+    if not isinstance(config, dict):
+        config = load_config(config)
+    pathmatcher = PathMatcher(config, root=root, **kwargs)
+    if stats is not None:
+        pathmatcher.profile(stats)
+    exclude = pathmatcher.excludes
+    directory_filter = pathmatcher.may_match_directory if prune else None
+
+    if cache:
+        # Import here to avoid circular imports
+        from .cache import cached_scan
+
+        yield from cached_scan(
+            root,
+            pathmatcher,
+            cache_file=None if cache is True else cache,  # type: ignore
+            extensions=extensions,
+            exclude=exclude,
+            prune=prune,
+            jobs=jobs,
+        )
+        return
+
+    paths = iter_files(
+        root,
+        extensions=extensions,
+        exclude=exclude,
+        directory_filter=directory_filter,
+    )
+    for _, result in match_files(pathmatcher, paths, jobs=jobs):
+        yield result
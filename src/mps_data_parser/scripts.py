@@ -1,12 +1,14 @@
 import argparse
 import logging
-import os
 import pprint
+import sys
+import time
 from collections import Counter
 from pathlib import Path
 
-from .pathmatcher import PathMatcher
-from .pathmatcher import TRACE_TYPES
+from . import scanner
+from .pathmatcher import MatchError
+from .profiling import ScanStats
 from .utils import load_config
 
 logger = logging.getLogger(__name__)
@@ -45,6 +47,32 @@ def get_args():
         action="store_true",
         help="Check that everthing is parsed correctly",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to match the files",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache",
+        action="store_true",
+        help=(
+            "Cache the parsed files in the root folder, so that only "
+            "new or changed files are parsed the next time"
+        ),
+    )
+    parser.add_argument(
+        "--prune",
+        dest="prune",
+        action="store_true",
+        help=(
+            "Do not walk directories that does not match the directory "
+            "structure of any of the patterns"
+        ),
+    )
     parser.add_argument(
         "-a",
         "--add-data",
@@ -52,6 +80,93 @@ def get_args():
         action="store_true",
         help="Add data to the database",
     )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        help="Print the time spent in each stage of the scan",
+    )
+    parser.add_argument(
+        "--export",
+        dest="export",
+        type=str,
+        default=None,
+        help=(
+            "Save the parsed data to a columnar file "
+            "(.npz, .parquet, .arrow or .feather)"
+        ),
+    )
+
+    return parser
+
+
+def get_watch_args():
+    """
+    Parse command line arguments for the watch command
+    """
+    descr = "Watch a folder and parse new files as they are written"
+    usage = (
+        "python -m mps_data_parser watch <path to folder> "
+        "<path to config file> [OPTIONS]"
+    )
+    parser = argparse.ArgumentParser(description=descr, usage=usage)
+    parser.add_argument(
+        action="store",
+        dest="folder",
+        type=str,
+        help="Path to the root folder",
+    )
+    parser.add_argument(
+        action="store",
+        dest="config",
+        type=str,
+        help="Path to the config file",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        help="More printing",
+    )
+    parser.add_argument(
+        "--settle",
+        dest="settle",
+        type=float,
+        default=2.0,
+        help="Number of seconds a file must be unchanged before it is parsed",
+    )
+    parser.add_argument(
+        "--interval",
+        dest="interval",
+        type=float,
+        default=1.0,
+        help="Number of seconds between each check for new files",
+    )
+    parser.add_argument(
+        "--polling",
+        dest="polling",
+        action="store_true",
+        help="Poll the folder for new files instead of using inotify",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache",
+        action="store_true",
+        help=(
+            "Store the parsed files in the cache in the root folder, "
+            "so that they are not parsed again by a scan with --cache"
+        ),
+    )
+    parser.add_argument(
+        "--prune",
+        dest="prune",
+        action="store_true",
+        help=(
+            "Do not watch directories that does not match the directory "
+            "structure of any of the patterns"
+        ),
+    )
 
     return parser
 
@@ -85,80 +200,75 @@ def check_args(args):
 
 
 def check(args):  # noqa: C901
+    # Only needed for checking, so that other commands start faster
+    import numpy as np
+
+    from . import export
+    from . import grouping
 
     logger.info(f"Checking folder {args['folder']} with config {args['config']}")
     config = load_config(args["config"])
-    pathmatcher = PathMatcher(config, root=args["folder"])
-    exclude = config.get("exclude", [])
-
-    num_files = 0
 
     cnt_keys = config.get("unique_columns", [])
+    stats = ScanStats() if args.get("profile", False) else None
 
-    counters = {k: Counter() for k in cnt_keys}
-    datas = {}
-    for root, dirs, files in os.walk(args["folder"]):
-        for f in files:
-            path = Path(root).joinpath(f)
-
-            skip = False
-            for ex in exclude:
-                if ex in path.as_posix():
-                    skip = True
-                    break
-            if skip:
-                continue
+    records = []
+    for mps_data in scanner.scan(
+        args["folder"],
+        config,
+        extensions=[".nd2", ".czi"],
+        jobs=args.get("jobs", 1),
+        cache=args.get("cache", False),
+        prune=args.get("prune", False),
+        stats=stats,
+    ):
+        if isinstance(mps_data, MatchError):
+            logging.error(mps_data)
+            return
+
+        records.append(mps_data)
+        logger.debug(Path(args["folder"]).joinpath(mps_data.path))
+        logger.debug(mps_data.to_dict())
+
+    num_files = len(records)
+    t0 = time.perf_counter()
+    batch = export.to_batch(records)
+    counters = {k: Counter(batch.get(k).tolist()) for k in cnt_keys}
+    groups = grouping.group_traces(batch, cnt_keys)
+    if stats is not None:
+        stats.add("grouping", time.perf_counter() - t0)
 
-            if path.suffix in [".nd2", ".czi"]:
-                logger.debug(path)
-                try:
-                    mps_data = pathmatcher(path)
-                except RuntimeError as err:
-                    logging.error(err)
-                    return
-
-                # data = mps_data.sql_data()
-                data = mps_data.to_dict()
-                logger.debug(data)
-                num_files += 1
-                for k in cnt_keys:
-                    counters[k][data.get(k)] += 1
-
-                try:
-                    unique_key = "_".join(data[k] for k in cnt_keys)
-                except KeyError as ex:
-                    logger.info(f"Failed to get info from path {path}")
-                    logger.info(ex, exc_info=True)
-                    continue
-
-                if unique_key not in datas:
-                    datas[unique_key] = {}
-                if "trace_type" not in data:
-                    raise ValueError(
-                        f"Could not find trace type for output \n{pprint.pformat(data)}",
-                    )
-
-                if data["trace_type"] in datas[unique_key]:
-                    msg = (
-                        f"Duplicatee trace for trace type {data['trace_type']} "
-                        f"and key {unique_key}. The following paths have the same unique key: "
-                        f"\n{datas[unique_key][data['trace_type']]}"
-                        f"\n{path}"
-                    )
-                    if data["trace_type"] == "brightfield":
-                        # This is typically because they also take a picture
-                        logger.debug(msg)
-                    else:
-                        logger.warning(msg)
-                datas[unique_key][data["trace_type"]] = path
-
-    cor_traces = {k: list(d.keys()) for k, d in datas.items()}
-    for trace_type in TRACE_TYPES:
-        for experiment, types in cor_traces.items():
-            if trace_type not in types:
-                logger.info(
-                    f"Missing trace type '{trace_type}' for experiment: {experiment}",
-                )
+    for row in np.nonzero(groups.group < 0)[0]:
+        logger.info(f"Failed to get info from path {batch['path'][row]}")
+
+    untyped = (groups.group >= 0) & np.equal(batch.get("trace_type"), None)
+    if untyped.any():
+        data = batch.to_dict(int(np.argmax(untyped)))
+        raise ValueError(
+            f"Could not find trace type for output \n{pprint.pformat(data)}",
+        )
+
+    for group, trace_type, rows in groups.duplicates():
+        paths = "\n".join(
+            str(Path(args["folder"]).joinpath(p)) for p in batch["path"][rows]
+        )
+        msg = (
+            f"Duplicatee trace for trace type {trace_type} "
+            f"and key {groups.group_key(group)}. "
+            f"The following paths have the same unique key: \n{paths}"
+        )
+        if trace_type == "brightfield":
+            # This is typically because they also take a picture
+            logger.debug(msg)
+        else:
+            logger.warning(msg)
+
+    for i, trace_type in enumerate(groups.trace_types):
+        for group in np.nonzero(groups.missing[:, i])[0]:
+            logger.info(
+                f"Missing trace type '{trace_type}' for experiment: "
+                f"{groups.group_key(group)}",
+            )
 
     msg = ""
     for key, cnt in counters.items():
@@ -166,10 +276,55 @@ def check(args):  # noqa: C901
             continue
         msg += f"\nKey: {key} \n {cnt}"
     logger.info(f"\nDone checking - found {num_files} files \n{msg}")
+    if stats is not None:
+        logger.info(f"\n{stats.report()}")
+
+    if args.get("export") is not None:
+        export.save(batch, args["export"])
 
 
-def main():
-    args = vars(get_args().parse_args())
+def watch(args):
+    """Log the parsed data of each new file in the folder until
+    interrupted
+    """
+    from .watch import watch as watch_folder
+
+    config = load_config(args["config"])
+    try:
+        for mps_data in watch_folder(
+            args["folder"],
+            config,
+            extensions=[".nd2", ".czi"],
+            settle=args.get("settle", 2.0),
+            interval=args.get("interval", 1.0),
+            cache=args.get("cache", False),
+            prune=args.get("prune", False),
+            polling=args.get("polling", False),
+            duration=args.get("duration"),
+        ):
+            if isinstance(mps_data, MatchError):
+                logger.error(mps_data)
+                continue
+            logger.info(
+                f"New file {mps_data.path}: \n{pprint.pformat(mps_data.to_dict())}"
+            )
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["watch"]:
+        args = vars(get_watch_args().parse_args(argv[1:]))
+        try:
+            check_args(args)
+        except ValueError as err:
+            logger.error(err)
+            return
+        watch(args)
+        return
+
+    args = vars(get_args().parse_args(argv))
 
     try:
         check_args(args)
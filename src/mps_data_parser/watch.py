@@ -0,0 +1,462 @@
+"""Watch an experiment folder and parse new files as they are written
+
+.. code::
+
+    for mps_data in watch("181116_Lidocaine", "181116_Lidocaine.yaml"):
+        if isinstance(mps_data, MatchError):
+            print(f"Could not parse {mps_data.path}")
+            continue
+        print(mps_data.path, mps_data.trace_type)
+
+Only files that are created or moved into the folder after the watch
+started are parsed. On Linux the folder is watched with inotify (through
+ctypes, so no extra packages are needed), and on other systems, or if
+inotify is not available, the directories are polled. Polling only lists
+the directories whose modification time changed since the last poll.
+
+A microscope writes a file over a long time, so a file is only parsed
+once its size and modification time have not changed for `settle`
+seconds. Files that were there before the watch started, or that have
+already been parsed, are not parsed again when they are written to.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from .cache import CACHE_FILENAME
+from .cache import fingerprint
+from .cache import list_directory
+from .cache import ScanCache
+from .mps_data import MPSData
+from .pathmatcher import MatchError
+from .pathmatcher import PathMatcher
+from .scanner import EXTENSIONS
+from .scanner import keep_directory
+from .utils import load_config
+
+logger = logging.getLogger(__name__)
+
+PathStr = Union[str, Path]
+MatchResult = Union[MPSData, MatchError]
+
+# From sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+# Only created and moved files are new. IN_CLOSE_WRITE is used to restart
+# the settle time of the new files that are still being written.
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Find new files by listing the directories that have been modified
+
+    Arguments
+    ---------
+    root : str
+        The root folder
+    extensions : list
+        Only files with these extensions are reported
+    exclude : list
+        Skip files and directories where the path contains any of these
+        strings
+    directory_filter : callable
+        If provided, only watch the directories (relative to the root)
+        for which this returns True
+    """
+
+    def __init__(
+        self,
+        root: PathStr,
+        extensions: Sequence[str] = EXTENSIONS,
+        exclude: Sequence[str] = (),
+        directory_filter: Optional[Callable[[str], bool]] = None,
+    ):
+        self.root = os.fspath(root)
+        self._extensions = tuple(extensions)
+        self._exclude = [ex.replace(os.sep, "/") for ex in exclude]
+        self._directory_filter = directory_filter
+        # directory -> (mtime_ns, subdirectories, files)
+        self._listings: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        self._poll()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def _poll(self) -> List[str]:
+        new_files = []
+        listings = {}
+        directories = [""]
+        while directories:
+            directory = directories.pop()
+            old = self._listings.get(directory)
+            try:
+                mtime_ns = os.stat(os.path.join(self.root, directory)).st_mtime_ns
+                if old is not None and old[0] == mtime_ns:
+                    listings[directory] = old
+                else:
+                    subdirectories, files = list_directory(
+                        self.root,
+                        directory,
+                        self._extensions,
+                        self._exclude,
+                        self._directory_filter,
+                    )
+                    paths = [path for path, _, _ in files]
+                    listings[directory] = (mtime_ns, subdirectories, paths)
+                    known = set() if old is None else set(old[2])
+                    new_files.extend(p for p in paths if p not in known)
+            except OSError:
+                # The directory was removed
+                continue
+            directories.extend(reversed(listings[directory][1]))
+        self._listings = listings
+        return [os.path.join(self.root, path) for path in new_files]
+
+    def changes(self, timeout: float) -> Tuple[List[str], List[str]]:
+        """Wait for `timeout` seconds and return the new files, and the
+        files that were written to (which is always empty, since the
+        size and modification time are checked by the `Debouncer`)
+        """
+        time.sleep(timeout)
+        return self._poll(), []
+
+
+class InotifyWatcher:
+    """Find new files with inotify. Same arguments as `PollingWatcher`.
+
+    Raises
+    ------
+    OSError
+        If inotify is not available
+    """
+
+    def __init__(
+        self,
+        root: PathStr,
+        extensions: Sequence[str] = EXTENSIONS,
+        exclude: Sequence[str] = (),
+        directory_filter: Optional[Callable[[str], bool]] = None,
+    ):
+        self.root = os.fspath(root)
+        self._extensions = tuple(extensions)
+        self._exclude = [ex.replace(os.sep, "/") for ex in exclude]
+        self._directory_filter = directory_filter
+        self._libc = _libc()
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        # watch descriptor -> directory relative to the root
+        self._watches: Dict[int, str] = {}
+        self._add_tree("")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_watch(self, directory: str) -> None:
+        path = os.path.join(self.root, directory)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            logger.warning(f"Could not watch {path}: {os.strerror(errno)}")
+            return
+        self._watches[wd] = directory
+
+    def _add_tree(self, directory: str) -> List[str]:
+        """Watch a directory and all the directories below it, and
+        return the files that are already there
+        """
+        files = []
+        directories = [directory]
+        while directories:
+            directory = directories.pop()
+            # Add the watch before listing, so that no file is missed
+            self._add_watch(directory)
+            try:
+                subdirectories, listing = list_directory(
+                    self.root,
+                    directory,
+                    self._extensions,
+                    self._exclude,
+                    self._directory_filter,
+                )
+            except OSError:
+                continue
+            files.extend(os.path.join(self.root, path) for path, _, _ in listing)
+            directories.extend(reversed(subdirectories))
+        return files
+
+    def _keep_file(self, path: str) -> bool:
+        if not path.endswith(self._extensions):
+            return False
+        posix_path = path.replace(os.sep, "/")
+        return not any(ex in posix_path for ex in self._exclude)
+
+    def changes(self, timeout: float) -> Tuple[List[str], List[str]]:
+        """Wait up to `timeout` seconds for events, and return the files
+        that were created or moved into the folder, and the files that
+        were closed after being written to
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return [], []
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return [], []
+
+        files = []
+        written = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT.unpack_from(buffer, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Too many events. Some new files may be missed")
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            relative_path = os.path.join(directory, name) if directory else name
+            path = os.path.join(self.root, relative_path)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and keep_directory(
+                    path,
+                    relative_path,
+                    self._exclude,
+                    self._directory_filter,
+                ):
+                    files.extend(self._add_tree(relative_path))
+            elif not self._keep_file(path):
+                continue
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                files.append(path)
+            else:
+                written.append(path)
+        return files, written
+
+
+def _libc():
+    if not sys.platform.startswith("linux"):
+        raise OSError("inotify is only available on Linux")
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError("inotify is not available")
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def create_watcher(
+    root: PathStr,
+    extensions: Sequence[str] = EXTENSIONS,
+    exclude: Sequence[str] = (),
+    directory_filter: Optional[Callable[[str], bool]] = None,
+    polling: bool = False,
+):
+    """Return an `InotifyWatcher` if inotify is available and `polling`
+    is False, and a `PollingWatcher` otherwise
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(root, extensions, exclude, directory_filter)
+        except OSError as ex:
+            logger.info(f"Cannot use inotify ({ex}). Polling instead")
+    return PollingWatcher(root, extensions, exclude, directory_filter)
+
+
+class Debouncer:
+    """Keep track of files that may still be written to
+
+    Arguments
+    ---------
+    settle : float
+        Number of seconds the size and modification time of a file
+        must stay the same before it is ready
+    """
+
+    def __init__(self, settle: float):
+        self.settle = settle
+        # path -> (size, mtime_ns, time of the last change)
+        self._pending: Dict[str, Tuple[int, int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, paths: Sequence[str], now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for path in paths:
+            # Reset the time of files that are still changing
+            self._pending[path] = (-1, -1, now)
+
+    def touch(self, paths: Sequence[str], now: Optional[float] = None) -> None:
+        """Restart the settle time of the paths that are pending. Other
+        paths are ignored.
+        """
+        now = time.monotonic() if now is None else now
+        for path in paths:
+            if path in self._pending:
+                size, mtime_ns, _ = self._pending[path]
+                self._pending[path] = (size, mtime_ns, now)
+
+    def ready(self, now: Optional[float] = None) -> List[Tuple[str, int, int]]:
+        """Return (path, size, mtime_ns) for the files that have not
+        changed for `settle` seconds. Files that are gone are dropped.
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        for path, (size, mtime_ns, changed) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - changed >= self.settle:
+                del self._pending[path]
+                ready.append((path, size, mtime_ns))
+        return ready
+
+
+def watch(
+    root: PathStr,
+    config: Union[PathStr, Dict[str, Any]],
+    extensions: Sequence[str] = EXTENSIONS,
+    settle: float = 2.0,
+    interval: float = 1.0,
+    cache: Union[bool, PathStr, None] = None,
+    prune: bool = False,
+    polling: bool = False,
+    duration: Optional[float] = None,
+    **kwargs,
+) -> Iterator[MatchResult]:
+    """Watch an experiment folder and yield the parsed data for each
+    new file once it is completely written
+
+    Arguments
+    ---------
+    root : str
+        The root folder of the experiment
+    config : dict or str
+        The config, or the path to the config file
+    extensions : list
+        Only files with these extensions are parsed
+    settle : float
+        Number of seconds a file must be unchanged before it is parsed
+    interval : float
+        Number of seconds between each check for new files
+    cache : bool or str
+        If True, or a path to a file, the parsed files are also stored in
+        the cache used by ``scan(..., cache=True)``, so that a later scan
+        does not have to parse them again
+    prune : bool
+        Only watch the directories where ``PathMatcher.may_match_directory``
+        is True
+    polling : bool
+        Poll the directories even if inotify is available
+    duration : float
+        Stop watching after this many seconds. Default: watch until the
+        generator is closed
+    kwargs :
+        Additional keyword arguments passed to the PathMatcher
+
+    Yields
+    ------
+    MPSData or MatchError
+        The data for each new file, or a MatchError if the file is not
+        matched by any of the patterns and the PathMatcher is strict
+    """
+    if not isinstance(config, dict):
+        config = load_config(config)
+    root = os.fspath(root)
+    pathmatcher = PathMatcher(config, root=root, **kwargs)
+    exclude = pathmatcher.excludes
+    directory_filter = pathmatcher.may_match_directory if prune else None
+
+    scan_cache = None
+    if cache:
+        cache_file = os.path.join(root, CACHE_FILENAME) if cache is True else cache
+        key = fingerprint(pathmatcher, extensions, exclude, prune)
+        scan_cache = ScanCache(cache_file, key)  # type: ignore
+
+    pending = Debouncer(settle)
+    end = None if duration is None else time.monotonic() + duration
+    watcher = create_watcher(root, extensions, exclude, directory_filter, polling)
+    logger.info(f"Watching {root} for new files")
+    try:
+        while end is None or time.monotonic() < end:
+            timeout = interval
+            if end is not None:
+                timeout = max(min(timeout, end - time.monotonic()), 0)
+            new_files, written = watcher.changes(timeout)
+            pending.add(new_files)
+            pending.touch(written)
+
+            for path, size, mtime_ns in pending.ready():
+                try:
+                    result: MatchResult = pathmatcher(path)
+                except MatchError as ex:
+                    result = ex
+                if scan_cache is not None:
+                    relative_path = os.path.relpath(path, root)
+                    if isinstance(result, MatchError):
+                        scan_cache.set_file(
+                            relative_path,
+                            size,
+                            mtime_ns,
+                            error=str(result),
+                        )
+                    else:
+                        scan_cache.set_file(
+                            relative_path,
+                            size,
+                            mtime_ns,
+                            data=result.to_dict(),
+                        )
+                    scan_cache.commit()
+                yield result
+    finally:
+        watcher.close()
+        if scan_cache is not None:
+            scan_cache.close()
@@ -1,3 +1,6 @@
+import os
+import stat
+import sys
 from copy import deepcopy
 
 import pytest
@@ -32,6 +35,60 @@ def test_empty():
     assert set(abrev.list_values("pacing")) == set(pacing.keys())
 
 
+def test_data_is_read_only():
+    abrev = ab.Abbreviations(data={})
+    abrev.add_value("drug", "TestDrug", synonyms=["Test"])
+    data = abrev.data
+    assert abrev.data is data
+
+    with pytest.raises(TypeError):
+        data["drug"]["TestDrug"] = ["test"]
+    with pytest.raises(AttributeError):
+        data["drug"]["TestDrug"].append("test")
+
+    abrev.add_synonym("drug", "TestDrug", "test")
+    assert abrev.data is not data
+    assert set(abrev.data["drug"]["TestDrug"]) == {"Test", "test"}
+    assert set(data["drug"]["TestDrug"]) == {"Test"}
+
+
+def test_add_many(tmp_path, monkeypatch):
+    filename = tmp_path.joinpath("abbreviations.yaml")
+    filename.write_text("{}")
+    abrev = ab.Abbreviations(data={}, filename=filename)
+
+    dumps = []
+    dump = yaml.dump
+    monkeypatch.setattr(
+        ab.yaml, "dump", lambda *args, **kwargs: dumps.append(dump(*args, **kwargs))
+    )
+
+    values = {f"Drug{i}": [f"d{i}", f"drug{i}"] for i in range(100)}
+    abrev.add_many("drug", values)
+    assert len(dumps) == 1
+    assert set(abrev.list_values("drug")) == set(values)
+
+    with open(filename, "r") as f:
+        assert yaml.safe_load(f) == {"drug": values}
+
+
+def test_batch_rollback(tmp_path):
+    filename = tmp_path.joinpath("abbreviations.yaml")
+    filename.write_text("{}")
+    abrev = ab.Abbreviations(data={}, filename=filename)
+    abrev.add_value("drug", "TestDrug", synonyms=["Test"])
+
+    with pytest.raises(ab.DuplicationError):
+        with abrev.batch():
+            abrev.add_value("drug", "TestDrug2", synonyms=["test2"])
+            abrev.remove_value("drug", "TestDrug")
+            abrev.add_value("drug", "TestDrug3", synonyms=["Test", "test2"])
+
+    assert abrev.data == {"drug": {"TestDrug": ("Test",)}}
+    with open(filename, "r") as f:
+        assert yaml.safe_load(f) == {"drug": {"TestDrug": ["Test"]}}
+
+
 @pytest.mark.parametrize("kwargs", get_kwargs())
 def test_value(kwargs):
 
@@ -125,6 +182,19 @@ def test_duplicate_synonyms(kwargs):
         abrev.add_value("drug", value, synonyms=synonyms)
 
     assert "Duplicate synonym Test for key drug" in str(excinfo.value)
+    assert "already a synonym of TestDrug" in str(excinfo.value)
+    assert "TestDrug2" not in abrev.list_values("drug")
+    assert abrev.get_name("drug", "Test") == "TestDrug"
+
+    # A synonym can be reused once it is removed from the other value
+    abrev.remove_synonym("drug", "TestDrug", "Test")
+    abrev.add_value("drug", value, synonyms=synonyms)
+    assert abrev.get_name("drug", "Test") == value
+
+    abrev.remove_value("drug", value)
+    abrev.raise_on_failure = False
+    assert abrev.get_name("drug", "Test") is None
+    assert abrev.get_name("drug", "test") == "TestDrug"
 
 
 @pytest.mark.parametrize("kwargs", get_kwargs())
@@ -156,6 +226,147 @@ def test_get_name(kwargs):
     assert name is None
 
 
+def test_normalized_get_name(caplog):
+    data = {
+        "pacing": {"0Hz": ["spont"], "1Hz": ["paced"]},
+        "drug": {"Lidocaine": ["lid", "Lido"], "Lid": ["lid_"]},
+    }
+    abrev = ab.Abbreviations(data=data, raise_on_failure=False)
+    assert abrev.get_name("pacing", "1 HZ") is None
+
+    abrev = ab.Abbreviations(data=data, raise_on_failure=False, normalized=True)
+    assert abrev.get_name("pacing", "1 HZ") == "1Hz"
+    assert abrev.get_name("pacing", "1_hz") == "1Hz"
+    assert abrev.get_name("pacing", "Spont") == "0Hz"
+    assert abrev.get_name("pacing", "2Hz") is None
+    # Exact matches are used before the normalized ones
+    assert abrev.get_name("drug", "lid") == "Lidocaine"
+    assert abrev.get_name("drug", "LID") is None
+    assert abrev.ambiguous_synonyms() == {"drug": {"lid": ["Lid", "Lidocaine"]}}
+    assert "Normalized synonym lid for key drug is ambiguous" in caplog.text
+
+    abrev.add_value("pacing", "2Hz", synonyms=[])
+    assert abrev.get_name("pacing", "2 hz") == "2Hz"
+
+    # The warning is logged by the change that makes a synonym ambiguous,
+    # and is not repeated
+    caplog.clear()
+    abrev.add_synonym("pacing", "2Hz", "Paced")
+    assert caplog.text.count("ambiguous") == 1
+    assert "Normalized synonym paced for key pacing is ambiguous" in caplog.text
+    caplog.clear()
+    abrev.add_value("pacing", "3Hz", synonyms=["3 hz"])
+    assert abrev.get_name("pacing", "PACED") is None
+    assert abrev.get_name("pacing", "3HZ") == "3Hz"
+    assert "ambiguous" not in caplog.text
+
+    # Also within a batch, and the collision is gone after a rollback
+    with pytest.raises(ab.DuplicationError):
+        with abrev.batch():
+            abrev.add_value("pacing", "4Hz", synonyms=["3_hz"])
+            assert "Normalized synonym 3hz for key pacing" in caplog.text
+            assert abrev.get_name("pacing", "3HZ") is None
+            abrev.add_value("pacing", "5Hz", synonyms=["3_hz"])
+    assert abrev.get_name("pacing", "3HZ") == "3Hz"
+    assert "3hz" not in abrev.ambiguous_synonyms()["pacing"]
+
+    # Removing a value resolves the collisions of its synonyms
+    abrev.remove_value("pacing", "1Hz")
+    assert abrev.get_name("pacing", "PACED") == "2Hz"
+    assert abrev.ambiguous_synonyms() == {"drug": {"lid": ["Lid", "Lidocaine"]}}
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Unix permissions")
+def test_file_permissions(tmp_path):
+    filename = tmp_path.joinpath("abbreviations.yaml")
+    with open(filename, "w") as f:
+        yaml.dump(DATA, f)
+    os.chmod(filename, 0o664)
+
+    umask = os.umask(0o022)
+    try:
+        abrev = ab.Abbreviations(data={}, filename=filename)
+        abrev.add_value("drug", "Verapamil", ["Ver"])
+    finally:
+        os.umask(umask)
+    # The file keeps its permissions, and the new snapshot gets the default
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o664
+    snapshot = ab.snapshot_filename(filename)
+    assert stat.S_IMODE(os.stat(snapshot).st_mode) == 0o644
+
+
+def test_snapshot(tmp_path, monkeypatch):
+    filename = tmp_path.joinpath("abbreviations.yaml")
+    with open(filename, "w") as f:
+        yaml.dump(DATA, f)
+
+    abrev = ab.Abbreviations(data={}, filename=filename)
+    assert ab.snapshot_filename(filename).is_file()
+
+    def load(*args, **kwargs):
+        raise AssertionError("The yaml file should not be parsed")
+
+    with monkeypatch.context() as m:
+        m.setattr(ab.yaml, "load", load)
+        new_abrev = ab.Abbreviations(data={}, filename=filename)
+        assert new_abrev.data == abrev.data
+        assert new_abrev.get_name("pacing", "paced") == "1Hz"
+
+        # Changes made through the abbreviations update the snapshot
+        new_abrev.add_value("drug", "TestDrug", synonyms=["test"])
+        assert ab.Abbreviations(data={}, filename=filename).has_value(
+            "drug",
+            "TestDrug",
+        )
+
+    # The snapshot is not used if the file is changed by someone else
+    with open(filename, "w") as f:
+        yaml.dump({"drug": {"OtherDrug": ["other"]}}, f)
+    abrev = ab.Abbreviations(data={}, filename=filename)
+    assert abrev.data == {"drug": {"OtherDrug": ("other",)}}
+
+
+def test_snapshot_non_string_synonyms(tmp_path):
+    filename = tmp_path.joinpath("abbreviations.yaml")
+    filename.write_text("chip: {A1: [1]}\n")
+    # The same result whether the file is loaded for the first time or not
+    for _ in range(2):
+        abrev = ab.Abbreviations(data={}, filename=filename, raise_on_failure=False)
+        assert abrev.get_name("chip", 1) == "A1"
+        assert abrev.get_name("chip", "1") is None
+    assert not ab.snapshot_filename(filename).exists()
+
+
+def test_mixed_synonyms(tmp_path):
+    filename = tmp_path.joinpath("abbreviations.yaml")
+    filename.write_text("chip: {A1: [a1, 1, A1, 1]}\n")
+    abrev = ab.Abbreviations(data={}, filename=filename)
+    assert abrev.list_synonyms("chip", "A1") == [1, "A1", "a1"]
+    assert abrev.get_name("chip", 1) == "A1"
+
+    abrev.add_synonym("chip", "A1", 2)
+    assert ab.Abbreviations(data={}, filename=filename).get_name("chip", 2) == "A1"
+
+
+def test_name_cache():
+    abrev = ab.Abbreviations(data=deepcopy(DATA), raise_on_failure=False)
+    names = ab.NameCache(abrev, maxsize=2)
+
+    assert names.get_name("pacing", "paced") == "1Hz"
+    assert names.get_name("pacing", "paced") == "1Hz"
+    assert names.get_name("pacing", "spont") == "0Hz"
+    assert names.get_name("pacing", "unknown") is None
+    assert names.cache_info() == {"hits": 1, "misses": 3, "maxsize": 2, "currsize": 2}
+    # The least recently used entry is evicted
+    assert names.get_name("pacing", "paced") == "1Hz"
+    assert names.cache_info()["misses"] == 4
+    assert names.get_name("pacing", ["unhashable"]) is None
+
+    # The cache is cleared when the abbreviations change
+    abrev.add_value("pacing", "3Hz", synonyms=["unknown"])
+    assert names.get_name("pacing", "unknown") == "3Hz"
+
+
 if __name__ == "__main__":
     # test_get_synonyms()
     # test_remove_value()
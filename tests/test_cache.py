@@ -0,0 +1,138 @@
+import shutil
+
+import pytest
+from mps_data_parser import MatchError
+from mps_data_parser import PathMatcher
+from mps_data_parser import cache
+from mps_data_parser import scan
+from mps_data_parser.cache import CACHE_FILENAME
+
+config = {
+    "folder": "181116_Lidocaine",
+    "regexs": ["{dose}_{pacing_frequency}/Point{chip}_{media}_Channel{channel}.nd2"],
+}
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path.joinpath(config["folder"])
+    for dose in ["0uM", "1uM"]:
+        folder = root.joinpath(f"{dose}_1Hz")
+        folder.mkdir(parents=True)
+        for chip in ["1A", "2A"]:
+            folder.joinpath(f"Point{chip}_MM_ChannelRed.nd2").touch()
+    root.joinpath("not_matched.nd2").touch()
+    return root
+
+
+@pytest.fixture
+def num_calls(monkeypatch):
+    calls = []
+    call = PathMatcher.__call__
+
+    def counting_call(self, path):
+        calls.append(path)
+        return call(self, path)
+
+    monkeypatch.setattr(PathMatcher, "__call__", counting_call)
+    return calls
+
+
+def as_dicts(results):
+    return [str(r) if isinstance(r, MatchError) else r.to_dict() for r in results]
+
+
+def test_cached_scan(root, num_calls):
+    expected = as_dicts(scan(root, config))
+    assert len(num_calls) == 5
+    num_calls.clear()
+
+    assert as_dicts(scan(root, config, cache=True)) == expected
+    assert root.joinpath(CACHE_FILENAME).is_file()
+    assert len(num_calls) == 5
+    num_calls.clear()
+
+    # Nothing has changed, so nothing should be parsed
+    assert as_dicts(scan(root, config, cache=True)) == expected
+    assert len(num_calls) == 0
+
+    # Add a new dose
+    folder = root.joinpath("10uM_1Hz")
+    folder.mkdir()
+    folder.joinpath("Point1A_MM_ChannelRed.nd2").touch()
+    results = as_dicts(scan(root, config, cache=True))
+    assert len(num_calls) == 1
+    assert results == as_dicts(scan(root, config))
+    num_calls.clear()
+
+    # Remove a dose
+    shutil.rmtree(root.joinpath("0uM_1Hz"))
+    results = as_dicts(scan(root, config, cache=True))
+    assert len(num_calls) == 0
+    assert len(results) == 4
+    assert results == as_dicts(scan(root, config))
+
+
+def test_cached_scan_is_streamed(root, monkeypatch):
+    list(scan(root, config, cache=True))
+
+    walked = []
+    walk = cache._walk
+
+    def counting_walk(*args):
+        for cached in walk(*args):
+            walked.append(cached.path)
+            yield cached
+
+    monkeypatch.setattr(cache, "_walk", counting_walk)
+    # The first result is yielded before the rest of the folder is walked
+    results = scan(root, config, cache=True)
+    next(results)
+    assert len(walked) == 1
+    assert len(list(results)) == 4
+    assert len(walked) == 5
+
+    # Also when a new file is parsed
+    root.joinpath("1uM_1Hz", "Point3A_MM_ChannelRed.nd2").touch()
+    walked.clear()
+    results = scan(root, config, cache=True)
+    next(results)
+    assert len(walked) == 1
+
+
+def test_cache_is_invalidated(root, num_calls, tmp_path):
+    cache_file = tmp_path.joinpath("cache.sqlite")
+    list(scan(root, config, cache=cache_file))
+    assert len(num_calls) == 5
+    num_calls.clear()
+
+    new_config = dict(config, operator="John")
+    results = list(scan(root, new_config, cache=cache_file))
+    assert len(num_calls) == 5
+    assert all(r.operator == "John" for r in results if not isinstance(r, MatchError))
+    num_calls.clear()
+
+    # Changing the abbreviations should also invalidate the cache
+    abbreviations = {"media": {"Maturation media": ["MM"]}}
+    results = list(
+        scan(
+            root,
+            new_config,
+            cache=cache_file,
+            additional_abbreviations=abbreviations,
+        ),
+    )
+    assert len(num_calls) == 5
+    num_calls.clear()
+
+    # Files that are not matched are MPSData when not strict
+    results = list(scan(root, new_config, cache=cache_file, strict=False))
+    assert len(num_calls) == 5
+    assert not any(isinstance(r, MatchError) for r in results)
+    num_calls.clear()
+
+    # The same cache file for another root
+    other_root = tmp_path.joinpath("other", config["folder"])
+    shutil.copytree(root, other_root)
+    results = list(scan(other_root, new_config, cache=cache_file, strict=False))
+    assert len(num_calls) == 5
@@ -0,0 +1,96 @@
+import pytest
+import yaml
+from mps_data_parser import catalog
+from mps_data_parser.catalog import Catalog
+
+
+def make_experiment(data_root, config_dir, drug, pacings):
+    folder = f"181116_{drug}"
+    config = {
+        "folder": folder,
+        "regexs": [
+            "{dose}_{pacing_frequency}/Point{chip}_{media}_Channel{channel}.nd2",
+        ],
+        "drug": drug,
+    }
+    config_dir.joinpath(f"{folder}.yaml").write_text(yaml.dump(config))
+    root = data_root.joinpath(folder)
+    for dose in ["0uM", "1uM", "10uM"]:
+        for pacing in pacings:
+            path = root.joinpath(f"{dose}_{pacing}")
+            path.mkdir(parents=True)
+            for chip in ["1A", "2A"]:
+                for channel in ["Red", "Cyan"]:
+                    path.joinpath(f"Point{chip}_MM_Channel{channel}.nd2").touch()
+    root.joinpath("not_matched.nd2").touch()
+    return root
+
+
+@pytest.fixture
+def pairs(tmp_path):
+    data_root = tmp_path.joinpath("data")
+    config_dir = tmp_path.joinpath("config_files")
+    config_dir.mkdir()
+    make_experiment(data_root, config_dir, "Lidocaine", ["1Hz", "0Hz"])
+    make_experiment(data_root, config_dir, "Verapamil", ["1Hz"])
+    # A config without a folder on disk is skipped
+    config_dir.joinpath("missing.yaml").write_text(yaml.dump({"folder": "missing"}))
+    return list(catalog.experiments(data_root, config_dir))
+
+
+def test_experiments(pairs):
+    assert [folder.name for folder, _ in pairs] == [
+        "181116_Lidocaine",
+        "181116_Verapamil",
+    ]
+
+
+def test_query(pairs, tmp_path):
+    filename = tmp_path.joinpath("catalog.sqlite")
+    with Catalog(filename) as cat:
+        assert cat.update(pairs) == 3 * 2 * 4 + 3 * 4 + 2
+        assert len(cat) == 38
+        assert [(e.num_files, e.num_unmatched) for e in cat.experiments()] == [
+            (25, 1),
+            (13, 1),
+        ]
+
+    with Catalog(filename) as cat:
+        traces = cat.query(
+            drug="Verapamil",
+            pacing_frequency="1Hz",
+            media="MM",
+            trace_type="voltage",
+        )
+        assert len(traces) == 3 * 2
+        assert {t.dose for t in traces} == {"0uM", "1uM", "10uM"}
+        assert traces[0].path == "0uM_1Hz/Point1A_MM_ChannelRed.nd2"
+        assert cat.count(dose=["1uM", "10uM"], trace_type="calcium") == 8 + 4
+        assert cat.values("drug") == {"Lidocaine": 24, "Verapamil": 12}
+
+
+def test_add_replaces(pairs):
+    with Catalog(":memory:") as cat:
+        cat.update(pairs)
+        folder, config = pairs[1]
+        cat.add(folder, config)
+        assert len(cat) == 38
+        cat.remove(folder)
+        assert cat.values("drug") == {"Lidocaine": 24}
+
+
+def test_query_uses_index(pairs):
+    with Catalog(":memory:") as cat:
+        cat.update(pairs)
+        where, params = cat._where({"drug": "Verapamil", "media": "MM"})
+        plan = cat._con.execute(
+            f"EXPLAIN QUERY PLAN SELECT * FROM records WHERE {where}",
+            params,
+        ).fetchall()
+        assert "USING INDEX" in plan[0][-1]
+
+
+def test_query_unknown_key():
+    with Catalog(":memory:") as cat:
+        with pytest.raises(ValueError):
+            cat.query(roi="roi1")
@@ -0,0 +1,249 @@
+import sqlite3
+
+import pytest
+from mps_data_parser import database
+from mps_data_parser import MatchError
+from mps_data_parser import MPSData
+
+
+def records(doses, drug="Lidocaine"):
+    return [
+        MPSData.from_dict(
+            {
+                "folder": "181116_Lidocaine",
+                "path": f"{dose}_1Hz/Point{chip}_MM_ChannelRed.nd2",
+                "dose": dose,
+                "pacing_frequency": "1Hz",
+                "media": "MM",
+                "chip": chip,
+                "channel": "Red",
+                "trace_type": "voltage",
+                "extension": ".nd2",
+                "drug": drug,
+            },
+        )
+        for dose in doses
+        for chip in ["1A", "2A"]
+    ]
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    database.create_tables(connection)
+    yield connection
+    connection.close()
+
+
+def test_load(connection):
+    statements = []
+    connection.set_trace_callback(statements.append)
+
+    result = database.load(
+        connection,
+        records(["0uM", "1uM", "10uM"]),
+        experiment="181116_Lidocaine",
+        cell_line="SCVI273",
+        chunksize=4,
+    )
+    assert result == database.LoadResult(inserted=6, skipped=0)
+    # One query for the columns, one for the existing paths, one for
+    # each name table and one for each new name, and no query per record
+    assert sum(s.startswith("SELECT") for s in statements) == 8
+
+    rows = connection.execute(
+        "SELECT mps_data.path, mps_data.dose, drug.name, cell_line.name, "
+        "experiment.name FROM mps_data "
+        "JOIN drug ON drug.id = mps_data.drug_id "
+        "JOIN cell_line ON cell_line.id = mps_data.cell_line_id "
+        "JOIN experiment ON experiment.id = mps_data.experiment_id "
+        "ORDER BY mps_data.id",
+    ).fetchall()
+    assert rows[0] == (
+        "0uM_1Hz/Point1A_MM_ChannelRed.nd2",
+        "0uM",
+        "Lidocaine",
+        "SCVI273",
+        "181116_Lidocaine",
+    )
+    assert len(rows) == 6
+    assert connection.execute("SELECT COUNT(*) FROM drug").fetchone() == (1,)
+
+    # Only the new records are inserted
+    result = database.load(
+        connection,
+        records(["1uM", "100uM"], drug="Verapamil"),
+        experiment="181116_Lidocaine",
+    )
+    assert result == database.LoadResult(inserted=2, skipped=2)
+    assert connection.execute("SELECT COUNT(*) FROM mps_data").fetchone() == (8,)
+    assert connection.execute("SELECT COUNT(*) FROM experiment").fetchone() == (1,)
+    assert connection.execute("SELECT COUNT(*) FROM drug").fetchone() == (2,)
+
+
+def test_name_table_without_lastrowid(connection):
+    class Cursor:
+        """Cursor where lastrowid is not the id, like with psycopg2"""
+
+        def __init__(self, cursor):
+            self._cursor = cursor
+            self.lastrowid = None
+
+        def execute(self, *args):
+            return self._cursor.execute(*args)
+
+        def fetchone(self):
+            return self._cursor.fetchone()
+
+        def fetchall(self):
+            return self._cursor.fetchall()
+
+    class Connection:
+        def cursor(self):
+            return Cursor(connection.cursor())
+
+    connection.execute("INSERT INTO drug (name) VALUES ('Lidocaine')")
+    drugs = database.NameTable(Connection(), "drug")
+    assert drugs.get_id("Verapamil") == 2
+    assert drugs.get_id("Verapamil") == 2
+    assert drugs.get_id("Lidocaine") == 1
+
+
+def test_load_match_error(connection):
+    with pytest.raises(MatchError):
+        database.load(
+            connection,
+            records(["0uM"]) + [MatchError("No match", path="not_matched.nd2")],
+            experiment="181116_Lidocaine",
+            chunksize=1,
+        )
+    # Nothing is inserted
+    assert connection.execute("SELECT COUNT(*) FROM mps_data").fetchone() == (0,)
+
+
+def test_sync(connection):
+    def sync(records):
+        return database.sync(
+            connection,
+            records,
+            experiment="181116_Lidocaine",
+            cell_line="SCVI273",
+            chunksize=3,
+        )
+
+    def rows():
+        return connection.execute(
+            "SELECT path, dose FROM mps_data ORDER BY path",
+        ).fetchall()
+
+    assert sync(records(["0uM", "1uM"])) == database.SyncResult(4, 0, 0, 0)
+    expected = rows()
+
+    # Nothing is written when nothing has changed
+    statements = []
+    connection.set_trace_callback(statements.append)
+    changes = connection.total_changes
+    assert sync(records(["0uM", "1uM"])) == database.SyncResult(0, 0, 0, 4)
+    assert connection.total_changes == changes
+    # Only reads, i.e the schema and the hashes
+    assert not [s for s in statements if not s.startswith(("SELECT", "PRAGMA"))]
+    assert rows() == expected
+
+    # Change the dose of the records of 1uM, and remove the ones of 0uM
+    new_records = records(["1uM", "10uM"])
+    for record in new_records[:2]:
+        record.dose = "2uM"
+    assert sync(new_records) == database.SyncResult(2, 2, 2, 0)
+    assert rows() == [
+        ("10uM_1Hz/Point1A_MM_ChannelRed.nd2", "10uM"),
+        ("10uM_1Hz/Point2A_MM_ChannelRed.nd2", "10uM"),
+        ("1uM_1Hz/Point1A_MM_ChannelRed.nd2", "2uM"),
+        ("1uM_1Hz/Point2A_MM_ChannelRed.nd2", "2uM"),
+    ]
+
+
+def test_sync_after_load(connection):
+    database.load(connection, records(["0uM"]), experiment="181116_Lidocaine")
+    result = database.sync(connection, records(["0uM"]), experiment="181116_Lidocaine")
+    assert result == database.SyncResult(0, 0, 0, 2)
+
+
+@pytest.fixture
+def mps_database_connection():
+    """Tables as created by mps_database, where the path is unique in the
+    whole table and there is no content_hash column
+    """
+    connection = sqlite3.connect(":memory:")
+    for statement in database.SCHEMA:
+        statement = statement.replace("        content_hash VARCHAR,\n", "")
+        connection.execute(statement.replace("(experiment_id, path)", "(path)"))
+    yield connection
+    connection.close()
+
+
+def test_unique_path(connection, mps_database_connection):
+    assert not database.has_unique_path(connection)
+    assert database.has_unique_path(mps_database_connection)
+
+
+def test_load_sync_unique_path(mps_database_connection):
+    connection = mps_database_connection
+    load = database.load(connection, records(["0uM"]), experiment="181116_Lidocaine")
+    assert load == database.LoadResult(2, 0)
+
+    # The paths of the other experiment are skipped instead of failing
+    load = database.load(
+        connection,
+        records(["0uM", "1uM"]),
+        experiment="181117_Lidocaine",
+    )
+    assert load == database.LoadResult(2, 2)
+    result = database.sync(
+        connection,
+        records(["0uM", "10uM"]),
+        experiment="181117_Lidocaine",
+    )
+    assert result == database.SyncResult(2, 0, 2, 0, skipped=2)
+
+    # The rows of the first experiment are untouched
+    assert database.sync(
+        connection,
+        records(["0uM"]),
+        experiment="181116_Lidocaine",
+    ) == database.SyncResult(0, 0, 0, 2)
+    assert connection.execute(
+        "SELECT experiment.name, COUNT(*) FROM mps_data "
+        "JOIN experiment ON experiment.id = experiment_id "
+        "GROUP BY experiment.name ORDER BY experiment.name",
+    ).fetchall() == [("181116_Lidocaine", 2), ("181117_Lidocaine", 2)]
+
+
+def test_sync_two_experiments(connection):
+    # The relative paths are the same in both experiments
+    for experiment in ["181116_Lidocaine", "181117_Lidocaine"]:
+        result = database.sync(connection, records(["0uM"]), experiment=experiment)
+        assert result == database.SyncResult(2, 0, 0, 0)
+
+    def rows():
+        return connection.execute(
+            "SELECT experiment.name, path FROM mps_data "
+            "JOIN experiment ON experiment.id = experiment_id "
+            "ORDER BY experiment.name, path",
+        ).fetchall()
+
+    assert len(rows()) == 4
+    result = database.sync(connection, records(["0uM"]), experiment="181116_Lidocaine")
+    assert result == database.SyncResult(0, 0, 0, 2)
+
+    # Removing the files of one experiment leaves the other alone
+    result = database.sync(connection, records(["1uM"]), experiment="181117_Lidocaine")
+    assert result == database.SyncResult(2, 0, 2, 0)
+    assert rows() == [
+        ("181116_Lidocaine", "0uM_1Hz/Point1A_MM_ChannelRed.nd2"),
+        ("181116_Lidocaine", "0uM_1Hz/Point2A_MM_ChannelRed.nd2"),
+        ("181117_Lidocaine", "1uM_1Hz/Point1A_MM_ChannelRed.nd2"),
+        ("181117_Lidocaine", "1uM_1Hz/Point2A_MM_ChannelRed.nd2"),
+    ]
+
+    result = database.load(connection, records(["0uM"]), experiment="181117_Lidocaine")
+    assert result == database.LoadResult(2, 0)
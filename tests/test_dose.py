@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from mps_data_parser import dose
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("10uM", (1e-5, dose.UNITS.index("uM"))),
+        ("10 uM", (1e-5, dose.UNITS.index("uM"))),
+        ("0nM", (0.0, dose.UNITS.index("nM"))),
+        ("0.5 mM", (5e-4, dose.UNITS.index("mM"))),
+        ("1e3nM", (1e-6, dose.UNITS.index("nM"))),
+        ("10µM", (1e-5, dose.UNITS.index("uM"))),
+        ("0nm", (0.0, dose.UNITS.index("nM"))),
+        ("10um", (1e-5, dose.UNITS.index("uM"))),
+        ("10 um", (1e-5, dose.UNITS.index("uM"))),
+        ("2mm", (2e-3, dose.UNITS.index("mM"))),
+        ("no dose", (0.0, dose.NO_DOSE)),
+        ("No_Dose", (0.0, dose.NO_DOSE)),
+    ],
+)
+def test_parse_dose(value, expected):
+    result = dose.parse_dose(value)
+    assert result[0] == pytest.approx(expected[0])
+    assert result[1] == expected[1]
+
+
+@pytest.mark.parametrize("value", ["dose1", "10", "uM", "10 m", "10MM", None])
+def test_parse_dose_not_a_dose(value):
+    value, code = dose.parse_dose(value)
+    assert np.isnan(value)
+    assert code == dose.NOT_A_DOSE
+
+
+def test_parse_doses():
+    doses = dose.parse_doses(["10uM", "no dose", "10uM", "dose1"])
+    assert len(doses) == 4
+    assert doses.values[[0, 1, 2]].tolist() == pytest.approx([1e-5, 0, 1e-5])
+    assert np.isnan(doses.values[3])
+    assert doses.parsed.tolist() == [True, True, True, False]
+    assert dose.parse_doses(doses) is doses
+
+
+def test_sort():
+    doses = ["100uM", "dose1", "10 uM", "no dose", "100 nM", "1uM", "1000nM"]
+    assert dose.sort(doses) == [
+        "no dose",
+        "100 nM",
+        "1000nM",
+        "1uM",
+        "10 uM",
+        "100uM",
+        "dose1",
+    ]
+    assert np.array(doses)[dose.argsort(doses)].tolist() == dose.sort(doses)
+    # The same concentration is sorted by the strings
+    assert dose.sort(["1uM", "0nm", "1nM", "no dose"]) == [
+        "0nm",
+        "no dose",
+        "1nM",
+        "1uM",
+    ]
+
+
+def test_normalize():
+    assert dose.normalize(["1000nM", "1 uM", "no dose", "dose1", "0.5mM"]) == [
+        "1 uM",
+        "1 uM",
+        "no dose",
+        "dose1",
+        "500 uM",
+    ]
+    assert dose.normalize(["1uM"], unit="nM") == ["1000 nM"]
+
+
+def test_bucket():
+    buckets = dose.bucket(["no dose", "100 nM", "10 uM", "dose1"], edges=[0.01, 1])
+    assert buckets.tolist() == [0, 1, 2, -1]
+
+
+def test_to_quantity():
+    pytest.importorskip("pint")
+    quantity = dose.to_quantity(["1uM", "no dose"])
+    assert quantity.to("nM").magnitude.tolist() == pytest.approx([1000, 0])
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from mps_data_parser import export
+from mps_data_parser import MatchError
+from mps_data_parser import MPSData
+from mps_data_parser import scan
+
+
+@pytest.fixture
+def records():
+    return [
+        MPSData.from_dict(
+            {
+                "folder": "181116_Lidocaine",
+                "path": f"{dose}_1Hz/Point{chip}_MM_ChannelRed.nd2",
+                "dose": dose,
+                "pacing_frequency": "1Hz",
+                "chip": chip,
+                "trace_type": "voltage",
+                "drug": "Lidocaine",
+                "well": "A1",
+            },
+        )
+        for dose in ["0uM", "1uM", "10uM"]
+        for chip in ["1A", "2A"]
+    ] + [MatchError("No match", path="notes.txt")]
+
+
+def test_to_batch(records):
+    batch = export.to_batch(records)
+    assert len(batch) == 7
+    assert batch.keys()[: len(MPSData.arguments())] == list(MPSData.arguments())
+    assert "well" in batch
+    assert batch.matched.tolist() == [True] * 6 + [False]
+    assert batch["path"][-1] == "notes.txt"
+    assert batch["dose"][-1] is None
+
+
+def test_encode_decode():
+    column = np.array(["a", None, "b", "a"], dtype=object)
+    values, codes = export.encode(column)
+    assert values.tolist() == ["a", "b"]
+    assert codes.tolist() == [0, -1, 1, 0]
+    assert codes.dtype == np.int8
+    assert export.decode(values, codes).tolist() == column.tolist()
+
+
+@pytest.mark.parametrize("suffix", [".npz", ".parquet", ".feather"])
+def test_save_load(records, tmp_path, suffix):
+    if suffix != ".npz":
+        pytest.importorskip("pyarrow")
+    filename = tmp_path.joinpath("data").with_suffix(suffix)
+    expected = export.to_batch(records)
+    export.save(records, filename)
+
+    batch = export.load(filename)
+    assert batch.keys() == expected.keys()
+    assert batch.matched.tolist() == expected.matched.tolist()
+    assert list(batch.records()) == list(expected.records())
+
+
+def test_unknown_format(records, tmp_path):
+    with pytest.raises(ValueError):
+        export.save(records, tmp_path.joinpath("data.csv"))
+
+
+def test_save_load_lookup_rule(tmp_path):
+    config = {
+        "folder": "181121_Verap_flec",
+        "regexs": [
+            "{dose}_{pacing_frequency}/Point{chip}_{drug_}_Channel{channel}.nd2"
+        ],
+        "rules": ['drug_dict = {"V": "Verapamil"}; drug = drug_dict[drug_]'],
+    }
+    root = tmp_path.joinpath(config["folder"])
+    root.joinpath("1uM_1Hz").mkdir(parents=True)
+    for chip in ["1A", "2A"]:
+        root.joinpath("1uM_1Hz", f"Point{chip}_V_ChannelRed.nd2").touch()
+
+    records = list(scan(root, config))
+    # The rule leaves the dictionary in the data
+    assert isinstance(records[0].to_dict()["drug_dict"], dict)
+    filename = tmp_path.joinpath("data.npz")
+    export.save(records, filename)
+
+    batch = export.load(filename)
+    assert batch["drug"].tolist() == ["Verapamil", "Verapamil"]
+    assert batch["drug_dict"].tolist() == [str({"V": "Verapamil"})] * 2
@@ -0,0 +1,74 @@
+import numpy as np
+from mps_data_parser import grouping
+from mps_data_parser.batch import Batch
+
+
+def make_batch():
+    rows = [
+        ("MM", "1A", "voltage", "a.nd2"),
+        ("MM", "1A", "calcium", "b.nd2"),
+        ("MM", "2A", "voltage", "c.nd2"),
+        ("MM", "1A", "voltage", "d.nd2"),
+        ("SM", "1A", "brightfield", "e.nd2"),
+        (None, "1A", "voltage", "f.nd2"),
+        ("MM", "2A", None, "g.nd2"),
+    ]
+    media, chip, trace_type, path = zip(*rows)
+    columns = {"media": media, "chip": chip, "trace_type": trace_type, "path": path}
+    return Batch(columns, [True] * len(rows))
+
+
+def test_group_rows():
+    group, first = grouping.group_rows(make_batch(), ["media", "chip"])
+    assert group.tolist() == [0, 0, 1, 0, 2, -1, 1]
+    assert first.tolist() == [0, 2, 4]
+
+
+def test_group_rows_unmatched():
+    batch = make_batch()
+    batch.matched[0] = False
+    group, _ = grouping.group_rows(batch, ["media", "chip"])
+    assert group.tolist() == [-1, 0, 1, 0, 2, -1, 1]
+
+
+def test_group_traces():
+    batch = make_batch()
+    groups = grouping.group_traces(batch, ["media", "chip"])
+    assert len(groups) == 3
+    assert [groups.group_key(i) for i in range(3)] == ["MM_1A", "MM_2A", "SM_1A"]
+    assert groups.counts.tolist() == [[2, 1, 0], [1, 0, 0], [0, 0, 1]]
+    assert groups.missing.tolist() == [
+        [False, False, True],
+        [False, True, True],
+        [True, True, False],
+    ]
+
+    duplicates = list(groups.duplicates())
+    assert len(duplicates) == 1
+    group, trace_type, rows = duplicates[0]
+    assert (group, trace_type, rows.tolist()) == (0, "voltage", [0, 3])
+
+    table = groups.table(batch)
+    assert table["media"].tolist() == ["MM", "MM", "SM"]
+    # The last file is used for duplicates
+    assert table["voltage"].tolist() == ["d.nd2", "c.nd2", None]
+    assert table["calcium"].tolist() == ["b.nd2", None, None]
+    assert table["brightfield"].tolist() == [None, None, "e.nd2"]
+
+
+def test_group_traces_many_keys():
+    # Enough keys and values that the combined codes are renumbered
+    rng = np.random.default_rng(1)
+    columns = {
+        f"key{i}": rng.integers(0, 1000, size=2000).astype(str) for i in range(8)
+    }
+    columns["trace_type"] = np.array(["voltage"] * 2000, dtype=object)
+    batch = Batch(columns, [True] * 2000)
+    keys = [f"key{i}" for i in range(8)]
+    groups = grouping.group_traces(batch, keys)
+
+    expected = {}
+    for row in range(2000):
+        expected.setdefault(tuple(columns[k][row] for k in keys), len(expected))
+    assert len(groups) == len(expected)
+    assert groups.counts[:, 0].sum() == 2000
@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def imported_modules(code):
+    code += "; import sys; print(' '.join(sys.modules))"
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return set(output.split())
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import mps_data_parser",
+        "from mps_data_parser import PathMatcher, MPSData, scan",
+        "from mps_data_parser import utils",
+    ],
+)
+def test_import_is_lazy(code):
+    modules = imported_modules(code)
+    for module in ["numpy", "pint", "argparse", "concurrent.futures"]:
+        assert module not in modules
+
+
+def test_scripts_import_is_lazy():
+    modules = imported_modules("from mps_data_parser import scripts")
+    for module in ["numpy", "mps_data_parser.export", "mps_data_parser.grouping"]:
+        assert module not in modules
+
+
+def test_lazy_attributes():
+    import mps_data_parser
+
+    assert mps_data_parser.PathMatcher is mps_data_parser.pathmatcher.PathMatcher
+    assert mps_data_parser.Batch is mps_data_parser.batch.Batch
+    assert "scan" in dir(mps_data_parser)
+    with pytest.raises(AttributeError):
+        mps_data_parser.not_an_attribute
@@ -1,3 +1,6 @@
+import pickle
+
+import pytest
 import yaml
 from mps_data_parser import abreviations as ab
 from mps_data_parser import MPSData
@@ -34,5 +37,31 @@ def test_mps_data():
     assert mps_data.new_argument == new_argument
 
 
+def test_mps_data_extra_arguments():
+    mps_data = MPSData(
+        folder="TestFolder",
+        path="test_path",
+        abrev=None,
+        chip="TestChip",
+        new_argument="TestArgument",
+    )
+    assert not hasattr(mps_data, "__dict__")
+    assert mps_data.get("chip") == "TestChip"
+    assert mps_data.get("new_argument") == "TestArgument"
+    assert mps_data.get("not_an_argument") is None
+    with pytest.raises(AttributeError):
+        mps_data.not_an_argument
+
+    data = mps_data.to_dict()
+    assert data == {
+        "folder": "TestFolder",
+        "path": "test_path",
+        "chip": "TestChip",
+        "new_argument": "TestArgument",
+    }
+    assert MPSData.from_dict(data).to_dict() == data
+    assert pickle.loads(pickle.dumps(mps_data)).to_dict() == data
+
+
 if __name__ == "__main__":
     test_mps_data()
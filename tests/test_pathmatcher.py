@@ -1,7 +1,13 @@
+import string
 from pathlib import Path
 
 import pytest
 from mps_data_parser import PathMatcher
+from mps_data_parser.utils import load_config
+
+CONFIG_FILES = sorted(
+    Path(__file__).absolute().parent.parent.joinpath("config_files").glob("*.yaml"),
+)
 
 config = {
     "folder": "190820_Ver_Alf_SCVI273_direct",
@@ -63,6 +69,82 @@ def test_path_matcher_with_diffs():
     assert data.roi == "none"
 
 
+def test_path_matcher_first_match_wins():
+
+    config_ = config.copy()
+    # The pattern ending in .nd also matches .nd2 files, so the order matters
+    config_["regexs"] = [
+        "{date}_{dose}_{pacing_frequency}/Point{chip}_{media}_{roi}_Channel{channel}_VC_Seq{seq_nr}.nd",
+        config["regexs"][1],
+    ]
+    pathmatcher = PathMatcher(config_, root=folder, strict=True)
+    path = folder.joinpath(str(Path(config["regexs"][1])).format(**attributes))
+    data = pathmatcher(path)
+    assert data.roi == "Alf"
+    assert data.drug == "none"
+
+
+def example_relative_paths(patterns):
+    paths = []
+    for i, pattern in enumerate(patterns):
+        names = [f for _, f, _, _ in string.Formatter().parse(pattern) if f]
+        for value in ["MM", "1uM", "Red", "x"]:
+            paths.append(str(Path(pattern.format(**{n: f"{value}{i}" for n in names}))))
+    return paths
+
+
+@pytest.mark.parametrize("config_file", CONFIG_FILES, ids=lambda p: p.stem)
+def test_path_matcher_matches_all_configs(config_file):
+
+    config_ = load_config(config_file)
+    pathmatcher = PathMatcher(config_, strict=False)
+    single_pass_pathmatcher = PathMatcher(config_, strict=False, single_pass=True)
+    # Also include a path that is not matched by any of the patterns
+    paths = example_relative_paths(config_["regexs"]) + ["not_matched.nd2"]
+    for path in paths:
+        # Try all the patterns without using the index
+        expected = next(
+            (
+                (i, res.named)
+                for i, res in enumerate(p.search(path) for p in pathmatcher._parsers)
+                if res is not None
+            ),
+            None,
+        )
+        assert pathmatcher._match(path) == expected
+        assert single_pass_pathmatcher._match(path) == expected
+
+
+def test_path_matcher_match_many():
+
+    config_ = config.copy()
+    config_["regexs"] = config["regexs"][:2]
+    pathmatcher = PathMatcher(config_, root=folder, strict=True)
+    paths = [
+        folder.joinpath(str(Path(regex)).format(**dict(attributes, drug=drug)))
+        for regex in config_["regexs"]
+        for drug in ["Alf", "Ver"]
+    ]
+    unmatched_path = folder.joinpath("not_matched.nd2")
+
+    batch = pathmatcher.match_many(paths + [str(unmatched_path)])
+    assert len(batch) == len(paths) + 1
+    assert batch.unmatched.tolist() == [False] * len(paths) + [True]
+    for i, path in enumerate(paths):
+        assert batch.to_dict(i) == pathmatcher(path).to_dict()
+    assert batch["path"][-1] == "not_matched.nd2"
+    assert batch["drug"][-1] is None
+
+
+def test_may_match_directory():
+    pathmatcher = PathMatcher(config, root=folder)
+    assert pathmatcher.may_match_directory("")
+    assert pathmatcher.may_match_directory("190820_0nM_paced")
+    assert pathmatcher.may_match_directory(str(Path("190820_0nM_paced/Point12")))
+    assert not pathmatcher.may_match_directory(str(Path("190820_0nM_paced/Point1")))
+    assert not pathmatcher.may_match_directory("analysis")
+
+
 def test_path_matcher_raises_RuntimeError():
 
     config_ = config.copy()
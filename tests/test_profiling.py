@@ -0,0 +1,103 @@
+import pytest
+from mps_data_parser import MatchError
+from mps_data_parser import PathMatcher
+from mps_data_parser import scan
+from mps_data_parser.profiling import ScanStats
+from mps_data_parser.profiling import STAGES
+
+config = {
+    "folder": "181116_Lidocaine",
+    "regexs": [
+        "{dose}_{pacing_frequency}/Point{chip}_{media}_Channel{channel}_Seq{seq}.nd2",
+        "{dose}_{pacing_frequency}/Point{chip}_{media}_Channel{channel}.nd2",
+    ],
+    "rules": ["media_dict = {'MM': 'Maturation media'}; media = media_dict[media]"],
+}
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path.joinpath(config["folder"])
+    for dose in ["0uM", "1uM"]:
+        folder = root.joinpath(f"{dose}_1Hz")
+        folder.mkdir(parents=True)
+        for chip in ["1A", "2A"]:
+            folder.joinpath(f"Point{chip}_MM_ChannelRed.nd2").touch()
+        folder.joinpath("Point1A_MM_ChannelRed_Seq1.nd2").touch()
+    root.joinpath("not_matched.nd2").touch()
+    return root
+
+
+def paths(root):
+    return sorted(str(p) for p in root.rglob("*.nd2"))
+
+
+@pytest.mark.parametrize("single_pass", [False, True])
+def test_profile(root, single_pass):
+    pathmatcher = PathMatcher(config, root=root, single_pass=single_pass)
+    expected = [pathmatcher(p).to_dict() for p in paths(root)[:-1]]
+    assert pathmatcher.stats is None
+
+    stats = pathmatcher.profile()
+    assert pathmatcher.stats is stats
+    results = []
+    for path in paths(root):
+        try:
+            results.append(pathmatcher(path).to_dict())
+        except MatchError:
+            pass
+    # Profiling does not change the result
+    assert results == expected
+
+    assert stats.files == 7
+    assert stats.unmatched == 1
+    assert stats.hits == [2, 4]
+    # The first pattern is only tried for the paths containing "_Seq",
+    # and no pattern is tried for the path that does not match
+    if single_pass:
+        # The candidates are tried in one regular expression
+        assert stats.attempts == [2, 6]
+    else:
+        assert stats.attempts == [2, 4]
+    assert stats.rule_calls == [6]
+    assert list(stats.times)[: len(STAGES)] == list(STAGES)
+    assert stats.times["match"] > 0
+    assert stats.times["walk"] == 0
+    assert "Point{chip}" in stats.report()
+
+
+def test_profile_match_many(root):
+    pathmatcher = PathMatcher(config, root=root)
+    expected = list(pathmatcher.match_many(paths(root)).records())
+    stats = pathmatcher.profile()
+    assert list(pathmatcher.match_many(paths(root)).records()) == expected
+    assert stats.files == 7
+    assert stats.times["relative_to"] > 0
+    assert stats.times["abbreviations"] > 0
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_scan_stats(root, jobs):
+    stats = ScanStats()
+    results = list(scan(root, config, jobs=jobs, stats=stats))
+    assert len(results) == 7
+    assert stats.files == 7
+    assert stats.hits == [2, 4]
+    assert stats.rule_calls == [6]
+    assert stats.times["walk"] > 0
+    assert stats.to_dict()["patterns"][1]["hits"] == 4
+
+
+def test_merge():
+    stats = ScanStats(patterns=["a", "b"], rules=["r"])
+    other = ScanStats(patterns=["a", "b"], rules=["r"])
+    other.files = 2
+    other.hits[1] = 2
+    other.rule_times[0] = 0.5
+    other.add("match", 1.0)
+    stats.merge(other)
+    stats.merge(other)
+    assert stats.files == 4
+    assert stats.hits == [0, 4]
+    assert stats.rule_times == [1.0]
+    assert stats.total == 2.0
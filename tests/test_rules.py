@@ -0,0 +1,83 @@
+import pickle
+
+import pytest
+from mps_data_parser import rules
+
+drug_rule = (
+    'drug_dict = {"V": "Verapamil", "Flec": "Flecainide", "": "Control"}; '
+    "drug = drug_dict[drug_]"
+)
+
+
+def test_lookup_rule():
+    rule = rules.compile_rule(drug_rule)
+    assert isinstance(rule, rules.LookupRule)
+
+    namespace = {"drug_": "Flec"}
+    rule(namespace)
+    # Should give the same result as executing the rule
+    expected = {"drug_": "Flec"}
+    exec(drug_rule, expected)
+    expected.pop("__builtins__")
+    assert namespace == expected
+    assert namespace["drug"] == "Flecainide"
+
+    with pytest.raises(KeyError):
+        rule({"drug_": "Unknown"})
+
+
+def test_rule():
+    source = 'dose = dose_ami if drug == "Ami" else globals().get("dose_mex", dose_ami)'
+    rule = rules.compile_rule(source)
+    assert type(rule) is rules.Rule
+
+    namespace = {"drug": "Mex", "dose_ami": "1uM", "dose_mex": "10uM"}
+    rule(namespace)
+    assert namespace["dose"] == "10uM"
+    assert "__builtins__" not in namespace
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "import os",
+        "from os import path",
+        "drug = __import__('os').getcwd()",
+        "drug = ().__class__.__bases__",
+        "drug = open('file').read()",
+        "x = globals()['__builtins__']['__import__']('os').getcwd()",
+        "drug = ",
+    ],
+)
+def test_invalid_rules_are_skipped(source):
+    assert rules.compile_rule(source) is None
+    assert [r.source for r in rules.compile_rules([source, drug_rule])] == [drug_rule]
+
+
+def test_rule_builtins():
+    # Rules only have access to a few harmless builtins
+    rule = rules.compile_rule("n = len(globals()['dose']); f = globals().get('open')")
+    namespace = {"dose": "10uM"}
+    rule(namespace)
+    assert namespace["n"] == 4
+    assert namespace["f"] is None
+    assert "__builtins__" not in namespace
+
+    rule = rules.compile_rule("f = help")
+    with pytest.raises(NameError):
+        rule({})
+
+    # Even if the check of the source is bypassed
+    rule = rules.compile_rule(
+        "b = globals()['_' + '_builtins__']; f = b['_' + '_import__']"
+    )
+    with pytest.raises(KeyError):
+        rule({})
+
+
+def test_pickle_rule():
+    rule = pickle.loads(pickle.dumps(rules.compile_rule(drug_rule)))
+    assert isinstance(rule, rules.LookupRule)
+    namespace = {"drug_": "V"}
+    rule(namespace)
+    assert namespace["drug"] == "Verapamil"
@@ -0,0 +1,127 @@
+import os
+from pathlib import Path
+
+import pytest
+import yaml
+from mps_data_parser import MatchError
+from mps_data_parser import MPSData
+from mps_data_parser import PathMatcher
+from mps_data_parser import scan
+from mps_data_parser import scanner
+
+config = {
+    "folder": "181116_Lidocaine",
+    "regexs": ["{dose}_{pacing_frequency}/Point{chip}_{media}_Channel{channel}.nd2"],
+    "exclude": ["analysis"],
+}
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path.joinpath(config["folder"])
+    for dose in ["0uM", "1uM", "10uM"]:
+        for pacing in ["1Hz", "0Hz"]:
+            folder = root.joinpath(f"{dose}_{pacing}")
+            folder.mkdir(parents=True)
+            for chip in ["1A", "2A"]:
+                for channel in ["Red", "Cyan"]:
+                    folder.joinpath(f"Point{chip}_MM_Channel{channel}.nd2").touch()
+            folder.joinpath("notes.txt").touch()
+            folder.joinpath("analysis").mkdir()
+            folder.joinpath("analysis", "Point1A_MM_ChannelRed.nd2").touch()
+    root.joinpath("not_matched.nd2").touch()
+    return root
+
+
+def test_iter_files(root):
+    expected = []
+    for dirpath, _, files in os.walk(root):
+        for f in files:
+            path = os.path.join(dirpath, f)
+            if f.endswith(".nd2") and "analysis" not in path:
+                expected.append(path)
+
+    paths = list(scanner.iter_files(root, exclude=config["exclude"]))
+    assert paths == expected
+    assert len(paths) == 3 * 2 * 2 * 2 + 1
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_scan_exclude_directory(root, cache):
+    root.joinpath("0uM_1Hz", "Point3A_MM_analysis_ChannelRed.nd2").touch()
+    exclude_config = dict(config, exclude=["analysis/"])
+    assert PathMatcher(dict(exclude_config, exclude=["analysis\\"])).excludes == [
+        "analysis/",
+    ]
+
+    paths = [r.path for r in scan(root, exclude_config, cache=cache, strict=False)]
+    # Only the files in the analysis directories are excluded
+    assert "0uM_1Hz/Point3A_MM_analysis_ChannelRed.nd2" in paths
+    assert not [p for p in paths if "analysis/" in p]
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_scan_prune(root, monkeypatch, cache):
+    rawdump = root.joinpath("rawdump", "deep")
+    rawdump.mkdir(parents=True)
+    rawdump.joinpath("Point1A_MM_ChannelRed.nd2").touch()
+
+    listed = []
+    scandir = os.scandir
+
+    def recording_scandir(path):
+        listed.append(Path(path).name)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", recording_scandir)
+
+    results = list(scan(root, config, cache=cache, prune=True, strict=False))
+    assert len(results) == 3 * 2 * 2 * 2 + 1
+    # Neither the excluded nor the directories that cannot be
+    # matched by the pattern should be listed
+    assert "analysis" not in listed
+    assert "rawdump" not in listed
+    assert "deep" not in listed
+
+    listed.clear()
+    results = list(scan(root, config, cache=cache, strict=False))
+    assert len(results) == 3 * 2 * 2 * 2 + 2
+    assert "analysis" not in listed
+    assert "deep" in listed
+
+
+@pytest.mark.parametrize("strict", [True, False])
+def test_match_files_parallel(root, strict):
+    pathmatcher = PathMatcher(config, root=root, strict=strict)
+    paths = list(scanner.iter_files(root, exclude=config["exclude"]))
+
+    serial = list(scanner.match_files(pathmatcher, paths))
+    parallel = list(scanner.match_files(pathmatcher, paths, jobs=2, chunksize=3))
+
+    assert [p for p, _ in parallel] == paths
+    for (path, expected), (_, result) in zip(serial, parallel):
+        if isinstance(expected, RuntimeError):
+            assert strict
+            assert Path(path).name == "not_matched.nd2"
+            assert str(result) == str(expected)
+        else:
+            assert result.to_dict() == expected.to_dict()
+
+
+def test_scan(root, tmp_path):
+    config_file = tmp_path.joinpath("config.yaml")
+    config_file.write_text(yaml.dump(config))
+
+    results = scan(root, config_file)
+    # Should be a generator
+    assert next(results) is not None
+    results = list(scan(root, config_file))
+
+    errors = [r for r in results if isinstance(r, MatchError)]
+    assert len(errors) == 1
+    assert Path(errors[0].path).name == "not_matched.nd2"
+
+    datas = [r for r in results if isinstance(r, MPSData)]
+    assert len(datas) == 3 * 2 * 2 * 2
+    assert set(d.dose for d in datas) == {"0uM", "1uM", "10uM"}
+    assert all("analysis" not in d.path for d in datas)
@@ -0,0 +1,42 @@
+import logging
+
+import yaml
+from mps_data_parser import scripts
+
+
+def test_check(tmp_path, caplog):
+    root = tmp_path.joinpath("181116_Lidocaine")
+    for dose in ["0uM", "1uM"]:
+        folder = root.joinpath(f"{dose}_1Hz")
+        folder.mkdir(parents=True)
+        for chip in ["1A", "2A"]:
+            folder.joinpath(f"Point{chip}_MM_ChannelRed.nd2").touch()
+        folder.joinpath("Point1A_MM_ChannelCyan.nd2").touch()
+        folder.joinpath("Point1A_MM_ChannelCyan_2.nd2").touch()
+    config = {
+        "folder": "181116_Lidocaine",
+        "regexs": [
+            "{dose}_{pacing_frequency}/Point{chip}_{media}_Channel{channel}_2.nd2",
+            "{dose}_{pacing_frequency}/Point{chip}_{media}_Channel{channel}.nd2",
+        ],
+        "unique_columns": ["dose", "chip"],
+    }
+    config_file = tmp_path.joinpath("config.yaml")
+    config_file.write_text(yaml.dump(config))
+    export_file = tmp_path.joinpath("data.npz")
+
+    with caplog.at_level(logging.INFO, logger="mps_data_parser"):
+        scripts.check(
+            {"folder": root, "config": config_file, "export": str(export_file)},
+        )
+
+    messages = [r.getMessage() for r in caplog.records]
+    duplicates = [m for m in messages if m.startswith("Duplicatee trace")]
+    assert len(duplicates) == 2
+    assert "and key 0uM_1A" in duplicates[0]
+    missing = [m for m in messages if m.startswith("Missing trace type")]
+    assert "Missing trace type 'voltage' for experiment: 0uM_2A" not in missing
+    assert "Missing trace type 'calcium' for experiment: 0uM_2A" in missing
+    assert len(missing) == 2 + 4
+    assert "found 8 files" in messages[-2]
+    assert export_file.is_file()
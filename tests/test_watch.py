@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+from mps_data_parser import MatchError
+from mps_data_parser import PathMatcher
+from mps_data_parser import scan
+from mps_data_parser import watch
+
+config = {
+    "folder": "181116_Lidocaine",
+    "regexs": ["{dose}_{pacing_frequency}/Point{chip}_{media}_Channel{channel}.nd2"],
+}
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path.joinpath(config["folder"])
+    folder = root.joinpath("0uM_1Hz")
+    folder.mkdir(parents=True)
+    folder.joinpath("Point1A_MM_ChannelRed.nd2").touch()
+    return root
+
+
+def acquire(root):
+    """Write files like a microscope, after the watch has started"""
+    time.sleep(0.2)
+    folder = root.joinpath("0uM_1Hz")
+    with open(folder.joinpath("Point2A_MM_ChannelRed.nd2"), "wb") as f:
+        for _ in range(3):
+            f.write(b"0" * 1024)
+            f.flush()
+            time.sleep(0.1)
+    folder.joinpath("Point3A_MM_ChannelRed.tmp").write_bytes(b"0")
+    folder.joinpath("Point3A_MM_ChannelRed.tmp").rename(
+        folder.joinpath("Point3A_MM_ChannelRed.nd2"),
+    )
+    new_folder = root.joinpath("1uM_1Hz")
+    new_folder.mkdir()
+    new_folder.joinpath("Point1A_MM_ChannelRed.nd2").touch()
+    root.joinpath("not_matched.nd2").touch()
+    folder.joinpath("notes.txt").touch()
+
+
+def watch_results(root, num_files, **kwargs):
+    thread = threading.Thread(target=acquire, args=(root,))
+    thread.start()
+    results = []
+    try:
+        for result in watch.watch(
+            root,
+            config,
+            settle=0.3,
+            interval=0.05,
+            duration=10,
+            **kwargs,
+        ):
+            results.append(result)
+            if len(results) == num_files:
+                break
+    finally:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize("polling", [True, False])
+def test_watch(root, polling):
+    if not polling:
+        try:
+            watch.InotifyWatcher(root).close()
+        except OSError:
+            pytest.skip("inotify is not available")
+
+    results = watch_results(root, 4, polling=polling)
+    errors = [r for r in results if isinstance(r, MatchError)]
+    assert [e.path for e in errors] == [str(root.joinpath("not_matched.nd2"))]
+    assert sorted(r.path for r in results if not isinstance(r, MatchError)) == [
+        "0uM_1Hz/Point2A_MM_ChannelRed.nd2",
+        "0uM_1Hz/Point3A_MM_ChannelRed.nd2",
+        "1uM_1Hz/Point1A_MM_ChannelRed.nd2",
+    ]
+
+
+def test_watch_inotify_written_files(root):
+    try:
+        watch.InotifyWatcher(root).close()
+    except OSError:
+        pytest.skip("inotify is not available")
+
+    folder = root.joinpath("0uM_1Hz")
+    yielded = threading.Event()
+
+    def write():
+        time.sleep(0.2)
+        # Written to, but there before the watch started
+        with open(folder.joinpath("Point1A_MM_ChannelRed.nd2"), "ab") as f:
+            f.write(b"0")
+        folder.joinpath("Point2A_MM_ChannelRed.nd2").write_bytes(b"0")
+        # Rewritten after it has been parsed
+        yielded.wait(5)
+        folder.joinpath("Point2A_MM_ChannelRed.nd2").write_bytes(b"00")
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    results = []
+    try:
+        for result in watch.watch(root, config, settle=0.3, interval=0.05, duration=2):
+            results.append(result.path)
+            yielded.set()
+    finally:
+        yielded.set()
+        thread.join()
+    assert results == ["0uM_1Hz/Point2A_MM_ChannelRed.nd2"]
+
+
+def test_watch_cache(root, monkeypatch):
+    results = watch_results(root, 4, cache=True, polling=True)
+    assert len(results) == 4
+
+    calls = []
+    call = PathMatcher.__call__
+
+    def counting_call(self, path):
+        calls.append(path)
+        return call(self, path)
+
+    monkeypatch.setattr(PathMatcher, "__call__", counting_call)
+    assert len(list(scan(root, config, cache=True))) == 5
+    # Only the file that was there before the watch started is parsed
+    assert calls == [str(root.joinpath("0uM_1Hz", "Point1A_MM_ChannelRed.nd2"))]
+
+
+def test_debouncer(tmp_path):
+    path = tmp_path.joinpath("file.nd2")
+    path.write_bytes(b"0")
+    pending = watch.Debouncer(settle=1.0)
+    pending.add([str(path)], now=0)
+    assert pending.ready(now=0) == []
+    assert pending.ready(now=0.5) == []
+    path.write_bytes(b"00")
+    assert pending.ready(now=0.9) == []
+    assert pending.ready(now=1.5) == []
+    assert [p for p, _, _ in pending.ready(now=2.0)] == [str(path)]
+    assert len(pending) == 0
+
+    # Only pending paths are touched
+    pending.touch([str(path)], now=3.0)
+    assert len(pending) == 0
+    pending.add([str(path)], now=3.0)
+    pending.ready(now=3.0)
+    pending.touch([str(path)], now=3.5)
+    assert pending.ready(now=4.0) == []
+    assert len(pending.ready(now=4.5)) == 1